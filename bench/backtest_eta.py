@@ -0,0 +1,80 @@
+# Backtest for the ETA predictor.
+#
+# Replays delivered orders from the app database in time order through a
+# fresh EtaPredictor: every placement is predicted before that order's own
+# prep and delivery times are observed. Errors are compared with the fixed
+# estimates the app used before ("30-45 minutes" at checkout, +30 minutes
+# once ready).
+#
+#   python bench/backtest_eta.py --limit 50000
+import argparse
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from main import app, db, Order, EtaPredictor  # noqa: E402
+
+FIXED_PLACEMENT_MINUTES = 37.5  # midpoint of "30-45 minutes"
+FIXED_READY_MINUTES = 30
+
+PLACED, READY, DELIVERED = 0, 1, 2
+
+def summarize(label, errors):
+    if not errors:
+        print(f"{label:>28}: no samples")
+        return
+    absolute = sorted(abs(error) for error in errors)
+    mae = sum(absolute) / len(absolute)
+    bias = sum(errors) / len(errors)
+    p90 = absolute[int(len(absolute) * 0.9)]
+    print(f"{label:>28}: MAE={mae:6.2f} min  p90={p90:6.2f} min  bias={bias:+6.2f} min  n={len(errors)}")
+
+def backtest(rows):
+    predictor = EtaPredictor()
+    events = []
+    for index, (placed_at, ready_at, delivered_at) in enumerate(rows):
+        events.append((placed_at, PLACED, index))
+        events.append((ready_at, READY, index))
+        events.append((delivered_at, DELIVERED, index))
+    events.sort()
+
+    placement, placement_fixed, ready, ready_fixed = [], [], [], []
+    for _, kind, index in events:
+        placed_at, ready_at, delivered_at = rows[index]
+        if kind == PLACED:
+            actual = (delivered_at - placed_at).total_seconds() / 60
+            placement.append(predictor.estimate(placed_at) - actual)
+            placement_fixed.append(FIXED_PLACEMENT_MINUTES - actual)
+            predictor.entered_kitchen(placed_at)
+        elif kind == READY:
+            predictor.left_kitchen()
+            predictor.observe_prep(placed_at, ready_at)
+            actual = (delivered_at - ready_at).total_seconds() / 60
+            ready.append(predictor.delivery_minutes(ready_at) - actual)
+            ready_fixed.append(FIXED_READY_MINUTES - actual)
+        else:
+            predictor.observe_delivery(ready_at, delivered_at)
+    return placement, placement_fixed, ready, ready_fixed
+
+def main():
+    parser = argparse.ArgumentParser(description='Backtest ETA predictions against order history')
+    parser.add_argument('--limit', type=int, default=100000, help='most recent delivered orders to replay')
+    args = parser.parse_args()
+
+    with app.app_context():
+        rows = (db.session.query(Order.created_at, Order.ready_at, Order.delivered_at)
+                .filter(Order.status == 'delivered',
+                        Order.ready_at.isnot(None),
+                        Order.delivered_at.isnot(None))
+                .order_by(Order.id.desc()).limit(args.limit).all())
+    rows = [tuple(row) for row in reversed(rows)]
+    print(f"replaying {len(rows)} delivered orders")
+
+    placement, placement_fixed, ready, ready_fixed = backtest(rows)
+    summarize('at placement: predictor', placement)
+    summarize('at placement: fixed 37.5', placement_fixed)
+    summarize('once ready: predictor', ready)
+    summarize('once ready: fixed +30', ready_fixed)
+
+if __name__ == '__main__':
+    main()
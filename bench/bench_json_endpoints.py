@@ -0,0 +1,135 @@
+# Microbenchmark for the column-projected JSON endpoints.
+#
+# Times the row loading and serialization behind /api/my-orders-status,
+# /admin/stock_items, /admin/delivery_assignments and /admin/promotions,
+# both the way they used to hydrate full ORM objects and the projected
+# statements they use now, and reports rows per second for each. With
+# --rows N it first adds a throwaway customer with N unassigned ready orders
+# (and N / 10 promotions) and deletes them afterwards, so run it against a
+# copy of the database.
+#
+#   python bench/bench_json_endpoints.py --rows 2000 --runs 20
+import argparse
+import json
+import os
+import sys
+import time
+import uuid
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from main import (app, db, MenuItem, User, Order, OrderEvent, Promotion,  # noqa: E402
+                  log_order_event, order_events_since, recent_order_statuses, order_status_changes,
+                  stock_items_rows, unassigned_ready_rows, delivery_person_rows, promotion_rows)
+
+# The ORM versions these endpoints used before
+def orm_my_orders_status(user_id, since):
+    events = order_events_since(since, limit=100, user_id=user_id)
+    latest = {}
+    for event in events:
+        latest[event.order_id] = event.to_status
+    changed = [{'order_id': order_id, 'status': status} for order_id, status in latest.items()]
+    orders = Order.query.filter_by(user_id=user_id).order_by(Order.created_at.desc()).limit(10).all()
+    return changed + [{'order_id': order.order_id, 'status': order.status} for order in orders]
+
+def orm_stock_items():
+    return [{'name': item.name, 'category': item.category, 'price': item.price,
+             'description': item.description, 'emoji': item.emoji, 'in_stock': item.in_stock}
+            for item in MenuItem.query.all()]
+
+def orm_delivery_assignments():
+    ready_orders = (Order.query.filter_by(status='ready', delivery_person_id=None)
+                    .order_by(Order.priority.desc(), Order.created_at).all())
+    persons = User.query.filter_by(is_delivery=True).all()
+    return ([{'order_id': order.order_id, 'customer_name': order.customer_name, 'total': order.total,
+              'priority': order.priority, 'lat': order.delivery_lat, 'lng': order.delivery_lng}
+             for order in ready_orders]
+            + [{'id': person.id, 'full_name': person.full_name} for person in persons])
+
+def orm_promotions():
+    return [{'id': promo.id, 'code': promo.code, 'description': promo.description,
+             'discount_type': promo.discount_type, 'discount_value': promo.discount_value,
+             'min_order': promo.min_order,
+             'valid_from': promo.valid_from.strftime('%Y-%m-%d') if promo.valid_from else None,
+             'valid_to': promo.valid_to.strftime('%Y-%m-%d') if promo.valid_to else None,
+             'max_usage': promo.max_usage, 'usage_count': promo.usage_count, 'active': promo.active}
+            for promo in Promotion.query.all()]
+
+# ... and the projected versions they use now
+def core_my_orders_status(user_id, since):
+    changed, _ = order_status_changes(user_id, since)
+    return changed + recent_order_statuses(user_id)
+
+def core_delivery_assignments():
+    return ([{'order_id': order_id, 'customer_name': name, 'total': total, 'priority': priority,
+              'lat': lat, 'lng': lng}
+             for order_id, name, total, priority, lat, lng, _ in unassigned_ready_rows()]
+            + [{'id': person_id, 'full_name': full_name} for person_id, full_name in delivery_person_rows()])
+
+def add_fixtures(rows):
+    tag = uuid.uuid4().hex[:8]
+    user = User(username=f'bench-{tag}', email=f'bench-{tag}@example.invalid', password_hash='!',
+                full_name='Bench Customer', phone=f'9{tag[:9]}')
+    db.session.add(user)
+    db.session.flush()
+    items = json.dumps([{'name': 'Chicken Biryani', 'price': 250, 'quantity': 2, 'emoji': ''}] * 3)
+    start = datetime.utcnow() - timedelta(minutes=rows)
+    for index in range(rows):
+        order_id = f'J{tag}{index:05d}'
+        db.session.add(Order(order_id=order_id, customer_name='Bench Customer', customer_phone=user.phone,
+                             customer_address='1 Bench Street, Hyderabad ' * 4, items_json=items,
+                             subtotal=1500, total=1500, payment_method='cash', status='ready',
+                             user_id=user.id, feedback='fine ' * 40, created_at=start + timedelta(minutes=index)))
+        log_order_event(order_id, 'preparing', 'ready', at=start + timedelta(minutes=index))
+    for index in range(rows // 10):
+        db.session.add(Promotion(code=f'B{tag}{index:04d}'[:20], description='Bench promotion ' * 5,
+                                 discount_type='percent', discount_value=10, active=False))
+    db.session.commit()
+    return user.id, tag
+
+def remove_fixtures(user_id, tag):
+    order_ids = [order_id for order_id, in db.session.query(Order.order_id).filter(Order.user_id == user_id)]
+    OrderEvent.query.filter(OrderEvent.order_id.in_(order_ids)).delete(synchronize_session=False)
+    Order.query.filter(Order.user_id == user_id).delete(synchronize_session=False)
+    Promotion.query.filter(Promotion.code.like(f'B{tag}%')).delete(synchronize_session=False)
+    User.query.filter(User.id == user_id).delete(synchronize_session=False)
+    db.session.commit()
+
+def rows_per_second(fn, runs):
+    fn()  # warm the statement caches
+    total_rows = 0
+    t0 = time.perf_counter()
+    for _ in range(runs):
+        total_rows += len(fn())
+        db.session.remove()  # a fresh session per call, as per request
+    return total_rows / (time.perf_counter() - t0), total_rows // runs
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare ORM and projected JSON endpoint paths')
+    parser.add_argument('--rows', type=int, default=0, help='throwaway orders to add first')
+    parser.add_argument('--runs', type=int, default=20)
+    args = parser.parse_args()
+
+    with app.app_context():
+        fixtures = add_fixtures(args.rows) if args.rows else None
+        try:
+            user_id = fixtures[0] if fixtures else (db.session.query(db.func.max(Order.user_id)).scalar() or 0)
+            cases = [
+                ('my-orders-status', lambda: orm_my_orders_status(user_id, 0),
+                 lambda: core_my_orders_status(user_id, 0)),
+                ('stock_items', orm_stock_items, stock_items_rows),
+                ('delivery_assignments', orm_delivery_assignments, core_delivery_assignments),
+                ('promotions', orm_promotions, promotion_rows),
+            ]
+            for name, before, after in cases:
+                assert before() == after(), name
+                before_rate, rows = rows_per_second(before, args.runs)
+                after_rate, _ = rows_per_second(after, args.runs)
+                print(f"{name:>21}: rows={rows:6d} before={before_rate:10.0f} rows/s "
+                      f"after={after_rate:10.0f} rows/s ({after_rate / before_rate:.1f}x)")
+        finally:
+            if fixtures:
+                remove_fixtures(*fixtures)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,82 @@
+# Benchmark for order item storage.
+#
+# Takes the carts of the most recent orders in the app database (or
+# synthetic carts drawn from the menu with --synthetic) and compares the
+# legacy JSON encoding with the compact menu-id encoding: bytes stored,
+# decode time, and repeated get_items() calls on one Order with the
+# per-instance memo. Nothing is written to the database.
+#
+#   python bench/bench_order_items.py --limit 100000
+#   python bench/bench_order_items.py --synthetic 100000
+import argparse
+import json
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from main import (app, db, MenuItem, Order, menu_codebook,  # noqa: E402
+                  encode_order_items, decode_order_items)
+
+def synthetic_carts(count, seed):
+    rng = random.Random(seed)
+    menu = db.session.query(MenuItem.name, MenuItem.price, MenuItem.emoji).all()
+    carts = []
+    for _ in range(count):
+        picks = rng.sample(menu, min(len(menu), rng.randint(1, 5)))
+        carts.append([{'name': name, 'price': price, 'quantity': rng.randint(1, 3), 'emoji': emoji or ''}
+                      for name, price, emoji in picks])
+    return carts
+
+def timed(fn, values):
+    t0 = time.perf_counter()
+    for value in values:
+        fn(value)
+    return time.perf_counter() - t0
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare legacy and compact order item encodings')
+    parser.add_argument('--limit', type=int, default=100000, help='most recent orders to read')
+    parser.add_argument('--synthetic', type=int, default=0, help='generate this many carts instead')
+    parser.add_argument('--repeat', type=int, default=10, help='get_items() calls per order for the memo test')
+    parser.add_argument('--seed', type=int, default=11)
+    args = parser.parse_args()
+
+    with app.app_context():
+        menu_codebook.refresh(force=True)
+        if args.synthetic:
+            carts = synthetic_carts(args.synthetic, args.seed)
+        else:
+            rows = db.session.query(Order.items_json).order_by(Order.id.desc()).limit(args.limit).all()
+            carts = [decode_order_items(raw) for raw, in rows]
+        if not carts:
+            print('no orders to measure; try --synthetic 100000')
+            return
+
+        legacy = [json.dumps(cart) for cart in carts]
+        compact = [encode_order_items(cart) for cart in carts]
+        converted = sum(1 for raw in compact if raw.startswith('[['))
+        assert [decode_order_items(raw) for raw in compact] == carts
+
+        legacy_bytes = sum(len(raw.encode()) for raw in legacy)
+        compact_bytes = sum(len(raw.encode()) for raw in compact)
+        print(f"orders={len(carts)} compact-encodable={converted}")
+        print(f"storage: legacy={legacy_bytes / 1024:.1f}KiB compact={compact_bytes / 1024:.1f}KiB "
+              f"({compact_bytes / legacy_bytes:.0%})")
+
+        legacy_s = timed(decode_order_items, legacy)
+        compact_s = timed(decode_order_items, compact)
+        print(f"decode: legacy={legacy_s / len(carts) * 1e6:.2f}us/order compact={compact_s / len(carts) * 1e6:.2f}us/order")
+
+        orders = [Order(items_json=raw) for raw in compact]
+        t0 = time.perf_counter()
+        for order in orders:
+            for _ in range(args.repeat):
+                order.get_items()
+        memo_s = time.perf_counter() - t0
+        print(f"get_items x{args.repeat}: memoized={memo_s / len(orders) * 1e6:.2f}us/order "
+              f"unmemoized~={compact_s / len(carts) * args.repeat * 1e6:.2f}us/order")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,61 @@
+# Benchmark for the multi-drop route planner.
+#
+# Times plan_route() on random drop sets around the store and, for small
+# sets, compares the tour length against the brute-force optimum.
+#
+#   python bench/bench_routes.py --stops 15 --trials 200
+import argparse
+import itertools
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from main import STORE_LOCATION, distance_km, plan_route  # noqa: E402
+
+SPREAD_DEGREES = 0.05
+
+def route_km(start, stops, order):
+    total, position = 0.0, start
+    for index in order:
+        total += distance_km(position[0], position[1], stops[index][0], stops[index][1])
+        position = stops[index]
+    return total
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark multi-drop route planning')
+    parser.add_argument('--stops', type=int, default=15)
+    parser.add_argument('--trials', type=int, default=200)
+    parser.add_argument('--optimal-check-stops', type=int, default=7)
+    parser.add_argument('--seed', type=int, default=11)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    start = STORE_LOCATION
+
+    def random_stops(count):
+        return [(start[0] + rng.uniform(-SPREAD_DEGREES, SPREAD_DEGREES),
+                 start[1] + rng.uniform(-SPREAD_DEGREES, SPREAD_DEGREES)) for _ in range(count)]
+
+    timings = []
+    for _ in range(args.trials):
+        stops = random_stops(args.stops)
+        t0 = time.perf_counter()
+        plan_route(start, stops)
+        timings.append(time.perf_counter() - t0)
+    timings.sort()
+    print(f"{args.stops} stops: p50={timings[len(timings) // 2] * 1e3:.2f}ms "
+          f"max={timings[-1] * 1e3:.2f}ms")
+
+    gaps = []
+    for _ in range(min(args.trials, 50)):
+        stops = random_stops(args.optimal_check_stops)
+        planned = route_km(start, stops, plan_route(start, stops))
+        best = min(route_km(start, stops, order) for order in itertools.permutations(range(len(stops))))
+        gaps.append(planned / best - 1)
+    print(f"{args.optimal_check_stops} stops vs optimum: mean gap={sum(gaps) / len(gaps) * 100:.2f}% "
+          f"worst={max(gaps) * 100:.2f}%")
+
+if __name__ == '__main__':
+    main()
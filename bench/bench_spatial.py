@@ -0,0 +1,67 @@
+# Benchmark for the rider location grid.
+#
+# Scatters synthetic riders over a city-sized box, then times k-nearest
+# queries against RiderLocationIndex and checks every answer against a
+# brute-force scan.
+#
+#   python bench/bench_spatial.py --riders 500 --queries 2000 --k 5
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from main import RiderLocationIndex, distance_km  # noqa: E402
+
+# Roughly Hyderabad; any box works
+CENTER = (17.385, 78.4867)
+SPREAD_DEGREES = 0.15
+
+def random_point(rng):
+    return (CENTER[0] + rng.uniform(-SPREAD_DEGREES, SPREAD_DEGREES),
+            CENTER[1] + rng.uniform(-SPREAD_DEGREES, SPREAD_DEGREES))
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark nearest-rider lookups')
+    parser.add_argument('--riders', type=int, default=500)
+    parser.add_argument('--queries', type=int, default=2000)
+    parser.add_argument('--k', type=int, default=5)
+    parser.add_argument('--busy-share', type=float, default=0.3)
+    parser.add_argument('--seed', type=int, default=7)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    index = RiderLocationIndex()
+    riders = {}
+    for rider_id in range(1, args.riders + 1):
+        riders[rider_id] = random_point(rng)
+        index.update(rider_id, *riders[rider_id])
+    busy = set(rng.sample(sorted(riders), int(args.riders * args.busy_share)))
+
+    def is_free(rider_id):
+        return rider_id not in busy
+
+    timings = []
+    mismatches = 0
+    for _ in range(args.queries):
+        lat, lng = random_point(rng)
+        t0 = time.perf_counter()
+        result = index.nearest(lat, lng, k=args.k, accept=is_free)
+        timings.append(time.perf_counter() - t0)
+
+        expected = sorted((distance_km(lat, lng, r_lat, r_lng), rider_id)
+                          for rider_id, (r_lat, r_lng) in riders.items() if is_free(rider_id))[:args.k]
+        if [rider_id for rider_id, _ in result] != [rider_id for _, rider_id in expected]:
+            mismatches += 1
+
+    timings.sort()
+    print(f"riders={args.riders} queries={args.queries} k={args.k}")
+    print(f"p50={timings[len(timings) // 2] * 1e6:.1f}us "
+          f"p99={timings[int(len(timings) * 0.99)] * 1e6:.1f}us "
+          f"max={timings[-1] * 1e6:.1f}us")
+    print(f"mismatches vs brute force: {mismatches}")
+    return 1 if mismatches else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
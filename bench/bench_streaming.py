@@ -0,0 +1,104 @@
+# Benchmark for streamed pages.
+#
+# Adds a throwaway customer with a long order history to the app database,
+# renders /my-orders, /profile and /admin with STREAM_PAGES on and off, and
+# reports time to first byte, total time and peak Python memory per page.
+# The history page size is raised to cover every order, so the pages render
+# what they did before pagination. The customer and orders are deleted
+# afterwards.
+#
+#   python bench/bench_streaming.py --orders 500 --runs 5
+import argparse
+import json
+import os
+import sys
+import time
+import tracemalloc
+import uuid
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import main as app_main  # noqa: E402
+from main import app, db, User, Order, OrderEvent  # noqa: E402
+
+PAGES = ['/my-orders', '/profile', '/admin']
+STATUSES = ['delivered', 'delivered', 'delivered', 'ready', 'preparing', 'pending']
+
+def create_customer(orders):
+    tag = uuid.uuid4().hex[:8]
+    user = User(username=f'bench-{tag}', email=f'bench-{tag}@example.invalid', password_hash='!',
+                full_name='Bench Customer', phone=f'9{tag[:9]}', is_admin=True)
+    db.session.add(user)
+    db.session.flush()
+    items = json.dumps([{'name': 'Chicken Biryani', 'price': 250, 'quantity': 2, 'emoji': ''},
+                        {'name': 'Raita', 'price': 40, 'quantity': 1, 'emoji': ''}])
+    start = datetime.utcnow() - timedelta(days=orders)
+    db.session.add_all(Order(order_id=f'B{tag}{index:05d}', customer_name='Bench Customer',
+                             customer_phone=user.phone, customer_address='1 Bench Street, Hyderabad',
+                             items_json=items, subtotal=540, total=540, payment_method='cash',
+                             status=STATUSES[index % len(STATUSES)], user_id=user.id,
+                             rating=4 if index % 3 == 0 else None,
+                             created_at=start + timedelta(days=index))
+                       for index in range(orders))
+    db.session.commit()
+    return user.id
+
+def remove_customer(user_id):
+    order_ids = [order_id for order_id, in db.session.query(Order.order_id).filter(Order.user_id == user_id)]
+    OrderEvent.query.filter(OrderEvent.order_id.in_(order_ids)).delete(synchronize_session=False)
+    Order.query.filter(Order.user_id == user_id).delete(synchronize_session=False)
+    User.query.filter(User.id == user_id).delete(synchronize_session=False)
+    db.session.commit()
+
+def median(values):
+    return sorted(values)[len(values) // 2]
+
+def measure(client, path):
+    # Chunks are dropped as they arrive, the way a socket would send them
+    tracemalloc.reset_peak()
+    baseline = tracemalloc.get_traced_memory()[0]
+    t0 = time.perf_counter()
+    response = client.get(path, buffered=False)
+    first_byte = None
+    size = 0
+    try:
+        for chunk in response.response:
+            if first_byte is None:
+                first_byte = time.perf_counter() - t0
+            size += len(chunk)
+    finally:
+        response.close()
+    total = time.perf_counter() - t0
+    return first_byte, total, tracemalloc.get_traced_memory()[1] - baseline, size
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare streamed and buffered page rendering')
+    parser.add_argument('--orders', type=int, default=500)
+    parser.add_argument('--runs', type=int, default=5)
+    args = parser.parse_args()
+
+    app_main.ORDER_PAGE_SIZE = app_main.ORDER_PAGE_MAX = args.orders
+    with app.app_context():
+        user_id = create_customer(args.orders)
+    try:
+        client = app.test_client()
+        with client.session_transaction() as session:
+            session['user_id'] = user_id
+        tracemalloc.start()
+        print(f"orders={args.orders} runs={args.runs} (median of runs)")
+        for path in PAGES:
+            for streaming in (False, True):
+                app.config['STREAM_PAGES'] = streaming
+                measure(client, path)  # warm caches
+                samples = [measure(client, path) for _ in range(args.runs)]
+                first_byte, total, peak, size = (median(column) for column in zip(*samples))
+                print(f"{path:>11} {'stream' if streaming else 'buffer':>6}: "
+                      f"ttfb={first_byte * 1000:7.2f}ms total={total * 1000:7.2f}ms "
+                      f"peak={peak / 1024:8.1f}KiB size={size / 1024:7.1f}KiB")
+        tracemalloc.stop()
+    finally:
+        with app.app_context():
+            remove_customer(user_id)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,229 @@
+# Synthetic data generator for scale testing.
+#
+# Fills the app database with customers, riders, promotions and orders so
+# that history pages, the admin dashboard, ETA warm-up and the delivery
+# queue can be measured at production-like sizes. Orders draw their carts
+# from the menu table (seeded from MENU when it is empty) and are stored with
+# encode_order_items(), like /place_order does. They are spread over --months
+# with lunch and dinner peaks and a few heavy customers. Orders older than
+# two hours are delivered, many with a rating; the newest ones are still
+# pending, preparing or ready. Each order also gets the OrderEvent rows its
+# status implies unless --no-events is given.
+#
+# Rows go in through Core executemany in --batch sized transactions with
+# synchronous=OFF, so a million orders takes minutes. The same --seed,
+# --end and counts always produce the same rows. Customers log in with
+# password "synthetic" (as synth<N>), which bench/loadtest.py can use. Run it
+# against a copy of the database.
+#
+#   python bench/generate_data.py --users 50000 --orders 1000000 --months 6 --seed 7
+import argparse
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import main as app_main  # noqa: E402
+from main import (app, db, MenuItem, User, Order, OrderEvent, Promotion, STORE_LOCATION,  # noqa: E402
+                  menu_codebook, encode_order_items, page_cache)
+from werkzeug.security import generate_password_hash  # noqa: E402
+
+PASSWORD = 'synthetic'
+# Share of the day's orders placed in each hour, lunch and dinner heavy
+HOUR_WEIGHTS = [1, 0, 0, 0, 0, 0, 1, 2, 3, 3, 4, 6, 10, 12, 8, 4, 3, 4, 7, 11, 13, 10, 6, 3]
+FIRST_NAMES = ['Aarav', 'Ananya', 'Rohan', 'Priya', 'Vikram', 'Sneha', 'Arjun', 'Kavya', 'Rahul', 'Meera',
+               'Aditya', 'Divya', 'Karthik', 'Lakshmi', 'Imran', 'Fatima', 'Sai', 'Nikhil', 'Pooja', 'Zoya']
+LAST_NAMES = ['Reddy', 'Sharma', 'Khan', 'Rao', 'Iyer', 'Naidu', 'Gupta', 'Patel', 'Ali', 'Varma']
+AREAS = ['Banjara Hills', 'Jubilee Hills', 'Madhapur', 'Gachibowli', 'Kondapur', 'Ameerpet',
+         'Begumpet', 'Secunderabad', 'Kukatpally', 'Mehdipatnam', 'Tolichowki', 'Charminar']
+FEEDBACK = ['', '', '', 'Great taste!', 'Arrived hot', 'A bit late', 'Perfect spice level',
+            'Generous portion', 'Will order again', 'Packaging could be better']
+SPREAD_DEGREES = 0.08
+
+def seed_menu():
+    if MenuItem.query.count():
+        return
+    menu = getattr(app_main, 'MENU', None)
+    if not menu:
+        raise SystemExit('the menu table is empty and main.MENU is not defined; seed the menu first')
+    db.session.add_all(MenuItem(name=item['name'], category=category, price=item['price'],
+                                description=item['description'], emoji=item['emoji'], in_stock=True)
+                       for category, items in menu.items() for item in items)
+    db.session.commit()
+
+def insert(table, rows):
+    if rows:
+        db.session.execute(table.insert(), rows)
+        db.session.commit()
+
+def next_id(model):
+    return (db.session.query(db.func.max(model.id)).scalar() or 0) + 1
+
+def generate_users(rng, count, riders, batch, created_from):
+    password_hash = generate_password_hash(PASSWORD)  # hashing once keeps this fast
+    first_id = next_id(User)  # names use ids, so reruns add new users instead of clashing
+    customers, rider_ids, rows = [], [], []
+    for offset in range(count + riders):
+        user_id = first_id + offset
+        is_rider = offset >= count
+        name = f'{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}'
+        username = f'synthrider{user_id}' if is_rider else f'synth{user_id}'
+        points = 0 if is_rider else int(rng.paretovariate(1.5) * 20)
+        rows.append({
+            'id': user_id, 'username': username, 'email': f'{username}@example.invalid',
+            'password_hash': password_hash, 'full_name': name, 'phone': f'{rng.randint(6, 9)}{rng.randrange(10 ** 9):09d}',
+            'loyalty_points': points,
+            'loyalty_tier': 'bronze' if points < 100 else 'silver' if points < 500 else 'gold',
+            'is_admin': False, 'is_delivery': is_rider, 'priority_credits': 0,
+            'created_at': created_from + timedelta(minutes=rng.randrange(60 * 24 * 30)),
+        })
+        if is_rider:
+            rider_ids.append(user_id)
+        else:
+            customers.append((user_id, name, rows[-1]['phone']))
+        if len(rows) >= batch:
+            insert(User.__table__, rows)
+            rows = []
+    insert(User.__table__, rows)
+    print(f'users: {count} customers and {riders} riders from id {first_id}')
+    return customers, rider_ids
+
+def generate_promotions(rng, count, end):
+    existing = {code for code, in db.session.query(Promotion.code)}
+    rows = []
+    index = 0
+    while len(rows) < count:
+        index += 1
+        code = f'SYN{rng.choice(["SAVE", "FEAST", "BIRYANI", "WEEKEND", "LUNCH"])}{index}'
+        if code in existing:
+            continue
+        percent = rng.random() < 0.6
+        max_usage = rng.choice([50, 100, 500, 1000])
+        usage = rng.randrange(max_usage + 1)
+        start = end - timedelta(days=rng.randrange(1, 180))
+        rows.append({
+            'code': code, 'description': f'Synthetic promotion {index}',
+            'discount_type': 'percent' if percent else 'fixed',
+            'discount_value': rng.choice([5, 10, 15, 20]) if percent else rng.choice([25, 50, 75, 100]),
+            'min_order': rng.choice([0, 200, 300, 500]), 'valid_from': start,
+            'valid_to': start + timedelta(days=rng.choice([7, 14, 30, 60])),
+            'max_usage': max_usage, 'usage_count': usage, 'active': usage < max_usage and rng.random() < 0.5,
+        })
+    insert(Promotion.__table__, rows)
+    print(f'promotions: {count}')
+    return [(row['code'], row['discount_type'], row['discount_value']) for row in rows]
+
+def order_times(rng, count, start, end):
+    # Days uniformly, hours by HOUR_WEIGHTS, then sorted so ids follow time
+    days = (end - start).days or 1
+    hours = rng.choices(range(24), weights=HOUR_WEIGHTS, k=count)
+    times = [start + timedelta(days=rng.randrange(days), hours=hour, seconds=rng.randrange(3600))
+             for hour in hours]
+    times.sort()
+    return times
+
+def generate_orders(rng, count, customers, riders, promotions, start, end, batch, prefix, events):
+    menu = [(item_id, name, price, emoji or '') for item_id, name, price, emoji
+            in db.session.query(MenuItem.id, MenuItem.name, MenuItem.price, MenuItem.emoji)]
+    menu_codebook.refresh(force=True)
+    # A few customers place most orders
+    weights = [rng.paretovariate(1.2) for _ in customers]
+    buyers = rng.choices(customers, weights=weights, k=count)
+    times = order_times(rng, count, start, end)
+    first = db.session.query(db.func.count(Order.id)).filter(Order.order_id.like(f'{prefix}%')).scalar()
+    order_rows, event_rows = [], []
+    t0 = time.perf_counter()
+    for index, (created_at, (user_id, name, phone)) in enumerate(zip(times, buyers)):
+        picks = rng.sample(menu, rng.randint(1, min(5, len(menu))))
+        cart = [{'name': item_name, 'price': price, 'quantity': rng.choice((1, 1, 1, 2, 2, 3)), 'emoji': emoji}
+                for _, item_name, price, emoji in picks]
+        subtotal = sum(item['price'] * item['quantity'] for item in cart)
+        discount = 0
+        coupon = ''
+        if promotions and rng.random() < 0.15:
+            coupon, kind, value = rng.choice(promotions)
+            discount = min(subtotal, subtotal * value / 100 if kind == 'percent' else value)
+        age = end - created_at
+        ready_at = created_at + timedelta(minutes=rng.randint(10, 35))
+        delivered_at = ready_at + timedelta(minutes=rng.randint(10, 45))
+        if age > timedelta(hours=2):
+            status = 'delivered'
+        else:
+            status = rng.choice(['pending', 'preparing', 'ready', 'delivered'])
+        order_id = f'{prefix}{first + index:012d}'
+        rider_id = rng.choice(riders) if riders and (status == 'delivered' or (status == 'ready' and rng.random() < 0.5)) else None
+        rated = status == 'delivered' and rng.random() < 0.4
+        order_rows.append({
+            'order_id': order_id, 'customer_name': name, 'customer_phone': phone,
+            'customer_address': f'{rng.randint(1, 999)}, {rng.choice(AREAS)}, Hyderabad',
+            'items_json': encode_order_items(cart), 'subtotal': subtotal, 'discount': discount,
+            'total': subtotal - discount, 'payment_method': rng.choice(('cash', 'upi')), 'status': status,
+            'coupon_code': coupon, 'delivery_person_id': rider_id, 'user_id': user_id,
+            'created_at': created_at, 'estimated_delivery': created_at + timedelta(minutes=35),
+            'ready_at': ready_at if status in ('ready', 'delivered') else None,
+            'delivered_at': delivered_at if status == 'delivered' else None,
+            'rating': rng.choices((5, 4, 3, 2, 1), weights=(50, 30, 12, 5, 3))[0] if rated else None,
+            'feedback': rng.choice(FEEDBACK) if rated else None,
+            'version': 0, 'priority': rng.random() < 0.02,
+            'delivery_lat': STORE_LOCATION[0] + rng.uniform(-SPREAD_DEGREES, SPREAD_DEGREES),
+            'delivery_lng': STORE_LOCATION[1] + rng.uniform(-SPREAD_DEGREES, SPREAD_DEGREES),
+        })
+        if events:
+            path = ['pending', 'preparing', 'ready', 'delivered']
+            steps = path[:path.index(status) + 1]
+            stamps = [created_at, created_at + timedelta(minutes=2), ready_at, delivered_at]
+            previous = None
+            for to_status, at in zip(steps, stamps):
+                event_rows.append({'order_id': order_id, 'from_status': previous, 'to_status': to_status,
+                                   'delivery_person_id': rider_id if to_status == 'delivered' else None,
+                                   'actor_id': None, 'created_at': at})
+                previous = to_status
+        if len(order_rows) >= batch:
+            insert(Order.__table__, order_rows)
+            insert(OrderEvent.__table__, event_rows)
+            order_rows, event_rows = [], []
+            done = index + 1
+            elapsed = time.perf_counter() - t0
+            print(f'orders: {done}/{count} ({done / elapsed:,.0f}/s)', end='\r', flush=True)
+    insert(Order.__table__, order_rows)
+    insert(OrderEvent.__table__, event_rows)
+    elapsed = time.perf_counter() - t0
+    print(f'orders: {count} in {elapsed:.1f}s ({count / max(elapsed, 1e-9):,.0f}/s)' + ' ' * 20)
+
+def main():
+    parser = argparse.ArgumentParser(description='Bulk-load synthetic users, orders and promotions')
+    parser.add_argument('--users', type=int, default=1000)
+    parser.add_argument('--riders', type=int, default=20)
+    parser.add_argument('--orders', type=int, default=10000)
+    parser.add_argument('--promotions', type=int, default=50)
+    parser.add_argument('--months', type=float, default=6)
+    parser.add_argument('--end', help='YYYY-MM-DD the history runs up to (default: today, UTC)')
+    parser.add_argument('--batch', type=int, default=5000, help='rows per transaction')
+    parser.add_argument('--prefix', default='SYN', help='order id prefix')
+    parser.add_argument('--no-events', dest='events', action='store_false', help='skip OrderEvent rows')
+    parser.add_argument('--seed', type=int, default=7)
+    args = parser.parse_args()
+
+    end = (datetime.strptime(args.end, '%Y-%m-%d') if args.end
+           else datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)) + timedelta(days=1)
+    start = end - timedelta(days=args.months * 30)
+    rng = random.Random(args.seed)
+
+    with app.app_context():
+        db.session.execute(db.text('PRAGMA synchronous=OFF'))
+        seed_menu()
+        t0 = time.perf_counter()
+        customers, riders = generate_users(rng, args.users, args.riders, args.batch, start - timedelta(days=30))
+        promotions = generate_promotions(rng, args.promotions, end)
+        generate_orders(rng, args.orders, customers, riders, promotions, start, end, args.batch,
+                        args.prefix, args.events)
+        db.session.execute(db.text('ANALYZE'))
+        db.session.commit()
+        # Cached pages in running workers pick up the new rows
+        page_cache.invalidate('home', 'menu', 'admin')
+        print(f'done in {time.perf_counter() - t0:.1f}s')
+
+if __name__ == '__main__':
+    main()
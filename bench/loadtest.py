@@ -0,0 +1,335 @@
+# Load-testing harness.
+#
+# Runs scripted customer, admin and rider sessions against the app, either
+# in-process through the Flask test client (the default; it uses the app
+# database, so point it at a copy) or over HTTP against a running instance
+# with --url. Customers sign up once, then loop: browse / and /menu, add
+# items to the cart (/api/track_popularity), go through /checkout,
+# /api/apply-promo and /place_order, and poll /my-orders. Admins move placed
+# orders to preparing and ready, and riders accept and complete ready ones.
+#
+# The report gives requests per second, latency percentiles and error rates
+# per step. Errors are exceptions and HTTP 5xx; failures are JSON replies with
+# success false, such as a rider losing a claim, and their most common
+# message is shown. --save-baseline writes the report as JSON, and
+# --baseline compares a run with a saved one and exits 1 when a step got
+# slower, lost throughput or started failing beyond --tolerance.
+#
+#   python bench/loadtest.py --customers 8 --duration 30
+#   python bench/loadtest.py --url http://127.0.0.1:5000 --customers 16 --save-baseline bench/loadtest-baseline.json
+#   python bench/loadtest.py --url http://127.0.0.1:5000 --customers 16 --baseline bench/loadtest-baseline.json
+import argparse
+import http.client
+import json
+import os
+import random
+import re
+import sys
+import threading
+import time
+import uuid
+from collections import Counter, deque
+from urllib.parse import urlsplit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+MIN_GATED_REQUESTS = 20  # baseline steps with fewer requests are reported but not gated
+
+class InProcessClient:
+    def __init__(self, app):
+        self.client = app.test_client()
+
+    def request(self, method, path, body=None, headers=None):
+        response = self.client.open(path, method=method, json=body, headers=headers or {})
+        try:
+            return response.status_code, response.get_data()
+        finally:
+            response.close()
+
+class HttpClient:
+    # One keep-alive connection per session, with its own cookie jar
+    def __init__(self, url):
+        parts = urlsplit(url)
+        self.host = parts.hostname
+        self.port = parts.port or 80
+        self.cookies = {}
+        self.conn = None
+
+    def request(self, method, path, body=None, headers=None):
+        headers = dict(headers or {})
+        payload = None
+        if body is not None:
+            payload = json.dumps(body).encode()
+            headers['Content-Type'] = 'application/json'
+        if self.cookies:
+            headers['Cookie'] = '; '.join(f'{name}={value}' for name, value in self.cookies.items())
+        for attempt in range(2):
+            if self.conn is None:
+                self.conn = http.client.HTTPConnection(self.host, self.port, timeout=30)
+            try:
+                self.conn.request(method, path, body=payload, headers=headers)
+                response = self.conn.getresponse()
+                data = response.read()
+                break
+            except (http.client.HTTPException, ConnectionError):
+                # The server closed an idle keep-alive connection; retry once on a new one
+                self.conn.close()
+                self.conn = None
+                if attempt:
+                    raise
+        for header, value in response.getheaders():
+            if header.lower() == 'set-cookie':
+                name, _, rest = value.partition('=')
+                self.cookies[name.strip()] = rest.split(';', 1)[0]
+        return response.status, data
+
+class Stats:
+    def __init__(self):
+        self.steps = {}  # step -> {'latencies': [], 'errors': 0, 'failures': Counter()}
+        self._mutex = threading.Lock()
+
+    def record(self, step, seconds, error=False, failure=None):
+        with self._mutex:
+            entry = self.steps.setdefault(step, {'latencies': [], 'errors': 0, 'failures': Counter()})
+            entry['latencies'].append(seconds)
+            if error:
+                entry['errors'] += 1
+            if failure is not None:
+                entry['failures'][failure] += 1
+
+def percentile(values, pct):
+    if not values:
+        return 0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct / 100))]
+
+class Session:
+    def __init__(self, client, stats):
+        self.client = client
+        self.stats = stats
+
+    def step(self, name, method, path, body=None, headers=None):
+        t0 = time.perf_counter()
+        try:
+            status, data = self.client.request(method, path, body, headers)
+        except Exception as e:
+            self.stats.record(name, time.perf_counter() - t0, error=True, failure=type(e).__name__)
+            return None
+        elapsed = time.perf_counter() - t0
+        reply = None
+        if data[:1] == b'{':
+            try:
+                reply = json.loads(data)
+            except ValueError:
+                pass
+        failure = None
+        if status >= 500:
+            failure = f'HTTP {status}'
+        elif isinstance(reply, dict) and reply.get('success') is False:
+            # Drop SQLAlchemy's leading "(raised as a result of ...)" note
+            message = str(reply.get('error') or reply.get('errors') or 'success: false')
+            failure = re.sub(r'^\(raised as .*?\)\s*', '', message).split('\n', 1)[0][:120]
+        self.stats.record(name, elapsed, error=status >= 500, failure=failure)
+        return reply if reply is not None else data
+
+    def login(self, username, password):
+        reply = self.step('login', 'POST', '/login', {'username': username, 'password': password})
+        if not (isinstance(reply, dict) and reply.get('success')):
+            raise SystemExit(f'could not log in as {username}: {reply!r}')
+
+class Run:
+    def __init__(self, args, make_client):
+        self.args = args
+        self.make_client = make_client
+        self.stats = Stats()
+        self.placed = deque(maxlen=1000)  # order ids waiting for the kitchen
+        self.ready = deque(maxlen=1000)  # order ids waiting for a rider
+        self.menu = []
+        self.deadline = None
+        self.tag = uuid.uuid4().hex[:6]
+
+    def think(self, rng):
+        if self.args.think_ms:
+            time.sleep(rng.uniform(0, 2 * self.args.think_ms) / 1000)
+
+    def customer(self, index):
+        rng = random.Random(self.args.seed * 1000 + index)
+        session = Session(self.make_client(), self.stats)
+        username = f'load{self.tag}{index}'
+        session.step('signup', 'POST', '/signup', {
+            'username': username, 'email': f'{username}@example.invalid', 'password': 'loadtest',
+            'full_name': f'Load Customer {index}', 'phone': f'9{rng.randrange(10 ** 9):09d}'})
+        session.login(username, 'loadtest')
+        since = 0
+        while time.monotonic() < self.deadline:
+            session.step('browse /', 'GET', '/')
+            session.step('browse /menu', 'GET', '/menu')
+            cart = rng.sample(self.menu, min(len(self.menu), rng.randint(1, 4)))
+            for item in cart:
+                session.step('track_popularity', 'POST', '/api/track_popularity', {'item_name': item['name']})
+            self.think(rng)
+            session.step('checkout', 'GET', '/checkout')
+            session.step('apply-promo', 'POST', '/api/apply-promo', {'promo_code': self.args.promo})
+            reply = session.step('place_order', 'POST', '/place_order', {
+                'customer_name': f'Load Customer {index}', 'customer_phone': '9876543210',
+                'customer_address': f'{index} Load Test Street, Hyderabad', 'payment_method': rng.choice(['cash', 'upi']),
+                'items': [{'name': item['name'], 'price': item['price'], 'quantity': rng.randint(1, 3),
+                           'emoji': item['emoji']} for item in cart]},
+                headers={'Idempotency-Key': uuid.uuid4().hex})
+            if isinstance(reply, dict) and reply.get('success'):
+                self.placed.append(reply['order_id'])
+            for _ in range(self.args.polls):
+                self.think(rng)
+                session.step('my-orders', 'GET', '/my-orders')
+                reply = session.step('my-orders-status', 'GET', f'/api/my-orders-status?since={since}')
+                if isinstance(reply, dict):
+                    since = reply.get('cursor', since)
+
+    def admin(self, index):
+        rng = random.Random(self.args.seed * 1000 + 500 + index)
+        session = Session(self.make_client(), self.stats)
+        session.login(self.args.admin_user, self.args.admin_password)
+        while time.monotonic() < self.deadline:
+            try:
+                order_id = self.placed.popleft()
+            except IndexError:
+                session.step('admin delivery_assignments', 'GET', '/admin/delivery_assignments')
+                time.sleep(0.05)
+                continue
+            session.step('admin update_order', 'POST', '/admin/update_order', {'order_id': order_id, 'status': 'preparing'})
+            self.think(rng)
+            reply = session.step('admin update_order', 'POST', '/admin/update_order', {'order_id': order_id, 'status': 'ready'})
+            if isinstance(reply, dict) and reply.get('success'):
+                self.ready.append(order_id)
+
+    def rider(self, index):
+        rng = random.Random(self.args.seed * 1000 + 900 + index)
+        session = Session(self.make_client(), self.stats)
+        session.login(self.args.rider_user, self.args.rider_password)
+        while time.monotonic() < self.deadline:
+            session.step('rider /delivery', 'GET', '/delivery')
+            try:
+                order_id = self.ready.popleft()
+            except IndexError:
+                time.sleep(0.05)
+                continue
+            # Auto-assignment may already have given the order to a rider; both
+            # outcomes are normal, so only the completion is checked
+            session.step('rider accept', 'POST', '/delivery/accept', {'order_id': order_id})
+            self.think(rng)
+            session.step('rider complete', 'POST', '/delivery/complete', {'order_id': order_id})
+
+    def load_menu(self):
+        session = Session(self.make_client(), Stats())
+        session.login(self.args.admin_user, self.args.admin_password)
+        reply = session.step('stock_items', 'GET', '/admin/stock_items')
+        self.menu = [{'name': item['name'], 'price': item['price'], 'emoji': item['emoji'] or ''}
+                     for item in reply.get('items', []) if item['in_stock']] if isinstance(reply, dict) else []
+        if not self.menu:
+            raise SystemExit(f'no menu items to order: {reply!r}')
+
+    def go(self):
+        self.load_menu()
+        workers = ([threading.Thread(target=self.customer, args=(i,)) for i in range(self.args.customers)]
+                   + [threading.Thread(target=self.admin, args=(i,)) for i in range(self.args.admins)]
+                   + [threading.Thread(target=self.rider, args=(i,)) for i in range(self.args.riders)])
+        started = time.monotonic()
+        self.deadline = started + self.args.duration
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        return report(self.stats, time.monotonic() - started)
+
+def report(stats, elapsed):
+    steps = {}
+    for name, entry in sorted(stats.steps.items()):
+        latencies = entry['latencies']
+        failures = sum(entry['failures'].values())
+        steps[name] = {
+            'requests': len(latencies),
+            'rps': round(len(latencies) / elapsed, 2),
+            'p50_ms': round(percentile(latencies, 50) * 1000, 2),
+            'p95_ms': round(percentile(latencies, 95) * 1000, 2),
+            'p99_ms': round(percentile(latencies, 99) * 1000, 2),
+            'max_ms': round(max(latencies) * 1000, 2),
+            'error_rate': round(entry['errors'] / len(latencies), 4),
+            'failure_rate': round(failures / len(latencies), 4),
+            'top_failure': entry['failures'].most_common(1)[0][0] if failures else None,
+        }
+    total = sum(step['requests'] for step in steps.values())
+    return {'seconds': round(elapsed, 2), 'requests': total, 'rps': round(total / elapsed, 2), 'steps': steps}
+
+def print_report(result):
+    print(f"{result['requests']} requests in {result['seconds']}s = {result['rps']} req/s")
+    print(f"{'step':>28} {'count':>7} {'req/s':>8} {'p50ms':>8} {'p95ms':>8} {'p99ms':>8} {'maxms':>8} {'err%':>6} {'fail%':>6}")
+    for name, step in result['steps'].items():
+        print(f"{name:>28} {step['requests']:7d} {step['rps']:8.2f} {step['p50_ms']:8.2f} {step['p95_ms']:8.2f} "
+              f"{step['p99_ms']:8.2f} {step['max_ms']:8.2f} {step['error_rate'] * 100:6.2f} {step['failure_rate'] * 100:6.2f}"
+              + (f"  {step['top_failure']}" if step['top_failure'] else ''))
+
+def regressions(result, baseline, tolerance):
+    found = []
+    if result['rps'] < baseline['rps'] * (1 - tolerance):
+        found.append(f"throughput {result['rps']} req/s < baseline {baseline['rps']}")
+    for name, base in baseline['steps'].items():
+        if base['requests'] < MIN_GATED_REQUESTS:
+            continue  # too few samples for stable percentiles, e.g. signup and login
+        step = result['steps'].get(name)
+        if step is None:
+            found.append(f'{name}: not exercised')
+            continue
+        if step['p95_ms'] > base['p95_ms'] * (1 + tolerance):
+            found.append(f"{name}: p95 {step['p95_ms']}ms > baseline {base['p95_ms']}ms")
+        for rate in ('error_rate', 'failure_rate'):
+            if step[rate] > base[rate] + tolerance / 10:
+                found.append(f'{name}: {rate} {step[rate]} > baseline {base[rate]}')
+    return found
+
+def main():
+    parser = argparse.ArgumentParser(description='Drive customer, admin and rider scenarios and report capacity')
+    parser.add_argument('--url', help='base URL of a running instance; in-process test client if omitted')
+    parser.add_argument('--customers', type=int, default=8)
+    parser.add_argument('--admins', type=int, default=1)
+    parser.add_argument('--riders', type=int, default=1)
+    parser.add_argument('--duration', type=float, default=30, help='seconds')
+    parser.add_argument('--think-ms', type=float, default=0, help='mean pause between a customer\'s actions')
+    parser.add_argument('--polls', type=int, default=2, help='/my-orders polls after each order')
+    parser.add_argument('--promo', default='WELCOME20', help='code checked at /api/apply-promo (never redeemed)')
+    parser.add_argument('--admin-user', default='admin')
+    parser.add_argument('--admin-password', default='cupadmin')
+    parser.add_argument('--rider-user', default='delivery')
+    parser.add_argument('--rider-password', default='delivery123')
+    parser.add_argument('--seed', type=int, default=11)
+    parser.add_argument('--json', help='also write the report here')
+    parser.add_argument('--save-baseline', help='write the report here as the new baseline')
+    parser.add_argument('--baseline', help='compare against this saved report')
+    parser.add_argument('--tolerance', type=float, default=0.25, help='allowed relative slowdown')
+    args = parser.parse_args()
+
+    if args.url:
+        make_client = lambda: HttpClient(args.url)  # noqa: E731
+    else:
+        from main import app  # noqa: E402
+        make_client = lambda: InProcessClient(app)  # noqa: E731
+
+    result = Run(args, make_client).go()
+    result['config'] = {key: getattr(args, key) for key in ('url', 'customers', 'admins', 'riders', 'duration',
+                                                            'think_ms', 'polls')}
+    print_report(result)
+    for path in (args.json, args.save_baseline):
+        if path:
+            with open(path, 'w') as f:
+                json.dump(result, f, indent=2)
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        found = regressions(result, baseline, args.tolerance)
+        for line in found:
+            print(f'REGRESSION {line}')
+        if found:
+            sys.exit(1)
+        print(f'no regressions against {args.baseline} (tolerance {args.tolerance:.0%})')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,168 @@
+# Microbenchmarks for the code every request runs.
+#
+# Times the BASE_TEMPLATE layout (guest and signed in), the menu page body,
+# the /place_order pricing (order_totals() and loyalty_tier()), Order.get_items()
+# decoding of compact and legacy items_json, validate_email/validate_phone,
+# and the password check done by /login. Each case is calibrated to run for at
+# least --min-time per repetition. It gets --warmup unrecorded repetitions and
+# then --repeat timed ones with the garbage collector off, and the min, median
+# and max time per call are reported. --save-baseline writes the results as
+# JSON. --baseline compares with a saved run and exits 1 when a case's min and
+# median are both slower than the baseline by more than --tolerance; needing
+# both keeps a single noisy repetition from failing the run. Nothing is
+# written to the database.
+#
+#   python bench/microbench.py --save-baseline bench/microbench-baseline.json
+#   python bench/microbench.py --baseline bench/microbench-baseline.json --only get_items
+import argparse
+import gc
+import json
+import os
+import platform
+import re
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from main import (app, db, MenuItem, User, Order, Promotion, BASE_TEMPLATE, CONTENT_SLOT,  # noqa: E402
+                  menu_codebook, encode_order_items, menu_content_html, order_totals, loyalty_tier,
+                  validate_email, validate_phone)
+from flask import render_template_string  # noqa: E402
+from werkzeug.security import generate_password_hash, check_password_hash  # noqa: E402
+
+EMAILS = ['priya.sharma@example.com', 'rohan_92@mail.co.in', 'not-an-email', 'a@b', 'first.last+food@biryani.club',
+          'x' * 60 + '@example.com', 'spaces in@example.com', 'imran@hyd.example.org']
+PHONES = ['9876543210', '+919876543210', '98765', '919876543210123', '98765-43210', '8123456789', '', '7000000000']
+
+def sample_cart():
+    menu = db.session.query(MenuItem.name, MenuItem.price, MenuItem.emoji).order_by(MenuItem.id).limit(4).all()
+    if not menu:
+        raise SystemExit('the menu table is empty; seed it or run bench/generate_data.py first')
+    return [{'name': name, 'price': price, 'quantity': index % 3 + 1, 'emoji': emoji or ''}
+            for index, (name, price, emoji) in enumerate(menu)]
+
+def build_cases():
+    cart = sample_cart()
+    menu_codebook.refresh(force=True)
+    customer = User(username='bench', full_name='Bench Customer', loyalty_points=240, loyalty_tier='silver',
+                    is_admin=False, is_delivery=False)
+    promo = Promotion(code='BENCH10', discount_type='percent', discount_value=10)
+    compact = Order(items_json=encode_order_items(cart))
+    legacy = Order(items_json=json.dumps(cart))
+    password_hash = generate_password_hash('correct horse')
+
+    def layout(user):
+        return lambda: render_template_string(BASE_TEMPLATE, title='Menu - Biryani Club', content=CONTENT_SLOT,
+                                              current_user=user, extra_scripts='')
+
+    def pricing():
+        subtotal, promo_discount, loyalty_discount, total = order_totals(cart, promo, 100, customer.loyalty_points)
+        return loyalty_tier(customer.loyalty_points - 100 + int(total / 10))
+
+    def decode(order):
+        def run():
+            order.__dict__.pop('_decoded_items', None)  # time the decode, not the memo
+            return order.get_items()
+        return run
+
+    # name -> (callable, calls it makes per invocation)
+    return {
+        'base_template_guest': (layout(None), 1),
+        'base_template_user': (layout(customer), 1),
+        'menu_html': (menu_content_html, 1),
+        'order_totals': (pricing, 1),
+        'get_items_compact': (decode(compact), 1),
+        'get_items_legacy': (decode(legacy), 1),
+        'validate_email': (lambda: [validate_email(email) for email in EMAILS], len(EMAILS)),
+        'validate_phone': (lambda: [validate_phone(phone) for phone in PHONES], len(PHONES)),
+        'check_password_hash': (lambda: check_password_hash(password_hash, 'correct horse'), 1),
+    }
+
+def run_batch(fn, number):
+    gc_was_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        t0 = time.perf_counter()
+        for _ in range(number):
+            fn()
+        return time.perf_counter() - t0
+    finally:
+        if gc_was_enabled:
+            gc.enable()
+
+def calibrate(fn, min_time):
+    # Smallest 1, 2, 5, 10, ... batch taking at least min_time, as timeit does
+    number = 1
+    while True:
+        for factor in (1, 2, 5):
+            if run_batch(fn, number * factor) >= min_time:
+                return number * factor
+        number *= 10
+
+def measure(fn, calls, warmup, repeat, min_time):
+    number = calibrate(fn, min_time)
+    for _ in range(warmup):
+        run_batch(fn, number)
+    per_call = sorted(run_batch(fn, number) / (number * calls) * 1e6 for _ in range(repeat))
+    return {'number': number, 'repeat': repeat, 'min_us': round(per_call[0], 3),
+            'median_us': round(statistics.median(per_call), 3), 'max_us': round(per_call[-1], 3)}
+
+def regressions(result, baseline, tolerance):
+    found = []
+    for name, base in baseline['cases'].items():
+        case = result['cases'].get(name)
+        if case is None:
+            continue  # filtered out with --only
+        if case['min_us'] > base['min_us'] * (1 + tolerance) and case['median_us'] > base['median_us'] * (1 + tolerance):
+            found.append(f"{name}: min {case['min_us']}us median {case['median_us']}us > "
+                         f"baseline {base['min_us']}us / {base['median_us']}us")
+    return found
+
+def main():
+    parser = argparse.ArgumentParser(description='Time the per-request hot paths')
+    parser.add_argument('--only', help='regex of case names to run')
+    parser.add_argument('--warmup', type=int, default=3, help='unrecorded repetitions per case')
+    parser.add_argument('--repeat', type=int, default=15, help='timed repetitions per case')
+    parser.add_argument('--min-time', type=float, default=0.05, help='seconds per repetition')
+    parser.add_argument('--json', help='also write the results here')
+    parser.add_argument('--save-baseline', help='write the results here as the new baseline')
+    parser.add_argument('--baseline', help='compare against these saved results')
+    parser.add_argument('--tolerance', type=float, default=0.15, help='allowed relative slowdown')
+    args = parser.parse_args()
+
+    result = {'python': platform.python_version(), 'machine': platform.machine(), 'cases': {}}
+    with app.test_request_context('/'):
+        cases = build_cases()
+        baseline = None
+        if args.baseline:
+            with open(args.baseline) as f:
+                baseline = json.load(f)
+        print(f"{'case':>22} {'calls':>8} {'min us':>10} {'median us':>10} {'max us':>10} {'vs base':>8}")
+        for name, (fn, calls) in cases.items():
+            if args.only and not re.search(args.only, name):
+                continue
+            case = measure(fn, calls, args.warmup, args.repeat, args.min_time)
+            result['cases'][name] = case
+            base = baseline['cases'].get(name) if baseline else None
+            change = f"{case['median_us'] / base['median_us'] - 1:+8.1%}" if base else ''
+            print(f"{name:>22} {case['number'] * calls:8d} {case['min_us']:10.2f} {case['median_us']:10.2f} "
+                  f"{case['max_us']:10.2f} {change}")
+            db.session.rollback()
+
+    for path in (args.json, args.save_baseline):
+        if path:
+            with open(path, 'w') as f:
+                json.dump(result, f, indent=2)
+    if baseline:
+        if (baseline.get('python'), baseline.get('machine')) != (result['python'], result['machine']):
+            print(f"warning: baseline is from Python {baseline.get('python')} on {baseline.get('machine')}")
+        found = regressions(result, baseline, args.tolerance)
+        for line in found:
+            print(f'REGRESSION {line}')
+        if found:
+            sys.exit(1)
+        print(f'no regressions against {args.baseline} (tolerance {args.tolerance:.0%})')
+
+if __name__ == '__main__':
+    main()
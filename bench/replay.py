@@ -0,0 +1,300 @@
+# Replays captured production traffic against a local instance.
+#
+# Reads the JSON lines written by the traffic recorder (TRAFFIC_CAPTURE_PATH
+# in main.py) and sends the same requests in the same order. The gaps
+# between them are kept, divided by --speed (--speed 0 sends each request as
+# soon as the previous one from the same session finishes). Each captured
+# user gets their own session in the role they had: customers log in as
+# synth<N> accounts from bench/generate_data.py when --customer-ids is given,
+# and sign up fresh accounts otherwise. Riders log in as synthrider<N> with
+# --rider-ids, or share --rider-user. Admins share --admin-user. Guest
+# requests are spread over --guest-workers sessions. Login, signup and logout
+# requests, form posts and event streams are left out, because the replayer
+# manages sessions itself. Orders placed during the replay stand in for the
+# captured ones in later paths and bodies. Orders from before the capture
+# window do not exist locally, so requests for them 404 on every build alike.
+#
+# The report gives per-route latency percentiles, 5xx errors, how often the
+# status differed from the captured one, and the captured p50 for reference.
+# To compare two builds, seed two copies of the same dataset with
+# generate_data.py, replay against the first build with --save-baseline, then
+# against the second with --baseline. The second run prints per-route changes
+# and exits 1 when a route's p95 or error rate regressed beyond --tolerance.
+# --compare OLD NEW prints the same table for two saved reports.
+#
+#   python bench/replay.py traffic.jsonl --url http://127.0.0.1:5000 --speed 4 --customer-ids 3-20002 --save-baseline before.json
+#   python bench/replay.py traffic.jsonl --url http://127.0.0.1:5001 --speed 4 --customer-ids 3-20002 --baseline before.json
+#   python bench/replay.py --compare before.json after.json
+import argparse
+import itertools
+import json
+import os
+import re
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from loadtest import HttpClient, InProcessClient, MIN_GATED_REQUESTS, percentile  # noqa: E402
+
+SESSION_ENDPOINTS = {'login', 'signup', 'logout'}
+SYNTHETIC_PASSWORD = 'synthetic'  # bench/generate_data.py accounts
+LATE_SECONDS = 0.01  # sleep jitter below this is not counted as lag
+
+def load_capture(paths, routes=None, limit=None):
+    records, skipped, unreadable = [], Counter(), 0
+    for path in paths:
+        with open(path) as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    unreadable += 1  # a worker killed mid-write leaves a partial last line
+                    continue
+                if record.get('stream') or record.get('form') or record.get('endpoint') in SESSION_ENDPOINTS:
+                    skipped[record.get('endpoint')] += 1
+                elif routes is None or routes.search(f"{record['method']} {record['route']}"):
+                    records.append(record)
+    records.sort(key=lambda record: record['t'])
+    return records[:limit] if limit else records, skipped, unreadable
+
+def id_range(text):
+    if not text:
+        return None
+    first, _, last = text.partition('-')
+    return itertools.cycle(range(int(first), int(last or first) + 1))
+
+class Accounts:
+    def __init__(self, args):
+        self.args = args
+        self.customer_ids = id_range(args.customer_ids)
+        self.rider_ids = id_range(args.rider_ids)
+
+    def sign_in(self, client, role):
+        args = self.args
+        if role == 'admin':
+            username, password = args.admin_user, args.admin_password
+        elif role == 'rider':
+            username, password = ((f'synthrider{next(self.rider_ids)}', SYNTHETIC_PASSWORD) if self.rider_ids
+                                  else (args.rider_user, args.rider_password))
+        elif self.customer_ids:
+            username, password = f'synth{next(self.customer_ids)}', SYNTHETIC_PASSWORD
+        else:
+            tag = uuid.uuid4().hex[:10]
+            username, password = f'replay-{tag}', 'replay-password'
+            status, data = client.request('POST', '/signup', {
+                'username': username, 'email': f'{username}@example.invalid', 'password': password,
+                'full_name': 'Replay Customer', 'phone': '9000000000'})
+            if status != 200 or not json.loads(data).get('success'):
+                raise SystemExit(f'could not sign up {username}: {status} {data[:200]!r}')
+            return
+        status, data = client.request('POST', '/login', {'username': username, 'password': password})
+        if status != 200 or not json.loads(data).get('success'):
+            raise SystemExit(f'could not log in as {username} ({role}): {status} {data[:200]!r}')
+
+class Replay:
+    def __init__(self, args, make_client, records):
+        self.args = args
+        self.make_client = make_client
+        self.records = records
+        self.order_ids = {}  # captured order id -> the one placed during the replay
+        self.routes = {}  # "METHOD route" -> {'latencies': [], 'captured': [], 'errors': 0, 'status_changed': 0}
+        self.lags = []
+        self._mutex = threading.Lock()
+
+    def lanes(self):
+        # One session per captured user, in the order they first appear, and
+        # a few shared guest sessions
+        lanes = {}
+        guests = [('guest', index) for index in range(self.args.guest_workers)]
+        guest_turn = itertools.cycle(guests)
+        for record in self.records:
+            key = (record['role'], record['actor']) if record.get('actor') else next(guest_turn)
+            lanes.setdefault(key, []).append(record)
+        return lanes
+
+    def rewrite(self, record):
+        path, _, query = record['path'].partition('?')
+        with self._mutex:
+            path = '/'.join(self.order_ids.get(part, part) for part in path.split('/'))
+            body = record.get('body')
+            if isinstance(body, dict):
+                body = {key: value for key, value in body.items() if key != 'version'}  # no stale concurrency checks
+                if body.get('order_id') in self.order_ids:
+                    body['order_id'] = self.order_ids[body['order_id']]
+        headers = {'Idempotency-Key': uuid.uuid4().hex} if record.get('idempotent') else None
+        return path + (f'?{query}' if query else ''), body, headers
+
+    def send(self, client, record):
+        path, body, headers = self.rewrite(record)
+        t0 = time.perf_counter()
+        try:
+            status, data = client.request(record['method'], path, body, headers)
+        except Exception:
+            status, data = 599, b''
+        elapsed = time.perf_counter() - t0
+        if record.get('order_id') and data[:1] == b'{':
+            try:
+                placed = json.loads(data).get('order_id')
+            except ValueError:
+                placed = None
+            if placed:
+                with self._mutex:
+                    self.order_ids[record['order_id']] = placed
+        with self._mutex:
+            entry = self.routes.setdefault(f"{record['method']} {record['route']}",
+                                           {'latencies': [], 'captured': [], 'errors': 0, 'status_changed': 0})
+            entry['latencies'].append(elapsed)
+            entry['captured'].append(record.get('ms', 0) / 1000)
+            entry['errors'] += status >= 500
+            entry['status_changed'] += status != record.get('status')
+
+    def play(self, client, records, start):
+        first = self.records[0]['t']
+        for record in records:
+            if self.args.speed:
+                due = start + (record['t'] - first) / self.args.speed
+                wait = due - time.perf_counter()
+                if wait > 0:
+                    time.sleep(wait)
+                elif -wait > LATE_SECONDS:
+                    with self._mutex:
+                        self.lags.append(-wait)  # behind schedule: the target is slower than production was
+            self.send(client, record)
+
+    def go(self):
+        accounts = Accounts(self.args)
+        lanes = []
+        for (role, _), records in self.lanes().items():
+            client = self.make_client()
+            if role != 'guest':
+                accounts.sign_in(client, role)
+            lanes.append((client, records))
+        print(f'replaying {len(self.records)} requests over {len(lanes)} sessions')
+        start = time.perf_counter() + 0.1
+        threads = [threading.Thread(target=self.play, args=(client, records, start), daemon=True)
+                   for client, records in lanes]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return self.report(time.perf_counter() - start)
+
+    def report(self, elapsed):
+        routes = {}
+        for name, entry in sorted(self.routes.items()):
+            latencies = entry['latencies']
+            routes[name] = {
+                'requests': len(latencies),
+                'p50_ms': round(percentile(latencies, 50) * 1000, 2),
+                'p95_ms': round(percentile(latencies, 95) * 1000, 2),
+                'max_ms': round(max(latencies) * 1000, 2),
+                'error_rate': round(entry['errors'] / len(latencies), 4),
+                'status_changed': entry['status_changed'],
+                'captured_p50_ms': round(percentile(entry['captured'], 50) * 1000, 2),
+            }
+        return {'requests': len(self.records), 'duration_s': round(elapsed, 2), 'speed': self.args.speed,
+                'lag_p95_ms': round(percentile(self.lags, 95) * 1000, 2), 'late_requests': len(self.lags),
+                'routes': routes}
+
+def print_report(result):
+    print(f"{result['requests']} requests in {result['duration_s']}s at {result['speed']}x; "
+          f"{result['late_requests']} started over {LATE_SECONDS * 1000:.0f}ms late (p95 lag {result['lag_p95_ms']}ms)")
+    print(f"{'route':>44} {'count':>7} {'p50ms':>8} {'p95ms':>8} {'maxms':>8} {'err%':>6} {'status!=':>8} {'prod p50':>8}")
+    for name, route in result['routes'].items():
+        print(f"{name[:44]:>44} {route['requests']:7d} {route['p50_ms']:8.2f} {route['p95_ms']:8.2f} "
+              f"{route['max_ms']:8.2f} {route['error_rate'] * 100:6.2f} {route['status_changed']:8d} "
+              f"{route['captured_p50_ms']:8.2f}")
+
+def print_comparison(old, new):
+    print(f"{'route':>44} {'count':>7} {'p50 before':>10} {'p50 after':>10} {'change':>8} "
+          f"{'p95 before':>10} {'p95 after':>10} {'change':>8}")
+    for name in sorted(set(old['routes']) | set(new['routes'])):
+        before, after = old['routes'].get(name), new['routes'].get(name)
+        if before is None or after is None:
+            print(f"{name[:44]:>44} only {'after' if before is None else 'before'}")
+            continue
+        changes = [f"{after[key] / before[key] - 1:+8.1%}" if before[key] else f"{'':>8}" for key in ('p50_ms', 'p95_ms')]
+        print(f"{name[:44]:>44} {after['requests']:7d} {before['p50_ms']:10.2f} {after['p50_ms']:10.2f} {changes[0]} "
+              f"{before['p95_ms']:10.2f} {after['p95_ms']:10.2f} {changes[1]}")
+
+def regressions(result, baseline, tolerance, routes=None):
+    found = []
+    for name, base in baseline['routes'].items():
+        if base['requests'] < MIN_GATED_REQUESTS or (routes and not routes.search(name)):
+            continue
+        route = result['routes'].get(name)
+        if route is None:
+            found.append(f'{name}: not replayed')
+            continue
+        if route['p95_ms'] > base['p95_ms'] * (1 + tolerance):
+            found.append(f"{name}: p95 {route['p95_ms']}ms > baseline {base['p95_ms']}ms")
+        if route['error_rate'] > base['error_rate'] + tolerance / 10:
+            found.append(f"{name}: error_rate {route['error_rate']} > baseline {base['error_rate']}")
+    return found
+
+def main():
+    parser = argparse.ArgumentParser(description='Replay captured traffic and compare per-route latency')
+    parser.add_argument('captures', nargs='*', help='traffic capture files (JSON lines)')
+    parser.add_argument('--url', help='base URL of a running instance; in-process test client if omitted')
+    parser.add_argument('--speed', type=float, default=1, help='time compression; 0 replays without pauses')
+    parser.add_argument('--routes', help='regex of "METHOD route" to replay')
+    parser.add_argument('--limit', type=int, help='replay only the first N requests')
+    parser.add_argument('--guest-workers', type=int, default=4, help='sessions shared by guest requests')
+    parser.add_argument('--customer-ids', help='A-B: log customers in as synth<A>..synth<B> instead of signing up')
+    parser.add_argument('--rider-ids', help='A-B: log riders in as synthrider<A>..synthrider<B>')
+    parser.add_argument('--admin-user', default='admin')
+    parser.add_argument('--admin-password', default='cupadmin')
+    parser.add_argument('--rider-user', default='delivery')
+    parser.add_argument('--rider-password', default='delivery123')
+    parser.add_argument('--json', help='also write the report here')
+    parser.add_argument('--save-baseline', help='write the report here as the new baseline')
+    parser.add_argument('--baseline', help='compare against this saved report')
+    parser.add_argument('--tolerance', type=float, default=0.25, help='allowed relative slowdown')
+    parser.add_argument('--compare', nargs=2, metavar=('OLD', 'NEW'), help='compare two saved reports and exit')
+    args = parser.parse_args()
+
+    if args.compare:
+        reports = []
+        for path in args.compare:
+            with open(path) as f:
+                reports.append(json.load(f))
+        print_comparison(*reports)
+        return
+    if not args.captures:
+        parser.error('give at least one capture file, or --compare OLD NEW')
+
+    routes = re.compile(args.routes) if args.routes else None
+    records, skipped, unreadable = load_capture(args.captures, routes, args.limit)
+    if skipped or unreadable:
+        print(f'left out: {dict(skipped)}' + (f'; {unreadable} unreadable lines' if unreadable else ''))
+    if not records:
+        raise SystemExit('nothing to replay')
+
+    if args.url:
+        make_client = lambda: HttpClient(args.url)  # noqa: E731
+    else:
+        from main import app  # noqa: E402
+        make_client = lambda: InProcessClient(app)  # noqa: E731
+
+    result = Replay(args, make_client, records).go()
+    print_report(result)
+    for path in (args.json, args.save_baseline):
+        if path:
+            with open(path, 'w') as f:
+                json.dump(result, f, indent=2)
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        print_comparison(baseline, result)
+        found = regressions(result, baseline, args.tolerance, routes)
+        for line in found:
+            print(f'REGRESSION {line}')
+        if found:
+            sys.exit(1)
+        print(f'no regressions against {args.baseline} (tolerance {args.tolerance:.0%})')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,101 @@
+# Simulation harness for the delivery dispatcher.
+#
+# Drives DeliveryDispatcher through a synthetic rush (Poisson order arrivals,
+# random delivery times) entirely in memory and reports wait times, load
+# balance and the cost of each assignment.
+#
+#   python bench/simulate_dispatch.py --riders 300 --orders-per-hour 2400 --hours 4
+import argparse
+import heapq
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from main import DeliveryDispatcher, MAX_ACTIVE_DELIVERIES  # noqa: E402
+
+def percentile(values, pct):
+    if not values:
+        return 0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct / 100))]
+
+def simulate(riders, orders_per_hour, hours, priority_share, max_load, seed):
+    rng = random.Random(seed)
+    dispatcher = DeliveryDispatcher(max_load=max_load)
+    dispatcher.reset({rider_id: 0 for rider_id in range(1, riders + 1)}, [])
+    start = datetime(2024, 1, 1, 12, 0)
+
+    # Event queue of (minute, seq, kind, payload)
+    events = []
+    seq = 0
+    minute = 0.0
+    rate = orders_per_hour / 60.0
+    while True:
+        minute += rng.expovariate(rate)
+        if minute > hours * 60:
+            break
+        seq += 1
+        heapq.heappush(events, (minute, seq, 'ready', ('O%d' % seq, rng.random() < priority_share)))
+
+    ready_at = {}
+    priority_orders = set()
+    waits, priority_waits = [], []
+    assign_ns = []
+    max_queue = peak_load = 0
+    while events:
+        now, _, kind, payload = heapq.heappop(events)
+        if kind == 'ready':
+            order_id, priority = payload
+            ready_at[order_id] = now
+            if priority:
+                priority_orders.add(order_id)
+            dispatcher.enqueue(order_id, start + timedelta(minutes=now), priority)
+        else:
+            dispatcher.released(payload)
+        max_queue = max(max_queue, dispatcher.queue_length())
+
+        while True:
+            t0 = time.perf_counter_ns()
+            pair = dispatcher.pop_assignment()
+            assign_ns.append(time.perf_counter_ns() - t0)
+            if pair is None:
+                break
+            order_id, rider_id = pair
+            wait = now - ready_at.pop(order_id)
+            (priority_waits if order_id in priority_orders else waits).append(wait)
+            peak_load = max(peak_load, dispatcher.load_of(rider_id))
+            seq += 1
+            heapq.heappush(events, (now + rng.uniform(15, 40), seq, 'delivered', rider_id))
+
+    return {
+        'assigned': len(waits) + len(priority_waits),
+        'unassigned': len(ready_at),
+        'wait_p50_min': percentile(waits, 50),
+        'wait_p95_min': percentile(waits, 95),
+        'priority_wait_p95_min': percentile(priority_waits, 95),
+        'max_queue': max_queue,
+        'peak_rider_load': peak_load,
+        'assign_p50_us': percentile(assign_ns, 50) / 1000,
+        'assign_p99_us': percentile(assign_ns, 99) / 1000,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description='Simulate automatic delivery assignment')
+    parser.add_argument('--riders', type=int, default=300)
+    parser.add_argument('--orders-per-hour', type=int, default=2400)
+    parser.add_argument('--hours', type=float, default=4)
+    parser.add_argument('--priority-share', type=float, default=0.05)
+    parser.add_argument('--max-load', type=int, default=MAX_ACTIVE_DELIVERIES)
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    report = simulate(args.riders, args.orders_per_hour, args.hours,
+                      args.priority_share, args.max_load, args.seed)
+    for key, value in report.items():
+        print(f"{key:>24}: {value:.2f}" if isinstance(value, float) else f"{key:>24}: {value}")
+
+if __name__ == '__main__':
+    main()
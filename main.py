@@ -1,18 +1,44 @@
 # Import necessary libraries and modules
-from flask import Flask, render_template_string, request, redirect, url_for, session, jsonify, flash
+from flask import Flask, render_template_string, request, redirect, url_for, session, jsonify, flash, Response, stream_with_context, g
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
 from datetime import datetime, timedelta
 import os
 import json
 import uuid
+import threading
+import heapq
+import time
+from collections import Counter, OrderedDict, deque
+from contextlib import contextmanager
 from werkzeug.security import generate_password_hash, check_password_hash
 from functools import wraps
 import re  # For input validation
+import math
+import sqlite3
+import bisect
+import hmac
+import hashlib
+import mmap
+import struct
+import stat
+import sys
+import gc
+import signal
+import atexit
+import tracemalloc
+import random
+try:
+    import fcntl  # POSIX only; without it metrics are kept per worker
+except ImportError:
+    fcntl = None
 
 # Initialize Flask app
 app = Flask(__name__)
 app.secret_key = os.environ.get('SECRET_KEY', 'ag3su65fiyv6i86i8eruijterie8teuitfwtu7d')
-app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///biryani_club.db'
+app.config['SQLALCHEMY_DATABASE_URI'] = os.environ.get('DATABASE_URL', 'sqlite:///biryani_club.db')
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 app.config['PERMANENT_SESSION_LIFETIME'] = timedelta(days=1)  # Session timeout
 
@@ -44,6 +70,10 @@ class User(db.Model):
     is_delivery = db.Column(db.Boolean, default=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     last_login = db.Column(db.DateTime)
+    priority_credits = db.Column(db.Integer, nullable=False, default=0, server_default='0')  # Unused "Priority Delivery" rewards
+    last_lat = db.Column(db.Float)  # Last location ping (delivery team)
+    last_lng = db.Column(db.Float)
+    last_location_at = db.Column(db.DateTime)
 
 class Order(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -62,11 +92,53 @@ class Order(db.Model):
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'))
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     estimated_delivery = db.Column(db.DateTime)
+    ready_at = db.Column(db.DateTime)
+    delivered_at = db.Column(db.DateTime)
     rating = db.Column(db.Integer)  # Order rating 1-5
     feedback = db.Column(db.Text)  # Customer feedback
+    version = db.Column(db.Integer, nullable=False, default=0, server_default='0')  # Optimistic concurrency counter
+    priority = db.Column(db.Boolean, nullable=False, default=False, server_default='0')  # "Priority Delivery" reward applied
+    delivery_lat = db.Column(db.Float)  # Optional drop location shared at checkout
+    delivery_lng = db.Column(db.Float)
+
+    # Order history pages seek on these instead of sorting a customer's whole history
+    __table_args__ = (
+        db.Index('ix_order_user_history', 'user_id', 'created_at', 'id'),
+        db.Index('ix_order_phone_history', 'customer_phone', 'created_at', 'id'),
+    )
 
     def get_items(self):
-        return json.loads(self.items_json) if self.items_json else []
+        # Decoded once per instance; keyed on the raw value so a reload or
+        # an assignment to items_json is picked up. Callers get their own
+        # copies, so changing one cannot alter the memo
+        cached = self.__dict__.get('_decoded_items')
+        if cached is None or cached[0] is not self.items_json:
+            cached = (self.items_json, decode_order_items(self.items_json))
+            self.__dict__['_decoded_items'] = cached
+        return [dict(item) for item in cached[1]]
+
+class OrderEvent(db.Model):
+    # Append-only log of order transitions; id doubles as a monotonically
+    # increasing sequence clients can resume from
+    __table_args__ = {'sqlite_autoincrement': True}
+    id = db.Column(db.Integer, primary_key=True)
+    order_id = db.Column(db.String(20), db.ForeignKey('order.order_id'), nullable=False, index=True)
+    from_status = db.Column(db.String(20))  # None for a newly placed order
+    to_status = db.Column(db.String(20), nullable=False)
+    delivery_person_id = db.Column(db.Integer, db.ForeignKey('user.id'))  # Rider after the event
+    actor_id = db.Column(db.Integer, db.ForeignKey('user.id'))  # None for customers and the dispatcher
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+
+    def to_dict(self):
+        return {
+            'seq': self.id,
+            'order_id': self.order_id,
+            'from': self.from_status,
+            'to': self.to_status,
+            'delivery_person_id': self.delivery_person_id,
+            'actor_id': self.actor_id,
+            'at': self.created_at.isoformat()
+        }
 
 class Promotion(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -81,6 +153,227 @@ class Promotion(db.Model):
     usage_count = db.Column(db.Integer, default=0)
     active = db.Column(db.Boolean, default=True)
 
+# Order items storage. Older rows hold the cart as a JSON list of item dicts;
+# new rows hold [[menu_item_id, quantity, price, name, emoji], ...], which
+# drops the repeated keys and is a fraction of the size. The name and emoji
+# are kept as ordered, so renaming a menu item never changes past orders.
+# Rows from the first compact release, [menu_item_id, quantity, price], take
+# both from the current menu. Carts that cannot be encoded losslessly
+# (unknown items, extra fields) keep the old format.
+app.config.setdefault('COMPACT_ORDER_ITEMS', True)
+MENU_CODEBOOK_REFRESH_SECONDS = 30
+
+class MenuCodebook:
+    def __init__(self):
+        self.by_id = {}  # menu item id -> (name, emoji)
+        self.by_name = {}  # name -> (id, emoji)
+        self.loaded_at = None
+        self._mutex = threading.Lock()
+
+    def refresh(self, force=False):
+        # Reloads at most every MENU_CODEBOOK_REFRESH_SECONDS unless forced
+        now = time.monotonic()
+        if not force and self.loaded_at is not None and now - self.loaded_at < MENU_CODEBOOK_REFRESH_SECONDS:
+            return
+        rows = db.session.query(MenuItem.id, MenuItem.name, MenuItem.emoji).all()
+        with self._mutex:
+            self.by_id = {item_id: (name, emoji or '') for item_id, name, emoji in rows}
+            self.by_name = {name: (item_id, emoji or '') for item_id, name, emoji in rows}
+            self.loaded_at = now
+
+    def lookup_id(self, item_id):
+        entry = self.by_id.get(item_id)
+        if entry is None:
+            self.refresh()
+            entry = self.by_id.get(item_id)
+        return entry
+
+    def lookup_name(self, name):
+        entry = self.by_name.get(name)
+        if entry is None:
+            self.refresh()
+            entry = self.by_name.get(name)
+        return entry
+
+menu_codebook = MenuCodebook()
+
+def encode_order_items(cart):
+    if app.config['COMPACT_ORDER_ITEMS'] and cart:
+        rows = []
+        for item in cart:
+            entry = menu_codebook.lookup_name(item.get('name'))
+            if entry is None or set(item) != {'name', 'price', 'quantity', 'emoji'}:
+                break
+            rows.append([entry[0], item['quantity'], item['price'], item['name'], item['emoji']])
+        else:
+            return json.dumps(rows, separators=(',', ':'))
+    return json.dumps(cart)
+
+def decode_order_items(raw):
+    if not raw:
+        return []
+    rows = json.loads(raw)
+    if not rows or not isinstance(rows[0], list):
+        return rows
+    items = []
+    for item_id, quantity, price, *snapshot in rows:
+        name, emoji = snapshot or menu_codebook.lookup_id(item_id) or (f'Item #{item_id}', '')
+        items.append({'name': name, 'price': price, 'quantity': quantity, 'emoji': emoji})
+    return items
+
+# Columns added after the first release; create_all() never alters existing tables
+SCHEMA_UPGRADES = {
+    'order': {
+        'version': 'INTEGER NOT NULL DEFAULT 0',
+        'priority': 'BOOLEAN NOT NULL DEFAULT 0',
+        'delivery_lat': 'FLOAT',
+        'delivery_lng': 'FLOAT',
+        'ready_at': 'DATETIME',
+        'delivered_at': 'DATETIME',
+    },
+    'user': {
+        'priority_credits': 'INTEGER NOT NULL DEFAULT 0',
+        'last_lat': 'FLOAT',
+        'last_lng': 'FLOAT',
+        'last_location_at': 'DATETIME',
+    },
+}
+
+def estimated_deliveries_to_utc(conn):
+    # Orders from before ready_at was added had estimated_delivery written in
+    # server local time; everything since is UTC like the other timestamps
+    shift = timedelta(minutes=round((datetime.utcnow() - datetime.now()).total_seconds() / 60))
+    if not shift:
+        return
+    order = Order.__table__
+    rows = conn.execute(db.select(order.c.id, order.c.estimated_delivery)
+                        .where(order.c.estimated_delivery.isnot(None))).all()
+    if rows:
+        conn.execute(db.update(order).where(order.c.id == db.bindparam('row_id'))
+                     .values(estimated_delivery=db.bindparam('utc')),
+                     [{'row_id': row_id, 'utc': at + shift} for row_id, at in rows])
+
+# Data fixes run once, together with the column added alongside them
+SCHEMA_BACKFILLS = {
+    ('order', 'ready_at'): estimated_deliveries_to_utc,
+}
+
+def upgrade_schema():
+    inspector = db.inspect(db.engine)
+    with db.engine.begin() as conn:
+        for table, columns in SCHEMA_UPGRADES.items():
+            existing = {column['name'] for column in inspector.get_columns(table)}
+            for name, ddl in columns.items():
+                if name not in existing:
+                    conn.execute(db.text(f'ALTER TABLE "{table}" ADD COLUMN {name} {ddl}'))
+                    if (table, name) in SCHEMA_BACKFILLS:
+                        SCHEMA_BACKFILLS[table, name](conn)
+        # Likewise indexes declared after a table was first created
+        for table in db.metadata.sorted_tables:
+            for index in table.indexes:
+                index.create(conn, checkfirst=True)
+
+def log_order_event(order_id, from_status, to_status, actor_id=None, delivery_person_id=None, at=None):
+    # Added to the current session so it commits atomically with the transition
+    db.session.add(OrderEvent(order_id=order_id, from_status=from_status, to_status=to_status,
+                              actor_id=actor_id, delivery_person_id=delivery_person_id,
+                              created_at=at or datetime.utcnow()))
+    db.session.info['order_events_pending'] = True
+    if from_status != to_status:
+        db.session.info.setdefault('order_transitions', []).append(to_status)
+
+@event.listens_for(Session, 'after_commit')
+def announce_order_events(session):
+    # Let live feeds in this worker pick up the new events without waiting
+    # for their next poll
+    transitions = session.info.pop('order_transitions', ())
+    if transitions:
+        shared_counters.add_many((('order_transitions', status), 1) for status in transitions)
+    if session.info.pop('order_events_pending', False):
+        order_event_hub.wake()
+
+@event.listens_for(Session, 'after_rollback')
+def forget_order_events(session):
+    session.info.pop('order_events_pending', None)
+    session.info.pop('order_transitions', None)
+
+def order_events_since(since, limit=200, user_id=None):
+    # Events after sequence number `since`, oldest first; a primary key range scan
+    query = OrderEvent.query.filter(OrderEvent.id > since)
+    if user_id is not None:
+        query = query.join(Order, Order.order_id == OrderEvent.order_id).filter(Order.user_id == user_id)
+    return query.order_by(OrderEvent.id).limit(limit).all()
+
+# Hot JSON endpoints select only the columns they emit and turn rows straight
+# into dicts, skipping ORM identity-map hydration of wide rows (items_json,
+# addresses, feedback). Statements are built once with bind parameters, so
+# SQLAlchemy's compiled cache reuses their SQL on every call.
+RECENT_ORDER_STATUS_STMT = (db.select(Order.order_id, Order.status)
+                            .where(Order.user_id == db.bindparam('user_id'))
+                            .order_by(Order.created_at.desc(), Order.id.desc())
+                            .limit(10))
+ORDER_STATUS_CHANGES_LIMIT = 100
+ORDER_STATUS_CHANGES_STMT = (db.select(OrderEvent.id, OrderEvent.order_id, OrderEvent.to_status)
+                             .join(Order, Order.order_id == OrderEvent.order_id)
+                             .where(OrderEvent.id > db.bindparam('since'), Order.user_id == db.bindparam('user_id'))
+                             .order_by(OrderEvent.id)
+                             .limit(ORDER_STATUS_CHANGES_LIMIT))
+LATEST_EVENT_STMT = db.select(db.func.max(OrderEvent.id))
+STOCK_ITEMS_STMT = db.select(MenuItem.name, MenuItem.category, MenuItem.price, MenuItem.description,
+                             MenuItem.emoji, MenuItem.in_stock)
+UNASSIGNED_READY_STMT = (db.select(Order.order_id, Order.customer_name, Order.total, Order.priority,
+                                   Order.delivery_lat, Order.delivery_lng, Order.version)
+                         .where(Order.status == 'ready', Order.delivery_person_id.is_(None))
+                         .order_by(Order.priority.desc(), Order.created_at))
+DELIVERY_PERSONS_STMT = db.select(User.id, User.full_name).where(User.is_delivery.is_(True))
+PROMOTIONS_STMT = db.select(Promotion.id, Promotion.code, Promotion.description, Promotion.discount_type,
+                            Promotion.discount_value, Promotion.min_order, Promotion.valid_from,
+                            Promotion.valid_to, Promotion.max_usage, Promotion.usage_count, Promotion.active)
+
+def recent_order_statuses(user_id):
+    rows = db.session.execute(RECENT_ORDER_STATUS_STMT, {'user_id': user_id})
+    return [{'order_id': order_id, 'status': status} for order_id, status in rows]
+
+def next_event_cursor(events_seen, limit, last_id, newest):
+    # A full page may have more after it, so resume from its last event.
+    # Otherwise everything up to `newest` (read before the page) has been
+    # seen, other users' events included, so later polls skip past them
+    if events_seen >= limit:
+        return last_id
+    return max(last_id, newest)
+
+def order_status_changes(user_id, since):
+    # Latest status per order changed after event `since`, and the new cursor
+    newest = db.session.execute(LATEST_EVENT_STMT).scalar() or 0
+    latest = {}
+    cursor = since
+    seen = 0
+    for event_id, order_id, to_status in db.session.execute(ORDER_STATUS_CHANGES_STMT,
+                                                            {'user_id': user_id, 'since': since}):
+        latest[order_id] = to_status
+        cursor = event_id
+        seen += 1
+    cursor = next_event_cursor(seen, ORDER_STATUS_CHANGES_LIMIT, cursor, newest)
+    return [{'order_id': order_id, 'status': status} for order_id, status in latest.items()], cursor
+
+def stock_items_rows():
+    return [dict(row._mapping) for row in db.session.execute(STOCK_ITEMS_STMT)]
+
+def unassigned_ready_rows():
+    return db.session.execute(UNASSIGNED_READY_STMT).all()
+
+def delivery_person_rows():
+    return db.session.execute(DELIVERY_PERSONS_STMT).all()
+
+def promotion_rows():
+    promotions = []
+    for row in db.session.execute(PROMOTIONS_STMT):
+        promo = dict(row._mapping)
+        promo['valid_from'] = promo['valid_from'].strftime('%Y-%m-%d') if promo['valid_from'] else None
+        promo['valid_to'] = promo['valid_to'].strftime('%Y-%m-%d') if promo['valid_to'] else None
+        promotions.append(promo)
+    return promotions
+
 # Store status (default to open)
 store_status = {'open': True}
 
@@ -102,6 +395,1124 @@ def apply_security_headers(response):
     response.headers['Content-Security-Policy'] = "default-src 'self'; script-src 'self' 'unsafe-inline' https://cdn.jsdelivr.net https://cdnjs.cloudflare.com; style-src 'self' 'unsafe-inline' https://cdn.jsdelivr.net https://fonts.googleapis.com; font-src 'self' https://fonts.gstatic.com; img-src 'self' data:;"
     return response
 
+# Sampling profiler for live requests. An admin either sends the
+# X-Profile-Request header or arms an endpoint for its next N requests
+# (POST /admin/profiles/arm). A profiled request gets a sampler thread that
+# reads the request thread's stack every PROFILE_INTERVAL seconds; the result
+# is saved under PROFILE_DIR in speedscope's format and can be downloaded as
+# speedscope JSON or collapsed stacks. Arming lives in a small file that every
+# worker polls at most once per PROFILER_POLL_SECONDS, so a request that is
+# not being profiled pays one clock comparison.
+app.config.setdefault('PROFILE_DIR', os.environ.get('PROFILE_DIR', os.path.join(app.instance_path, 'profiles')))
+PROFILE_HEADER = 'X-Profile-Request'
+PROFILE_INTERVAL = 0.005  # seconds between samples
+PROFILE_KEEP = 50  # newest profiles kept on disk
+PROFILE_MAX_ARMED = 50  # requests one arming can cover
+PROFILER_POLL_SECONDS = 1.0
+SPEEDSCOPE_SCHEMA = 'https://www.speedscope.app/file-format-schema.json'
+
+class RequestSampler:
+    def __init__(self, endpoint, path, interval=PROFILE_INTERVAL):
+        self.profile_id = f'{datetime.utcnow():%Y%m%d%H%M%S%f}-{uuid.uuid4().hex[:8]}'
+        self.endpoint = endpoint
+        self.path = path
+        self.interval = interval
+        self.thread_id = threading.get_ident()
+        self.samples = Counter()  # stack, outermost frame first -> samples
+        self.started_at = datetime.utcnow()
+        self._started = time.perf_counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append((code.co_name, code.co_filename, code.co_firstlineno))
+                frame = frame.f_back
+            if stack:
+                self.samples[tuple(reversed(stack))] += 1
+
+    def finish(self):
+        # Writing the profile is left to a thread, off the request's path
+        self._stop.set()
+        duration = time.perf_counter() - self._started
+        threading.Thread(target=self._save, args=(duration,), name='profile-writer', daemon=True).start()
+
+    def _save(self, duration):
+        self._thread.join()
+        try:
+            request_profiler.save(self, duration)
+        except (OSError, ValueError) as e:
+            app.logger.warning(f'Saving profile {self.profile_id} failed: {e}')
+
+class RequestProfiler:
+    def __init__(self, directory):
+        self.directory = directory
+        self.armed_path = os.path.join(directory, 'armed.json')
+        self._armed = {}  # endpoint -> requests left, as of the last poll
+        self._polled_at = None
+
+    def _read_armed(self, fd):
+        raw = os.pread(fd, 1 << 16, 0)
+        return json.loads(raw) if raw else {}
+
+    def _write_armed(self, fd, armed):
+        os.ftruncate(fd, 0)
+        os.pwrite(fd, json.dumps(armed).encode(), 0)
+
+    @contextmanager
+    def _armed_file(self):
+        os.makedirs(self.directory, exist_ok=True)
+        fd = os.open(self.armed_path, os.O_RDWR | os.O_CREAT, 0o600)
+        try:
+            if fcntl is not None:
+                fcntl.flock(fd, fcntl.LOCK_EX)
+            yield fd
+        finally:
+            os.close(fd)
+
+    def arm(self, endpoint, requests_left):
+        with self._armed_file() as fd:
+            armed = self._read_armed(fd)
+            if requests_left > 0:
+                armed[endpoint] = requests_left
+            else:
+                armed.pop(endpoint, None)
+            self._write_armed(fd, armed)
+        self._polled_at = None
+        return armed
+
+    def armed(self):
+        try:
+            with self._armed_file() as fd:
+                return self._read_armed(fd)
+        except (OSError, ValueError):
+            return {}
+
+    def wants(self, endpoint):
+        now = time.monotonic()
+        if self._polled_at is None or now - self._polled_at >= PROFILER_POLL_SECONDS:
+            self._polled_at = now
+            self._armed = self.armed() if os.path.exists(self.armed_path) else {}
+        return endpoint in self._armed
+
+    def claim(self, endpoint):
+        # Other workers poll the same file, so take one of the armed requests
+        # under the lock rather than trusting the polled copy
+        with self._armed_file() as fd:
+            armed = self._read_armed(fd)
+            left = armed.get(endpoint, 0)
+            if left <= 0:
+                return False
+            if left == 1:
+                del armed[endpoint]
+            else:
+                armed[endpoint] = left - 1
+            self._write_armed(fd, armed)
+        self._armed = armed
+        return True
+
+    def save(self, sampler, duration):
+        frames = {}  # (name, file, line) -> index into shared frames
+        samples = []
+        weights = []
+        for stack, count in sampler.samples.items():
+            samples.append([frames.setdefault(frame, len(frames)) for frame in stack])
+            weights.append(round(count * sampler.interval, 6))
+        document = {
+            '$schema': SPEEDSCOPE_SCHEMA,
+            'name': f'{sampler.endpoint} {sampler.path}',
+            'exporter': 'biryani-club',
+            'shared': {'frames': [{'name': name, 'file': filename, 'line': line}
+                                  for name, filename, line in frames]},
+            'profiles': [{'type': 'sampled', 'name': sampler.path, 'unit': 'seconds',
+                          'startValue': 0, 'endValue': round(duration, 6),
+                          'samples': samples, 'weights': weights}],
+            'meta': {'id': sampler.profile_id, 'endpoint': sampler.endpoint, 'path': sampler.path,
+                     'started_at': sampler.started_at.isoformat(timespec='seconds') + 'Z',
+                     'seconds': round(duration, 6), 'interval': sampler.interval,
+                     'samples': sum(sampler.samples.values())},
+        }
+        os.makedirs(self.directory, exist_ok=True)
+        path = os.path.join(self.directory, f'{sampler.profile_id}.speedscope.json')
+        with open(path + '.tmp', 'w') as f:
+            json.dump(document, f, separators=(',', ':'))
+        os.replace(path + '.tmp', path)
+        for old in self.profile_files()[PROFILE_KEEP:]:
+            os.remove(os.path.join(self.directory, old))
+
+    def profile_files(self):
+        # Newest first; ids start with their UTC timestamp to the microsecond
+        if not os.path.isdir(self.directory):
+            return []
+        return sorted((name for name in os.listdir(self.directory) if name.endswith('.speedscope.json')),
+                      reverse=True)
+
+    def load(self, profile_id):
+        if not re.match(r'^\d{20}-[0-9a-f]{8}$', profile_id or ''):
+            return None
+        try:
+            with open(os.path.join(self.directory, f'{profile_id}.speedscope.json')) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+def collapsed_stacks(document):
+    # Brendan Gregg's folded format: frames root first, then the sample count
+    frames = document['shared']['frames']
+    profile = document['profiles'][0]
+    interval = document['meta']['interval']
+    lines = []
+    for stack, weight in zip(profile['samples'], profile['weights']):
+        names = ';'.join(f"{frames[index]['name']} ({os.path.basename(frames[index]['file'])}:{frames[index]['line']})"
+                         for index in stack)
+        lines.append(f'{names} {round(weight / interval)}')
+    return '\n'.join(sorted(lines)) + '\n'
+
+request_profiler = RequestProfiler(app.config['PROFILE_DIR'])
+
+@app.before_request
+def start_request_profile():
+    # Registered ahead of the request metrics, so the admin check below is
+    # not counted against the route's query budget. The user is only loaded
+    # for a signed-in request carrying the header that no arming covers
+    endpoint = request.endpoint
+    wanted = request_profiler.wants(endpoint) and request_profiler.claim(endpoint)
+    if not wanted and PROFILE_HEADER in request.headers and 'user_id' in session:
+        user = User.query.get(session['user_id'])
+        wanted = bool(user and user.is_admin)
+    if wanted:
+        g.profile_sampler = RequestSampler(str(endpoint), request.path)
+
+@app.after_request
+def note_request_profile(response):
+    sampler = g.get('profile_sampler')
+    if sampler is not None:
+        response.headers['X-Profile-Id'] = sampler.profile_id
+        if response.is_streamed:
+            response.call_on_close(g.pop('profile_sampler').finish)
+    return response
+
+@app.teardown_request
+def finish_request_profile(exc):
+    sampler = g.pop('profile_sampler', None)
+    if sampler is not None:
+        sampler.finish()
+
+# Traffic capture: with TRAFFIC_CAPTURE_PATH set, every worker appends one
+# compact JSON line per request (a TRAFFIC_CAPTURE_SAMPLE share of them) for
+# bench/replay.py: method, path, route, sanitized JSON or form body, status,
+# duration, the caller's role and, for users, a keyed hash of their id.
+# Personal fields are swapped for placeholders that still pass validation and
+# coordinates are rounded to about a kilometre. Each line is a single
+# O_APPEND write, so workers can share one file.
+app.config.setdefault('TRAFFIC_CAPTURE_PATH', os.environ.get('TRAFFIC_CAPTURE_PATH'))
+app.config.setdefault('TRAFFIC_CAPTURE_SAMPLE', float(os.environ.get('TRAFFIC_CAPTURE_SAMPLE', 1)))
+CAPTURE_PLACEHOLDERS = {
+    'username': 'replay', 'password': 'replay-password', 'email': 'replay@example.invalid',
+    'phone': '9000000000', 'customer_phone': '9000000000', 'full_name': 'Replay Customer',
+    'customer_name': 'Replay Customer', 'customer_address': '1 Replay Street, Hyderabad',
+    'feedback': 'Replayed feedback',
+}
+CAPTURE_ROUNDED = ('lat', 'lng', 'delivery_lat', 'delivery_lng')
+# Operational endpoints are not part of the traffic being reproduced
+CAPTURE_SKIP_ENDPOINTS = {'static', 'metrics', 'cache_stats', 'slow_queries', 'list_profiles', 'arm_profiler',
+                          'download_profile', 'memory_report', 'memory_tracing', 'memory_snapshot', 'memory_diff'}
+
+def sanitize_capture(value, key=None):
+    if isinstance(value, dict):
+        return {name: sanitize_capture(item, name) for name, item in value.items()}
+    if isinstance(value, list):
+        return [sanitize_capture(item) for item in value]
+    if key in CAPTURE_PLACEHOLDERS and value:
+        return CAPTURE_PLACEHOLDERS[key]
+    if key in CAPTURE_ROUNDED and value not in (None, ''):
+        try:
+            return round(float(value), 2)
+        except (TypeError, ValueError):
+            return None
+    return value
+
+def user_role(user):
+    if user is None:
+        return 'guest'
+    if user.is_admin:
+        return 'admin'
+    return 'rider' if user.is_delivery else 'customer'
+
+class TrafficRecorder:
+    def __init__(self):
+        self.fd = None
+        self.fd_path = None
+        self._mutex = threading.Lock()
+
+    def wants(self, endpoint):
+        if not app.config['TRAFFIC_CAPTURE_PATH'] or endpoint in CAPTURE_SKIP_ENDPOINTS:
+            return False
+        sample = app.config['TRAFFIC_CAPTURE_SAMPLE']
+        return sample >= 1 or random.random() < sample
+
+    def actor(self, user_id):
+        if user_id is None:
+            return None
+        return hmac.new(app.secret_key.encode(), str(user_id).encode(), 'sha256').hexdigest()[:12]
+
+    def write(self, record):
+        path = app.config['TRAFFIC_CAPTURE_PATH']
+        line = (json.dumps(record, separators=(',', ':'), default=str) + '\n').encode()
+        try:
+            with self._mutex:
+                if self.fd_path != path:
+                    if self.fd is not None:
+                        os.close(self.fd)
+                    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+                    self.fd = os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o600)
+                    self.fd_path = path
+            os.write(self.fd, line)
+        except OSError as e:
+            app.logger.warning(f'Traffic capture to {path} failed: {e}')
+
+    def finish(self, record, started):
+        record['ms'] = round((time.perf_counter() - started) * 1000, 2)
+        self.write(record)
+
+traffic_recorder = TrafficRecorder()
+
+@app.before_request
+def start_traffic_capture():
+    # The role is the one noted in the session at sign-in. Sessions from
+    # before that was noted fall back to loading the user; this runs ahead of
+    # the request metrics like the profiler, so that lookup is not counted
+    # against the route's query budget
+    if not traffic_recorder.wants(request.endpoint):
+        return
+    user_id = session.get('user_id')
+    role = session.get('role')
+    if role is None:
+        role = user_role(User.query.get(user_id) if user_id is not None else None)
+    record = {
+        't': round(time.time(), 3),
+        'method': request.method,
+        'path': request.full_path.rstrip('?'),
+        'route': request.url_rule.rule if request.url_rule else 'unmatched',
+        'endpoint': request.endpoint,
+        'role': role,
+        'actor': traffic_recorder.actor(user_id),
+    }
+    if request.is_json:
+        record['body'] = sanitize_capture(request.get_json(silent=True))
+    elif request.form:
+        record['body'] = sanitize_capture(request.form.to_dict())
+        record['form'] = True
+    if 'Idempotency-Key' in request.headers:
+        record['idempotent'] = True  # the key itself is not kept; replays send fresh ones
+    g.capture = record
+    g.capture_started = time.perf_counter()
+
+@app.after_request
+def note_traffic_capture(response):
+    record = g.get('capture')
+    if record is None:
+        return response
+    record['status'] = response.status_code
+    if response.mimetype == 'text/event-stream':
+        record['stream'] = True
+    elif not response.is_streamed and response.is_json:
+        # Lets a replay point later requests for this order at the one it placed
+        reply = response.get_json(silent=True)
+        if isinstance(reply, dict) and reply.get('order_id'):
+            record['order_id'] = reply['order_id']
+    if response.is_streamed:
+        started = g.pop('capture_started')
+        del g.capture
+        response.call_on_close(lambda: traffic_recorder.finish(record, started))
+    return response
+
+@app.teardown_request
+def finish_traffic_capture(exc):
+    record = g.pop('capture', None)
+    if record is not None:
+        record.setdefault('status', 500)
+        traffic_recorder.finish(record, g.pop('capture_started'))
+
+# Request metrics: latency histograms per route, method and status, in-flight
+# gauges per route, and SQL statement counts and time per request. Counters
+# live in per-worker slots of a memory-mapped file (see SharedCounters), so
+# /metrics on any worker reports the whole deployment in the Prometheus text
+# format. Series stay bounded: methods outside METRIC_METHODS count as OTHER,
+# and requests that matched no route share one series per status
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+METRICS_QUANTILES = (0.5, 0.95, 0.99)
+METRIC_METHODS = frozenset(('GET', 'HEAD', 'POST', 'PUT', 'PATCH', 'DELETE', 'OPTIONS'))
+METRICS_WORKER_SLOTS = 32  # most workers on one host that can share the file
+METRICS_SLOT_ENTRIES = 4096  # counters per worker; new keys beyond this are dropped, logged and counted
+METRICS_KEY_BYTES = 96
+METRICS_HEADER_BYTES = 64  # file header, and again per slot
+PAYMENT_METHODS = ('cash', 'upi')
+app.config.setdefault('METRICS_TOKEN', os.environ.get('METRICS_TOKEN'))
+app.config.setdefault('METRICS_SHM_PATH', os.environ.get('METRICS_SHM_PATH', os.path.join(app.instance_path, 'metrics.shm')))
+
+def pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+class SharedCounters:
+    # One memory-mapped file holds a slot per worker process. A worker only
+    # ever writes its own slot (appending keys, adding to float64 values), so
+    # increments take no cross-process lock; a scrape sums every slot. Slots
+    # of exited workers keep their counters and are handed to the next worker
+    # that starts, so totals never go backwards while any worker is running;
+    # once none is, the next one to open the file starts it from zero. Gauges
+    # (names in `gauges`) only count live workers and restart from zero with
+    # the slot. Before a file left by a previous run is zeroed, on_reset (if
+    # set) is handed what its slots still held. The file must be a regular
+    # file owned by this user and is never followed through a symlink.
+    # Without a usable file (or fcntl) the counters fall back to private
+    # memory and cover this worker only.
+    FILE_HEADER = struct.Struct('<8sII')  # magic, slots, entries per slot
+    SLOT_HEADER = struct.Struct('<qq')  # owner pid, keys in use
+    SLOT_DROPPED = struct.Struct('<q')  # increments the slot could not store; follows SLOT_HEADER
+    MAGIC = b'BCMETRC1'
+
+    def __init__(self, path, slots=METRICS_WORKER_SLOTS, entries=METRICS_SLOT_ENTRIES, gauges=('in_flight', 'worker_memory')):
+        self.path = path
+        self.slots = slots
+        self.entries = entries
+        self.gauges = gauges
+        self.slot_size = METRICS_HEADER_BYTES + entries * (METRICS_KEY_BYTES + 8)
+        self.size = METRICS_HEADER_BYTES + slots * self.slot_size
+        self.shared = False
+        self.dropped = 0  # increments that did not fit in this worker's slot
+        self.on_reset = None  # called with {key: value} of a previous run's counters, gauges aside
+        self._mm = None
+        self._slot = None
+        self._values = None
+        self._index = {}  # key -> entry number in this worker's slot
+        self._mutex = threading.Lock()
+        if hasattr(os, 'register_at_fork'):
+            os.register_at_fork(after_in_child=self._forked)
+
+    def _forked(self):
+        # The mapping is inherited; the slot and locks belong to the parent
+        self._slot = None
+        self._values = None
+        self._index = {}
+        self._mutex = threading.Lock()
+
+    def _open_fd(self, flags):
+        fd = os.open(self.path, os.O_RDWR | os.O_NOFOLLOW | flags, 0o600)
+        info = os.fstat(fd)
+        if not stat.S_ISREG(info.st_mode) or info.st_uid != os.getuid():
+            os.close(fd)
+            raise OSError(f'{self.path} is not a regular file owned by this user')
+        return fd
+
+    def _open(self):
+        if fcntl is None:
+            raise OSError('fcntl is not available')
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        fd = self._open_fd(os.O_CREAT)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            header = self.FILE_HEADER.pack(self.MAGIC, self.slots, self.entries)
+            if os.fstat(fd).st_size == 0:
+                os.ftruncate(fd, self.size)
+                os.pwrite(fd, header, 0)
+            elif os.pread(fd, self.FILE_HEADER.size, 0) != header:
+                raise ValueError(f'{self.path} has a different metrics layout')
+            elif not self._live_owner(fd):
+                # Left by a previous run: start from zero. Zeroed in place, as
+                # truncating would fault the mapping of a worker that is
+                # between opening the file and claiming its slot
+                if self.on_reset is not None:
+                    self._report_leftovers(fd)
+                for slot in range(self.slots):
+                    os.pwrite(fd, bytes(self.slot_size), self._slot_base(slot))
+            return mmap.mmap(fd, self.size)
+        finally:
+            # The mapping holds a duplicate of fd, so unlock rather than rely on close
+            fcntl.flock(fd, fcntl.LOCK_UN)
+            os.close(fd)
+
+    def _report_leftovers(self, fd):
+        self._mm = mmap.mmap(fd, self.size)
+        try:
+            leftovers = {}
+            for slot in range(self.slots):
+                _, used = self.SLOT_HEADER.unpack_from(self._mm, self._slot_base(slot))
+                values = self._slot_values(slot).tolist()  # a copy, so the mapping can be closed
+                for entry, key in enumerate(self._slot_keys(slot, used)):
+                    if key[0] not in self.gauges:
+                        leftovers[key] = leftovers.get(key, 0.0) + values[entry]
+            self.on_reset(leftovers)
+        except Exception as e:
+            app.logger.warning(f'Could not hand over counters left in {self.path}: {e}')
+        finally:
+            self._mm.close()
+            self._mm = None
+
+    def _live_owner(self, fd):
+        for slot in range(self.slots):
+            owner, _ = self.SLOT_HEADER.unpack(os.pread(fd, self.SLOT_HEADER.size, self._slot_base(slot)))
+            if owner and owner != os.getpid() and pid_alive(owner):
+                return True
+        return False
+
+    def _slot_base(self, slot):
+        return METRICS_HEADER_BYTES + slot * self.slot_size
+
+    def _slot_values(self, slot):
+        start = self._slot_base(slot) + METRICS_HEADER_BYTES + self.entries * METRICS_KEY_BYTES
+        return memoryview(self._mm)[start:start + self.entries * 8].cast('d')
+
+    def _slot_keys(self, slot, used):
+        start = self._slot_base(slot) + METRICS_HEADER_BYTES
+        raw = self._mm[start:start + min(used, self.entries) * METRICS_KEY_BYTES]
+        return [tuple(raw[offset:offset + METRICS_KEY_BYTES].rstrip(b'\0').decode().split('\x1f'))
+                for offset in range(0, len(raw), METRICS_KEY_BYTES)]
+
+    def _claim(self):
+        # Called with self._mutex held. Slot claims are serialised with an
+        # flock on a fresh descriptor, which a forked worker does not share
+        fd = self._open_fd(0)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            pid = os.getpid()
+            for slot in range(self.slots):
+                owner, used = self.SLOT_HEADER.unpack_from(self._mm, self._slot_base(slot))
+                if owner == 0 or owner == pid or not pid_alive(owner):
+                    self.SLOT_HEADER.pack_into(self._mm, self._slot_base(slot), pid, used)
+                    return slot
+            return None
+        finally:
+            os.close(fd)
+
+    def _attach(self):
+        slot = None
+        if self._mm is None or self.shared:
+            try:
+                if self._mm is None:
+                    self._mm = self._open()
+                    self.shared = True
+                slot = self._claim()
+            except (OSError, ValueError):
+                pass
+        if slot is None:
+            # Private memory laid out the same way, with this worker in slot 0
+            self._mm = mmap.mmap(-1, self.size)
+            self.shared = False
+            self.SLOT_HEADER.pack_into(self._mm, self._slot_base(0), os.getpid(), 0)
+            slot = 0
+        self._slot = slot
+        self._values = self._slot_values(slot)
+        _, used = self.SLOT_HEADER.unpack_from(self._mm, self._slot_base(slot))
+        self._index = {}
+        for entry, key in enumerate(self._slot_keys(slot, used)):
+            self._index[key] = entry
+            if key[0] in self.gauges:
+                self._values[entry] = 0.0
+
+    def _new_entry(self, key):
+        raw = '\x1f'.join(key).encode()
+        base = self._slot_base(self._slot)
+        _, used = self.SLOT_HEADER.unpack_from(self._mm, base)
+        if len(raw) > METRICS_KEY_BYTES or any('\x1f' in part for part in key) or used >= self.entries:
+            if not self.dropped:
+                reason = 'slot is full' if used >= self.entries else 'key is too long or contains \\x1f'
+                app.logger.warning(f'Metrics key {key!r} dropped ({reason}); further drops by worker '
+                                   f'{os.getpid()} are only counted in biryani_metrics_dropped_keys_total')
+            self.dropped += 1
+            self.SLOT_DROPPED.pack_into(self._mm, base + self.SLOT_HEADER.size, self.dropped_in(self._slot) + 1)
+            return None
+        start = base + METRICS_HEADER_BYTES + used * METRICS_KEY_BYTES
+        self._mm[start:start + METRICS_KEY_BYTES] = raw.ljust(METRICS_KEY_BYTES, b'\0')
+        self._values[used] = 0.0
+        # Readers only look at the first `used` keys, so publish it last
+        self.SLOT_HEADER.pack_into(self._mm, base, os.getpid(), used + 1)
+        self._index[key] = used
+        return used
+
+    def dropped_in(self, slot):
+        return self.SLOT_DROPPED.unpack_from(self._mm, self._slot_base(slot) + self.SLOT_HEADER.size)[0]
+
+    def add_many(self, pairs):
+        with self._mutex:
+            if self._slot is None:
+                self._attach()
+            values = self._values
+            for key, amount in pairs:
+                entry = self._index.get(key)
+                if entry is None:
+                    entry = self._new_entry(key)
+                    if entry is None:
+                        continue
+                values[entry] += amount
+
+    def add(self, key, amount=1):
+        self.add_many(((key, amount),))
+
+    def own(self, name):
+        # This worker's counters under `name`, keyed by the rest of the key
+        with self._mutex:
+            if self._slot is None:
+                self._attach()
+            return {key[1:]: self._values[entry] for key, entry in self._index.items() if key[0] == name}
+
+    def totals(self):
+        # (key -> sum over slots, live workers); read without locks, so a
+        # scrape may miss an increment that is landing at the same moment
+        with self._mutex:
+            if self._slot is None:
+                self._attach()
+        pid = os.getpid()
+        totals = {}
+        workers = 0
+        for slot in range(self.slots if self.shared else 1):
+            owner, used = self.SLOT_HEADER.unpack_from(self._mm, self._slot_base(slot))
+            if not owner:
+                continue
+            alive = owner == pid or pid_alive(owner)
+            workers += alive
+            totals[('metrics_dropped',)] = totals.get(('metrics_dropped',), 0.0) + self.dropped_in(slot)
+            values = self._slot_values(slot)
+            for entry, key in enumerate(self._slot_keys(slot, used)):
+                if alive or key[0] not in self.gauges:
+                    totals[key] = totals.get(key, 0.0) + values[entry]
+        return totals, workers
+
+class RequestMetrics:
+    def __init__(self, counters, buckets=LATENCY_BUCKETS):
+        self.counters = counters
+        self.buckets = buckets
+
+    def started(self, route):
+        self.counters.add(('in_flight', route))
+
+    def finished(self, route, method, status, seconds, sql_count, sql_seconds):
+        # Each series is [requests, seconds, sql statements, sql seconds,
+        # per-bucket counts..., +Inf], one shared counter per field
+        bucket = bisect.bisect_left(self.buckets, seconds)
+        if route == 'unmatched':
+            method = 'ANY'
+        elif method not in METRIC_METHODS:
+            method = 'OTHER'
+        series = ('http', route, method, str(status))
+        self.counters.add_many(((('in_flight', route), -1),
+                                (series + ('0',), 1),
+                                (series + ('1',), seconds),
+                                (series + ('2',), sql_count),
+                                (series + ('3',), sql_seconds),
+                                (series + (str(4 + bucket),), 1)))
+
+    def snapshot(self):
+        totals, workers = self.counters.totals()
+        width = 4 + len(self.buckets) + 1
+        series = {}
+        in_flight = {}
+        for key, value in totals.items():
+            if key[0] == 'http':
+                series.setdefault(key[1:4], [0.0] * width)[int(key[4])] = value
+            elif key[0] == 'in_flight':
+                in_flight[key[1]] = value
+        return series, in_flight, totals, workers
+
+    def quantile(self, q, counts):
+        # Linear interpolation inside the bucket holding the q-th request, as
+        # Prometheus' histogram_quantile() does
+        total = sum(counts)
+        if not total:
+            return None
+        rank = q * total
+        seen = 0
+        for index, count in enumerate(counts):
+            if seen + count >= rank and count:
+                if index == len(self.buckets):
+                    return self.buckets[-1]
+                lower = self.buckets[index - 1] if index else 0.0
+                return lower + (self.buckets[index] - lower) * (rank - seen) / count
+            seen += count
+        return self.buckets[-1]
+
+    def render(self):
+        series, in_flight, totals, workers = self.snapshot()
+        lines = [
+            '# HELP biryani_http_request_duration_seconds Request latency by route, method and status.',
+            '# TYPE biryani_http_request_duration_seconds histogram',
+        ]
+        for (route, method, status), values in sorted(series.items()):
+            labels = f'route="{metric_label(route)}",method="{method}",status="{status}"'
+            cumulative = 0
+            for bound, count in zip(self.buckets + ('+Inf',), values[4:]):
+                cumulative += count
+                lines.append(f'biryani_http_request_duration_seconds_bucket{{{labels},le="{bound}"}} {cumulative:.0f}')
+            lines.append(f'biryani_http_request_duration_seconds_sum{{{labels}}} {values[1]:.6f}')
+            lines.append(f'biryani_http_request_duration_seconds_count{{{labels}}} {values[0]:.0f}')
+        lines += ['# HELP biryani_http_request_duration_quantile_seconds Latency quantiles estimated from the histogram.',
+                  '# TYPE biryani_http_request_duration_quantile_seconds gauge']
+        for (route, method, status), values in sorted(series.items()):
+            labels = f'route="{metric_label(route)}",method="{method}",status="{status}"'
+            for q in METRICS_QUANTILES:
+                lines.append(f'biryani_http_request_duration_quantile_seconds{{{labels},quantile="{q}"}} '
+                             f'{self.quantile(q, values[4:]):.6f}')
+        lines += ['# HELP biryani_http_requests_in_flight Requests currently being served.',
+                  '# TYPE biryani_http_requests_in_flight gauge']
+        for route, count in sorted(in_flight.items()):
+            lines.append(f'biryani_http_requests_in_flight{{route="{metric_label(route)}"}} {count:.0f}')
+        lines += ['# HELP biryani_db_queries_total SQL statements executed while serving requests.',
+                  '# TYPE biryani_db_queries_total counter']
+        for (route, method, status), values in sorted(series.items()):
+            lines.append(f'biryani_db_queries_total{{route="{metric_label(route)}",method="{method}",status="{status}"}} {values[2]:.0f}')
+        lines += ['# HELP biryani_db_query_seconds_total Time spent in SQL statements while serving requests.',
+                  '# TYPE biryani_db_query_seconds_total counter']
+        for (route, method, status), values in sorted(series.items()):
+            lines.append(f'biryani_db_query_seconds_total{{route="{metric_label(route)}",method="{method}",status="{status}"}} {values[3]:.6f}')
+        counters = {}  # name -> [(label value, total)]
+        for key, value in totals.items():
+            if len(key) == 2:
+                counters.setdefault(key[0], []).append((key[1], value))
+        lines += ['# HELP biryani_menu_item_clicks_total Add-to-cart clicks per menu item.',
+                  '# TYPE biryani_menu_item_clicks_total counter']
+        for item_id, clicks in sorted(counters.get('popularity', [])):
+            name = (menu_codebook.lookup_id(int(item_id)) or (f'Item #{item_id}',))[0]
+            lines.append(f'biryani_menu_item_clicks_total{{item="{metric_label(name)}"}} {clicks:.0f}')
+        lines += ['# HELP biryani_orders_placed_total Orders placed by payment method.',
+                  '# TYPE biryani_orders_placed_total counter']
+        for method, count in sorted(counters.get('orders_placed', [])):
+            lines.append(f'biryani_orders_placed_total{{payment_method="{method}"}} {count:.0f}')
+        lines += ['# HELP biryani_order_revenue_total Order totals placed by payment method, in rupees.',
+                  '# TYPE biryani_order_revenue_total counter']
+        for method, amount in sorted(counters.get('order_revenue', [])):
+            lines.append(f'biryani_order_revenue_total{{payment_method="{method}"}} {amount:.2f}')
+        lines += ['# HELP biryani_order_transitions_total Order status changes by new status.',
+                  '# TYPE biryani_order_transitions_total counter']
+        for status, count in sorted(counters.get('order_transitions', [])):
+            lines.append(f'biryani_order_transitions_total{{status="{metric_label(status)}"}} {count:.0f}')
+        lines += ['# HELP biryani_query_budget_exceeded_total Requests that ran more SQL statements than their endpoint budget.',
+                  '# TYPE biryani_query_budget_exceeded_total counter']
+        for endpoint, count in sorted(counters.get('query_budget_exceeded', [])):
+            lines.append(f'biryani_query_budget_exceeded_total{{endpoint="{metric_label(endpoint)}"}} {count:.0f}')
+        lines += ['# HELP biryani_slow_queries_total SQL statements slower than SLOW_QUERY_SECONDS, by route.',
+                  '# TYPE biryani_slow_queries_total counter']
+        for route, count in sorted(counters.get('slow_queries', [])):
+            lines.append(f'biryani_slow_queries_total{{route="{metric_label(route)}"}} {count:.0f}')
+        lines += ['# HELP biryani_worker_resident_memory_bytes Resident memory summed over live workers, as of their last check.',
+                  '# TYPE biryani_worker_resident_memory_bytes gauge',
+                  f"biryani_worker_resident_memory_bytes {totals.get(('worker_memory', 'rss_bytes'), 0):.0f}",
+                  '# HELP biryani_worker_recycles_total Workers that recycled themselves over MEMORY_RECYCLE_RSS_MB.',
+                  '# TYPE biryani_worker_recycles_total counter',
+                  f"biryani_worker_recycles_total {totals.get(('worker_recycles', 'rss'), 0):.0f}"]
+        lines += ['# HELP biryani_metrics_workers Live worker processes reporting into these metrics.',
+                  '# TYPE biryani_metrics_workers gauge',
+                  f'biryani_metrics_workers{{shared="{str(self.counters.shared).lower()}"}} {workers}',
+                  '# HELP biryani_metrics_dropped_keys_total Counter increments lost because a worker slot was full or the key too long.',
+                  '# TYPE biryani_metrics_dropped_keys_total counter',
+                  f"biryani_metrics_dropped_keys_total {totals.get(('metrics_dropped',), 0):.0f}"]
+        return '\n'.join(lines) + '\n'
+
+shared_counters = SharedCounters(app.config['METRICS_SHM_PATH'])
+request_metrics = RequestMetrics(shared_counters)
+request_sql = threading.local()  # per-thread statement count and time for the current request
+
+def metric_label(value):
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def time_sql_started(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('query_started', []).append(time.perf_counter())
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def time_sql_finished(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - conn.info['query_started'].pop()
+    if getattr(request_sql, 'active', False):
+        request_sql.count += 1
+        request_sql.seconds += elapsed
+        request_sql.statements[statement] += 1
+    if elapsed >= app.config['SLOW_QUERY_SECONDS']:
+        slow_query_log.record(conn, statement, parameters, executemany, elapsed)
+
+@event.listens_for(Engine, 'handle_error')
+def time_sql_failed(exception_context):
+    # A statement that raised never reaches after_cursor_execute, so drop its
+    # start time here or every later timing on the connection is off by one
+    conn = exception_context.connection
+    if (conn is not None and exception_context.execution_context is not None
+            and exception_context.statement is not None and conn.info.get('query_started')):
+        conn.info['query_started'].pop()
+
+@app.before_request
+def start_request_metrics():
+    g.metrics_route = request.url_rule.rule if request.url_rule else 'unmatched'
+    g.metrics_started = time.perf_counter()
+    request_sql.active = True
+    request_sql.count = 0
+    request_sql.seconds = 0.0
+    request_sql.statements = Counter()  # SQL text -> executions
+    request_sql.route = f'{request.method} {g.metrics_route}'
+    request_metrics.started(g.metrics_route)
+
+def record_request_metrics(route, endpoint, method, status, started):
+    request_metrics.finished(route, method, status, time.perf_counter() - started,
+                             request_sql.count, request_sql.seconds)
+    request_sql.active = False
+    check_query_budget(endpoint, method, request_sql.count, request_sql.statements)
+
+@app.after_request
+def note_response_status(response):
+    g.metrics_status = response.status_code
+    if response.is_streamed and 'metrics_started' in g:
+        # A streamed body is produced after teardown; finish once the server closes it
+        args = (g.metrics_route, request.endpoint, request.method, response.status_code, g.pop('metrics_started'))
+        response.call_on_close(lambda: record_request_metrics(*args))
+    return response
+
+@app.teardown_request
+def finish_request_metrics(exc):
+    started = g.pop('metrics_started', None)
+    if started is not None:
+        record_request_metrics(g.metrics_route, request.endpoint, request.method,
+                               g.get('metrics_status', 500), started)
+
+# Query budgets: the most SQL statements each endpoint may run in one request,
+# cold caches and first-request lazy loads included. None of them grows with
+# the number of orders, users or menu items, so a loop that queries per row
+# (an N+1) overshoots as soon as there are a few rows. Going over logs a
+# warning that names the statement shapes that repeated; under app.testing it
+# raises QueryBudgetExceeded so the test that made the request fails.
+# Budgets leave room for the periodic dispatcher and ETA resyncs (up to six
+# statements) on the endpoints that trigger them, and for one or two
+# auto-assignments (two statements each). None skips the check, for feeds
+# that query for as long as the client stays connected.
+DEFAULT_QUERY_BUDGET = 10  # endpoints not listed below
+QUERY_BUDGETS = {
+    'static': 0,
+    'manifest': 0,
+    'service_worker': 0,
+    'metrics': 2,
+    'track_popularity': 3,
+    'signup': 5,
+    'login': 3,
+    'logout': 0,
+    'forgot_password': 0,
+    'my_orders': 4,
+    'api_my_orders_page': 3,
+    'api_my_orders_status': 3,
+    'submit_rating': 3,
+    'profile': 4,
+    'api_profile_orders_page': 3,
+    'rewards': 2,
+    'redeem_reward': 4,
+    'admin': 12,
+    'update_order_status': 16,
+    'toggle_store_status': 2,
+    'get_stock_items': 3,
+    'toggle_stock': 3,
+    'get_delivery_assignments': 8,
+    'assign_delivery_person': 12,
+    'get_promotions': 3,
+    'add_promotion': 3,
+    'cache_stats': 2,
+    'slow_queries': 2,
+    'list_profiles': 2,
+    'arm_profiler': 2,
+    'download_profile': 2,
+    'memory_report': 2,
+    'memory_tracing': 2,
+    'memory_snapshot': 2,
+    'memory_diff': 2,
+    'sales_data': 2,
+    'admin_order_feed': None,
+    'get_order_events': 3,
+    'delivery_panel': 8,
+    'accept_delivery': 12,
+    'complete_delivery': 14,
+    'update_rider_location': 14,  # a rider coming on shift takes up to MAX_ACTIVE_DELIVERIES queued orders
+    'delivery_order_feed': None,
+    'home': 3,
+    'menu': 3,
+    'checkout': 4,
+    'apply_promo': 2,
+    'place_order': 12,
+    'order_confirmation': 3,
+}
+
+class QueryBudgetExceeded(RuntimeError):
+    pass
+
+def statement_shape(statement):
+    # Expanded IN lists differ only in their number of placeholders, and the
+    # column list only hides the part that tells two SELECTs apart
+    shape = ' '.join(re.sub(r'\(\?(?:, \?)*\)', '(?)', statement).split())
+    return re.sub(r'^SELECT .*? FROM ', 'SELECT ... FROM ', shape)
+
+def check_query_budget(endpoint, method, count, statements):
+    budget = QUERY_BUDGETS.get(endpoint, DEFAULT_QUERY_BUDGET)
+    if budget is None or count <= budget:
+        return
+    shapes = Counter()
+    for statement, times in statements.items():
+        shapes[statement_shape(statement)] += times
+    repeated = '; '.join(f'{times}x {shape[:200]}' for shape, times in shapes.most_common(3) if times > 1)
+    message = f'{method} {endpoint} ran {count} SQL statements, budget {budget}'
+    if repeated:
+        message += f'; repeated: {repeated}'
+    shared_counters.add(('query_budget_exceeded', str(endpoint)))
+    if app.testing:
+        raise QueryBudgetExceeded(message)
+    app.logger.warning(message)
+
+# Slow query log: statements slower than SLOW_QUERY_SECONDS are kept, newest
+# last, in a bounded per-worker ring with the route that ran them, the types
+# of their bound parameters (never the values) and SQLite's EXPLAIN QUERY
+# PLAN. A plan is captured once per statement per SLOW_QUERY_PLAN_TTL, on a
+# raw DB-API cursor so the EXPLAIN itself is neither timed nor logged.
+app.config.setdefault('SLOW_QUERY_SECONDS', 0.1)
+SLOW_QUERY_LOG_SIZE = 200
+SLOW_QUERY_PLAN_TTL = 300  # seconds
+
+def parameter_shape(parameters):
+    if isinstance(parameters, dict):
+        return {name: type(value).__name__ for name, value in parameters.items()}
+    return [type(value).__name__ for value in parameters or ()]
+
+def explain_query_plan(conn, statement, parameters):
+    if conn.dialect.name != 'sqlite':
+        return None
+    cursor = conn.connection.cursor()
+    try:
+        cursor.execute('EXPLAIN QUERY PLAN ' + statement, parameters)
+        depth = {0: -1}
+        plan = []
+        for node, parent, _, detail in cursor.fetchall():
+            depth[node] = depth.get(parent, -1) + 1
+            plan.append('  ' * depth[node] + detail)
+        return plan
+    except Exception as e:
+        return [f'EXPLAIN failed: {e}']
+    finally:
+        cursor.close()
+
+class SlowQueryLog:
+    def __init__(self, size=SLOW_QUERY_LOG_SIZE):
+        self.recorded = 0
+        self._entries = deque(maxlen=size)
+        self._plans = {}  # statement -> (captured at, plan)
+        self._mutex = threading.Lock()
+
+    def record(self, conn, statement, parameters, executemany, seconds):
+        route = request_sql.route if getattr(request_sql, 'active', False) else 'background'
+        first = parameters[0] if executemany and parameters else parameters
+        now = time.monotonic()
+        with self._mutex:
+            cached = self._plans.get(statement)
+        if cached is None or now - cached[0] > SLOW_QUERY_PLAN_TTL:
+            cached = (now, explain_query_plan(conn, statement, first))
+            with self._mutex:
+                if len(self._plans) >= SLOW_QUERY_LOG_SIZE * 5:
+                    self._plans.clear()
+                self._plans[statement] = cached
+        entry = {
+            'at': datetime.utcnow().isoformat(timespec='milliseconds') + 'Z',
+            'seconds': round(seconds, 6),
+            'route': route,
+            'statement': statement,
+            'parameters': parameter_shape(first),
+            'executemany': len(parameters) if executemany else None,
+            'plan': cached[1],
+        }
+        with self._mutex:
+            self._entries.append(entry)
+            self.recorded += 1
+        shared_counters.add(('slow_queries', route))
+
+    def entries(self):
+        with self._mutex:
+            return list(self._entries)
+
+slow_query_log = SlowQueryLog()
+
+# Memory diagnostics, per worker. Every MEMORY_CHECK_SECONDS a request reads
+# the worker's RSS into the shared metrics; above MEMORY_RECYCLE_RSS_MB
+# (0 = never) the worker sends itself SIGTERM, which gunicorn workers treat as
+# a graceful exit once the request in hand is done, and the master starts a
+# fresh one. That only happens under gunicorn (SERVER_SOFTWARE) or with
+# MEMORY_RECYCLE_PREFORK set for another prefork master; otherwise nothing
+# would restart the process, so going over is logged and the worker keeps
+# running. Admins can switch tracemalloc on to diff named snapshots and to
+# see which lines allocate most for each route (every
+# MEMORY_ROUTE_SAMPLE_EVERY-th request per route is diffed), and can count
+# live ORM objects and sessions. With tracing off a request pays one
+# is_tracing() call and a clock comparison.
+app.config.setdefault('MEMORY_RECYCLE_RSS_MB', float(os.environ.get('MEMORY_RECYCLE_RSS_MB', 0)))
+app.config.setdefault('MEMORY_RECYCLE_PREFORK', os.environ.get('MEMORY_RECYCLE_PREFORK', '') == '1')
+MEMORY_CHECK_SECONDS = 10
+MEMORY_SNAPSHOTS_KEPT = 5
+MEMORY_ROUTE_SAMPLE_EVERY = 20
+MEMORY_TOP_LINES = 10
+MEMORY_TRACE_FILTERS = (tracemalloc.Filter(False, tracemalloc.__file__),
+                        tracemalloc.Filter(False, '<frozen importlib._bootstrap>'),
+                        tracemalloc.Filter(False, '<unknown>'))
+
+def current_rss_bytes():
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError, AttributeError):
+        return None
+
+def trace_snapshot():
+    return tracemalloc.take_snapshot().filter_traces(MEMORY_TRACE_FILTERS)
+
+def allocation_stats(stats, limit):
+    return [{'where': [str(frame) for frame in stat.traceback],
+             'size_diff': stat.size_diff, 'size': stat.size,
+             'count_diff': stat.count_diff, 'count': stat.count}
+            for stat in stats[:limit]]
+
+class MemoryDiagnostics:
+    def __init__(self):
+        self.snapshots = OrderedDict()  # name -> (taken at, snapshot), oldest first
+        self.routes = {}  # route -> {'requests', 'net_bytes', 'sampled', 'top': Counter of 'file:line' -> bytes}
+        self.recycling = False
+        self._checked_at = None
+        self._reported_rss = 0
+        self._mutex = threading.Lock()
+
+    def start_tracing(self, frames=1):
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(frames)
+
+    def stop_tracing(self):
+        tracemalloc.stop()
+        with self._mutex:
+            self.routes.clear()
+
+    def take_snapshot(self, name):
+        snapshot = trace_snapshot()
+        with self._mutex:
+            self.snapshots.pop(name, None)
+            self.snapshots[name] = (datetime.utcnow(), snapshot)
+            while len(self.snapshots) > MEMORY_SNAPSHOTS_KEPT:
+                self.snapshots.popitem(last=False)
+
+    def diff(self, first, second, key_type='lineno', limit=MEMORY_TOP_LINES):
+        with self._mutex:
+            old, new = self.snapshots[first][1], self.snapshots[second][1]
+        return allocation_stats(new.compare_to(old, key_type), limit)
+
+    def request_started(self, route):
+        with self._mutex:
+            stats = self.routes.setdefault(route, {'requests': 0, 'net_bytes': 0, 'sampled': 0, 'top': Counter()})
+            stats['requests'] += 1
+            sample = stats['requests'] % MEMORY_ROUTE_SAMPLE_EVERY == 1
+        return tracemalloc.get_traced_memory()[0], trace_snapshot() if sample else None
+
+    def request_finished(self, route, started):
+        # Traced memory is process wide, so concurrent requests blur each other
+        traced, before = started
+        if not tracemalloc.is_tracing():
+            return
+        net = tracemalloc.get_traced_memory()[0] - traced
+        top = trace_snapshot().compare_to(before, 'lineno')[:MEMORY_TOP_LINES] if before else ()
+        with self._mutex:
+            stats = self.routes.get(route)
+            if stats is None:
+                return
+            stats['net_bytes'] += net
+            if before:
+                stats['sampled'] += 1
+                for stat in top:
+                    if stat.size_diff > 0:
+                        stats['top'][str(stat.traceback[0])] += stat.size_diff
+
+    def route_report(self):
+        with self._mutex:
+            return {route: {'requests': stats['requests'],
+                            'avg_net_bytes': stats['net_bytes'] // max(stats['requests'], 1),
+                            'sampled': stats['sampled'],
+                            'top': [{'where': where, 'bytes': size}
+                                    for where, size in stats['top'].most_common(MEMORY_TOP_LINES)]}
+                    for route, stats in self.routes.items()}
+
+    def object_counts(self):
+        models = Counter()
+        sessions = 0
+        identities = 0
+        for obj in gc.get_objects():
+            if isinstance(obj, db.Model):
+                models[type(obj).__name__] += 1
+            elif isinstance(obj, Session):
+                sessions += 1
+                identities += len(obj.identity_map)
+        return {'models': dict(models.most_common()), 'sessions': sessions, 'identity_map_entries': identities}
+
+    def check_high_water(self):
+        now = time.monotonic()
+        if self._checked_at is not None and now - self._checked_at < MEMORY_CHECK_SECONDS:
+            return
+        self._checked_at = now
+        rss = current_rss_bytes()
+        if rss is None:
+            return
+        shared_counters.add(('worker_memory', 'rss_bytes'), rss - self._reported_rss)
+        self._reported_rss = rss
+        limit = app.config['MEMORY_RECYCLE_RSS_MB'] * 1024 * 1024
+        if limit and rss > limit and not self.recycling:
+            self.recycling = True
+            if not (app.config['MEMORY_RECYCLE_PREFORK'] or os.environ.get('SERVER_SOFTWARE', '').startswith('gunicorn/')):
+                app.logger.warning(f'Worker {os.getpid()} RSS {rss / 1048576:.0f}MB is over '
+                                   f'{limit / 1048576:.0f}MB; not recycling, as no prefork master would restart it')
+                return
+            shared_counters.add(('worker_recycles', 'rss'))
+            app.logger.warning(f'Worker {os.getpid()} RSS {rss / 1048576:.0f}MB is over '
+                               f'{limit / 1048576:.0f}MB; recycling after this request')
+            os.kill(os.getpid(), signal.SIGTERM)
+
+memory_diagnostics = MemoryDiagnostics()
+
+@app.before_request
+def start_request_memory():
+    if tracemalloc.is_tracing():
+        g.memory_started = memory_diagnostics.request_started(g.metrics_route)
+
+def record_request_memory(route, started):
+    if started is not None:
+        memory_diagnostics.request_finished(route, started)
+    memory_diagnostics.check_high_water()
+
+@app.after_request
+def note_request_memory(response):
+    if response.is_streamed:
+        args = (g.metrics_route, g.pop('memory_started', None))
+        g.memory_handed_off = True
+        response.call_on_close(lambda: record_request_memory(*args))
+    return response
+
+@app.teardown_request
+def finish_request_memory(exc):
+    if not g.pop('memory_handed_off', False):
+        record_request_memory(g.get('metrics_route', 'unmatched'), g.pop('memory_started', None))
+
+@app.route('/metrics')
+def metrics():
+    # Scrapers send the METRICS_TOKEN bearer token; admins can also look in a browser
+    token = app.config['METRICS_TOKEN']
+    # compare_digest only accepts str that is all ASCII, so compare the bytes
+    sent = request.headers.get('Authorization', '').encode('utf-8', 'surrogateescape')
+    if not (token and hmac.compare_digest(sent, f'Bearer {token}'.encode('utf-8', 'surrogateescape'))):
+        user = User.query.get(session['user_id']) if 'user_id' in session else None
+        if not (user and user.is_admin):
+            return Response('Forbidden\n', status=403, mimetype='text/plain')
+    return Response(request_metrics.render(), mimetype='text/plain; version=0.0.4')
+
 # Input validation helpers
 def validate_email(email):
     pattern = r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$'
@@ -111,6 +1522,16 @@ def validate_phone(phone):
     pattern = r'^[0-9]{10,15}$'
     return re.match(pattern, phone) is not None
 
+def parse_coordinates(lat, lng):
+    # (lat, lng) as floats, or None if missing or out of range
+    try:
+        lat, lng = float(lat), float(lng)
+    except (TypeError, ValueError):
+        return None
+    if not (-90 <= lat <= 90 and -180 <= lng <= 180):
+        return None
+    return lat, lng
+
 # Decorators
 def login_required(f):
     @wraps(f)
@@ -855,6 +2276,32 @@ BASE_TEMPLATE = """
             }, 3000);
         }
 
+        // "Load more" for paged order history lists
+        function loadMoreOrders(button, listId, url) {
+            button.disabled = true;
+            fetch(url + '?before=' + encodeURIComponent(button.dataset.next))
+            .then(response => response.json())
+            .then(data => {
+                if (!data.success) {
+                    showNotification(data.error || 'Could not load more orders', 'danger');
+                    button.disabled = false;
+                    return;
+                }
+                const more = document.getElementById(listId + '-more');
+                more.insertAdjacentHTML('beforebegin', data.html);
+                if (data.next) {
+                    button.dataset.next = data.next;
+                    button.disabled = false;
+                } else {
+                    more.remove();
+                }
+                document.dispatchEvent(new CustomEvent('orders-loaded', {detail: listId}));
+            })
+            .catch(() => {
+                button.disabled = false;
+            });
+        }
+
         // Initialize
         document.addEventListener('DOMContentLoaded', function() {
             updateCartCount();
@@ -873,6 +2320,30 @@ BASE_TEMPLATE = """
 </html>
 """
 
+# Long pages stream: the layout up to the content slot is sent at once and
+# each section follows as the view produces it, so the first byte never
+# waits on the slowest query. STREAM_PAGES=False joins the same sections
+# into one buffered response.
+app.config.setdefault('STREAM_PAGES', True)
+CONTENT_SLOT = '<!--page-content-->'
+
+def render_page(title, sections, current_user, extra_scripts=""):
+    if not app.config['STREAM_PAGES']:
+        return render_template_string(BASE_TEMPLATE, title=title, content=''.join(sections),
+                                      current_user=current_user, extra_scripts=extra_scripts)
+    layout = render_template_string(BASE_TEMPLATE, title=title, content=CONTENT_SLOT,
+                                    current_user=current_user, extra_scripts=extra_scripts)
+    head, tail = layout.split(CONTENT_SLOT, 1)
+
+    def generate():
+        yield head
+        yield from sections
+        yield tail
+
+    response = Response(stream_with_context(generate()), mimetype='text/html')
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
 # PWA Files
 @app.route('/manifest.json')
 def manifest():
@@ -902,15 +2373,87 @@ def manifest():
 def service_worker():
     return app.send_static_file('service-worker.js')
 
+# Popularity clicks are counted per worker in shared_counters and folded
+# into MenuItem.popularity every POPULARITY_FLUSH_SECONDS, as one
+# executemany UPDATE over the clicked items, instead of a write per click.
+# The flush runs on a background thread each worker starts with its first
+# request, and once more when the worker exits cleanly (gunicorn's SIGTERM,
+# memory recycling included). A worker's slot remembers what it has
+# flushed, so clicks left by a worker that died are flushed by whichever
+# worker inherits its slot, and clicks left in the metrics file by a
+# previous run are written before the file is reset.
+POPULARITY_FLUSH_SECONDS = 10
+popularity_flush = {'pid': None, 'mutex': threading.Lock(), 'flushing': threading.Lock(), 'leftover': Counter()}
+POPULARITY_FLUSH_STMT = (db.update(MenuItem.__table__)
+                         .where(MenuItem.__table__.c.id == db.bindparam('item_id'))
+                         .values(popularity=db.func.coalesce(MenuItem.__table__.c.popularity, 0)
+                                 + db.bindparam('clicks')))
+
+def flush_popularity():
+    with popularity_flush['flushing']:
+        flushed = shared_counters.own('popularity_flushed')
+        pending = {key: int(clicks - flushed.get(key, 0)) for key, clicks in shared_counters.own('popularity').items()}
+        pending = {key: clicks for key, clicks in pending.items() if clicks >= 1}
+        leftover = popularity_flush['leftover']
+        clicks_by_item = Counter(leftover)
+        for (item_id,), clicks in pending.items():
+            clicks_by_item[int(item_id)] += clicks
+        if not clicks_by_item:
+            return
+        try:
+            db.session.execute(POPULARITY_FLUSH_STMT, [{'item_id': item_id, 'clicks': clicks}
+                                                       for item_id, clicks in clicks_by_item.items()])
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()  # still pending; the next flush retries
+            app.logger.warning(f'Popularity flush failed: {e}')
+            return
+        leftover.clear()
+        shared_counters.add_many((('popularity_flushed',) + key, clicks) for key, clicks in pending.items())
+
+def keep_leftover_popularity(leftovers):
+    # Clicks a previous run counted but never flushed (a worker killed
+    # outright); the next flush writes them
+    for key, clicks in leftovers.items():
+        if key[0] == 'popularity':
+            clicks = int(clicks - leftovers.get(('popularity_flushed',) + key[1:], 0))
+            if clicks >= 1:
+                popularity_flush['leftover'][int(key[1])] += clicks
+
+shared_counters.on_reset = keep_leftover_popularity
+
+def popularity_flusher():
+    while True:
+        time.sleep(POPULARITY_FLUSH_SECONDS)
+        with app.app_context():
+            flush_popularity()
+
+@app.before_request
+def start_popularity_flusher():
+    # Threads do not survive a fork, so each worker process starts its own
+    if popularity_flush['pid'] == os.getpid():
+        return
+    with popularity_flush['mutex']:
+        if popularity_flush['pid'] != os.getpid():
+            threading.Thread(target=popularity_flusher, name='popularity-flush', daemon=True).start()
+            popularity_flush['pid'] = os.getpid()
+
+@atexit.register
+def flush_popularity_at_exit():
+    # Only in a process that served requests; a preloading master has no slot
+    if popularity_flush['pid'] == os.getpid():
+        with app.app_context():
+            flush_popularity()
+
 # API Endpoints
 @app.route('/api/track_popularity', methods=['POST'])
 def track_popularity():
     try:
         data = request.json
-        item = MenuItem.query.filter_by(name=data['item_name']).first()
-        if item:
-            item.popularity += 1
-            db.session.commit()
+        entry = menu_codebook.lookup_name(data['item_name'])
+        if entry:
+            # Counted in shared memory; the table catches up in batches
+            shared_counters.add(('popularity', str(entry[0])))
             return jsonify({'success': True})
         return jsonify({'success': False})
     except:
@@ -972,6 +2515,7 @@ def signup():
 
         session['user_id'] = user.id
         session['username'] = user.username
+        session['role'] = user_role(user)
 
         flash('Account created successfully!', 'success')
         return jsonify({'success': True}) if request.is_json else redirect(url_for('home'))
@@ -1064,6 +2608,7 @@ def login():
         if user and check_password_hash(user.password_hash, password):
             session['user_id'] = user.id
             session['username'] = user.username
+            session['role'] = user_role(user)
             user.last_login = datetime.utcnow()
             db.session.commit()
             flash('Welcome back!', 'success')
@@ -1179,6 +2724,154 @@ def forgot_password():
                                 title="Forgot Password - Biryani Club", 
                                 content=content)
 
+# Order history is paged newest first on (created_at, id). A cursor names the
+# last order shown, and the next page is the rows strictly older than it, so
+# each page is one index range scan however long the history is
+ORDER_PAGE_SIZE = 20
+ORDER_PAGE_MAX = 50
+
+def encode_order_cursor(order):
+    return f"{order.created_at.strftime('%Y%m%d%H%M%S%f')}.{order.id}"
+
+def decode_order_cursor(cursor):
+    try:
+        stamp, order_id = cursor.split('.')
+        return datetime.strptime(stamp, '%Y%m%d%H%M%S%f'), int(order_id)
+    except (AttributeError, ValueError):
+        return None
+
+def order_history_page(query, before=None, limit=None):
+    # One extra row tells whether another page exists
+    limit = max(1, min(limit or ORDER_PAGE_SIZE, ORDER_PAGE_MAX))
+    position = decode_order_cursor(before) if before else None
+    if position:
+        query = query.filter(db.tuple_(Order.created_at, Order.id) < position)
+    orders = query.order_by(Order.created_at.desc(), Order.id.desc()).limit(limit + 1).all()
+    next_cursor = encode_order_cursor(orders[limit - 1]) if len(orders) > limit else None
+    return orders[:limit], next_cursor
+
+def load_more_html(list_id, url, next_cursor):
+    if not next_cursor:
+        return ''
+    return f"""
+            <div class="text-center" id="{list_id}-more">
+                <button class="btn btn-outline-primary" data-next="{next_cursor}" onclick="loadMoreOrders(this, '{list_id}', '{url}')">
+                    <i class="fas fa-chevron-down me-2"></i>Load more
+                </button>
+            </div>
+    """
+
+# Thank you messages for delivered orders
+THANK_YOU_MESSAGES = [
+    "Thank you for choosing Biryani Club! 🙏 Order again soon!",
+    "We hope you enjoyed your meal! 😋 Come back for more deliciousness!",
+    "Your satisfaction is our priority! 💖 See you again soon!",
+    "Thanks for being our valued customer! 🌟 Order again anytime!",
+    "We're grateful for your order! 🎉 Can't wait to serve you again!",
+    "Hope the biryani was perfect! 🍛 Looking forward to your next order!",
+    "Thank you for trusting us with your hunger! 😊 Order again soon!"
+]
+
+def my_order_card_html(order):
+    status_class = f"status-{order.status}"
+    status_icons = {
+        'pending': 'fas fa-clock',
+        'preparing': 'fas fa-fire',
+        'ready': 'fas fa-check-circle',
+        'delivered': 'fas fa-truck'
+    }
+    
+    # Show random thank you message for delivered orders
+    thank_you_msg = ""
+    if order.status == 'delivered':
+        thank_you_msg = f'<div class="alert alert-success mt-3"><i class="fas fa-heart me-2"></i>{random.choice(THANK_YOU_MESSAGES)}</div>'
+
+    items = order.get_items()
+    items_summary = ", ".join([f"{item['name']} x{item['quantity']}" for item in items][:3])
+    if len(items) > 3:
+        items_summary += "..."
+
+    eta = eta_label(order)
+    eta_html = f'<p class="mb-0 mt-1 text-muted"><i class="fas fa-clock me-1"></i>Arriving {eta}</p>' if eta else ''
+
+    # Add rating option for delivered orders
+    rating_section = ""
+    if order.status == 'delivered' and not order.rating:
+        rating_section = f"""
+        <div class="mt-3">
+            <h6>Rate Your Order:</h6>
+            <div class="rating-stars" id="rating-{order.id}">
+                <i class="far fa-star" data-value="1"></i>
+                <i class="far fa-star" data-value="2"></i>
+                <i class="far fa-star" data-value="3"></i>
+                <i class="far fa-star" data-value="4"></i>
+                <i class="far fa-star" data-value="5"></i>
+            </div>
+            <textarea class="form-control mt-2" id="feedback-{order.id}" placeholder="Your feedback (optional)" rows="2"></textarea>
+            <button class="btn btn-sm btn-primary mt-2" onclick="submitRating({order.id})">Submit Rating</button>
+        </div>
+        """
+    elif order.rating:
+        stars = ''.join(['<i class="fas fa-star"></i>' for _ in range(order.rating)])
+        rating_section = f"""
+        <div class="mt-3">
+            <h6>Your Rating:</h6>
+            <div class="rating-stars">
+                {stars}
+            </div>
+            {f'<p>{order.feedback}</p>' if order.feedback else ''}
+        </div>
+        """
+
+    return f"""
+    <div class="card mb-4" id="order-{order.order_id}">
+        <div class="card-header d-flex justify-content-between align-items-center" style="background: var(--gradient-1); color: white;">
+            <div>
+                <h5 class="mb-0">Order #{order.order_id}</h5>
+                <small class="opacity-75">{order.created_at.strftime('%B %d, %Y at %I:%M %p')}</small>
+            </div>
+            <div class="text-end">
+                <span class="status-badge {status_class}">
+                    <i class="{status_icons.get(order.status, 'fas fa-info')} me-1"></i>{order.status.title()}
+                </span>
+            </div>
+        </div>
+        <div class="card-body">
+            <div class="row">
+                <div class="col-md-8">
+                    <h6 class="fw-bold text-primary mb-2">Items Ordered:</h6>
+                    <p class="text-muted mb-2">{items_summary}</p>
+                    <p class="mb-0"><strong>Total: ₹{order.total}</strong></p>
+                    {eta_html}
+                </div>
+                <div class="col-md-4 text-md-end">
+                    <p class="mb-1"><i class="fas fa-credit-card me-1"></i>{order.payment_method.upper()}</p>
+                    <p class="mb-0"><i class="fas fa-map-marker-alt me-1"></i>{order.customer_address[:30]}...</p>
+                </div>
+            </div>
+            {thank_you_msg}
+            {rating_section}
+        </div>
+    </div>
+    """
+
+def profile_order_row_html(order):
+    status_class = f"status-{order.status}"
+    return f"""
+                    <div class="d-flex justify-content-between align-items-center p-3 mb-3 rounded glass-effect">
+                        <div>
+                            <h6 class="mb-1">Order #{order.order_id}</h6>
+                            <p class="mb-0 text-muted">{order.created_at.strftime('%B %d, %Y at %I:%M %p')}</p>
+                        </div>
+                        <div class="text-end">
+                            <div class="mb-1">
+                                <span class="status-badge {status_class}">{order.status}</span>
+                            </div>
+                            <strong>₹{order.total}</strong>
+                        </div>
+                    </div>
+            """
+
 # User Profile Routes
 @app.route('/my-orders')
 @login_required
@@ -1187,20 +2880,9 @@ def my_orders():
     if not user:
         flash('Please log in to view your orders.', 'warning')
         return redirect(url_for('login'))
-    orders = Order.query.filter_by(user_id=user.id).order_by(Order.created_at.desc()).all()
-    
-    # Thank you messages for delivered orders
-    thank_you_messages = [
-        "Thank you for choosing Biryani Club! 🙏 Order again soon!",
-        "We hope you enjoyed your meal! 😋 Come back for more deliciousness!",
-        "Your satisfaction is our priority! 💖 See you again soon!",
-        "Thanks for being our valued customer! 🌟 Order again anytime!",
-        "We're grateful for your order! 🎉 Can't wait to serve you again!",
-        "Hope the biryani was perfect! 🍛 Looking forward to your next order!",
-        "Thank you for trusting us with your hunger! 😊 Order again soon!"
-    ]
 
-    content = f"""
+    def sections():
+        yield f"""
 <div class="container py-5">
     <div class="text-center mb-5">
         <h2 class="display-4 fw-bold text-gradient">My Orders 📦</h2>
@@ -1208,90 +2890,17 @@ def my_orders():
     </div>
 
     <div class="row">
-        <div class="col-lg-8 mx-auto">
+        <div class="col-lg-8 mx-auto" id="my-orders-list">
     """
 
-    if orders:
-        for order in orders:
-            status_class = f"status-{order.status}"
-            status_icons = {
-                'pending': 'fas fa-clock',
-                'preparing': 'fas fa-fire',
-                'ready': 'fas fa-check-circle',
-                'delivered': 'fas fa-truck'
-            }
-            
-            # Show random thank you message for delivered orders
-            thank_you_msg = ""
-            if order.status == 'delivered':
-                import random
-                thank_you_msg = f'<div class="alert alert-success mt-3"><i class="fas fa-heart me-2"></i>{random.choice(thank_you_messages)}</div>'
-
-            items_summary = ", ".join([f"{item['name']} x{item['quantity']}" for item in order.get_items()][:3])
-            if len(order.get_items()) > 3:
-                items_summary += "..."
-
-            # Add rating option for delivered orders
-            rating_section = ""
-            if order.status == 'delivered' and not order.rating:
-                rating_section = f"""
-                <div class="mt-3">
-                    <h6>Rate Your Order:</h6>
-                    <div class="rating-stars" id="rating-{order.id}">
-                        <i class="far fa-star" data-value="1"></i>
-                        <i class="far fa-star" data-value="2"></i>
-                        <i class="far fa-star" data-value="3"></i>
-                        <i class="far fa-star" data-value="4"></i>
-                        <i class="far fa-star" data-value="5"></i>
-                    </div>
-                    <textarea class="form-control mt-2" id="feedback-{order.id}" placeholder="Your feedback (optional)" rows="2"></textarea>
-                    <button class="btn btn-sm btn-primary mt-2" onclick="submitRating({order.id})">Submit Rating</button>
-                </div>
-                """
-            elif order.rating:
-                stars = ''.join(['<i class="fas fa-star"></i>' for _ in range(order.rating)])
-                rating_section = f"""
-                <div class="mt-3">
-                    <h6>Your Rating:</h6>
-                    <div class="rating-stars">
-                        {stars}
-                    </div>
-                    {f'<p>{order.feedback}</p>' if order.feedback else ''}
-                </div>
-                """
-
-            content += f"""
-            <div class="card mb-4" id="order-{order.order_id}">
-                <div class="card-header d-flex justify-content-between align-items-center" style="background: var(--gradient-1); color: white;">
-                    <div>
-                        <h5 class="mb-0">Order #{order.order_id}</h5>
-                        <small class="opacity-75">{order.created_at.strftime('%B %d, %Y at %I:%M %p')}</small>
-                    </div>
-                    <div class="text-end">
-                        <span class="status-badge {status_class}">
-                            <i class="{status_icons.get(order.status, 'fas fa-info')} me-1"></i>{order.status.title()}
-                        </span>
-                    </div>
-                </div>
-                <div class="card-body">
-                    <div class="row">
-                        <div class="col-md-8">
-                            <h6 class="fw-bold text-primary mb-2">Items Ordered:</h6>
-                            <p class="text-muted mb-2">{items_summary}</p>
-                            <p class="mb-0"><strong>Total: ₹{order.total}</strong></p>
-                        </div>
-                        <div class="col-md-4 text-md-end">
-                            <p class="mb-1"><i class="fas fa-credit-card me-1"></i>{order.payment_method.upper()}</p>
-                            <p class="mb-0"><i class="fas fa-map-marker-alt me-1"></i>{order.customer_address[:30]}...</p>
-                        </div>
-                    </div>
-                    {thank_you_msg}
-                    {rating_section}
-                </div>
-            </div>
-            """
-    else:
-        content += """
+        # Queried after the page header has gone out
+        orders, next_cursor = order_history_page(Order.query.filter_by(user_id=user.id))
+        if orders:
+            for order in orders:
+                yield my_order_card_html(order)
+            yield load_more_html('my-orders-list', '/api/my-orders', next_cursor)
+        else:
+            yield """
             <div class="text-center py-5">
                 <div class="dashboard-icon mx-auto mb-3" style="background: var(--gradient-2);">
                     <i class="fas fa-shopping-bag"></i>
@@ -1304,18 +2913,21 @@ def my_orders():
             </div>
         """
 
-    content += """
+        yield """
         </div>
     </div>
 </div>
 
 <script>
-// Auto-refresh orders every 30 seconds to show real-time updates
+// Auto-refresh orders every 30 seconds to show real-time updates; after the
+// first poll only orders changed since the last seen event are returned
+let orderEventCursor = null;
 setInterval(function() {
-    fetch('/api/my-orders-status')
+    fetch('/api/my-orders-status' + (orderEventCursor !== null ? '?since=' + orderEventCursor : ''))
     .then(response => response.json())
     .then(data => {
         if (data.success) {
+            orderEventCursor = data.cursor;
             data.orders.forEach(order => {
                 const orderCard = document.getElementById('order-' + order.order_id);
                 if (orderCard) {
@@ -1344,6 +2956,8 @@ function getStatusIcon(status) {
 // Rating functionality
 function setupRatingStars() {
     document.querySelectorAll('.rating-stars i').forEach(star => {
+        if (star.dataset.bound) return;
+        star.dataset.bound = '1';
         star.addEventListener('click', function() {
             const container = this.parentElement;
             const value = parseInt(this.getAttribute('data-value'));
@@ -1394,33 +3008,37 @@ function submitRating(orderId) {
     });
 }
 
-// Initialize rating stars
+// Initialize rating stars, including on cards added by "Load more"
 document.addEventListener('DOMContentLoaded', setupRatingStars);
+document.addEventListener('orders-loaded', setupRatingStars);
 </script>
 """
 
-    return render_template_string(BASE_TEMPLATE, 
-                                title="My Orders - Biryani Club", 
-                                content=content, 
-                                current_user=user,
-                                extra_scripts="")
+    return render_page("My Orders - Biryani Club", sections(), user)
+
+@app.route('/api/my-orders')
+@login_required
+def api_my_orders_page():
+    orders, next_cursor = order_history_page(Order.query.filter_by(user_id=session['user_id']),
+                                             request.args.get('before'),
+                                             request.args.get('limit', type=int))
+    return jsonify({'success': True, 'html': ''.join(my_order_card_html(order) for order in orders),
+                    'next': next_cursor})
 
 @app.route('/api/my-orders-status')
 @login_required
 def api_my_orders_status():
-    user = User.query.get(session['user_id'])
-    if not user:
-        return jsonify({'success': False, 'error': 'User not found'})
-    orders = Order.query.filter_by(user_id=user.id).order_by(Order.created_at.desc()).limit(10).all()
-    
-    orders_data = []
-    for order in orders:
-        orders_data.append({
-            'order_id': order.order_id,
-            'status': order.status
-        })
-    
-    return jsonify({'success': True, 'orders': orders_data})
+    user_id = session['user_id']
+
+    # With ?since=<cursor> only orders that changed after that event are sent
+    since = request.args.get('since', type=int)
+    if since is not None:
+        orders_data, cursor = order_status_changes(user_id, since)
+        return jsonify({'success': True, 'orders': orders_data, 'cursor': cursor})
+
+    cursor = db.session.execute(LATEST_EVENT_STMT).scalar() or 0
+    orders_data = recent_order_statuses(user_id)
+    return jsonify({'success': True, 'orders': orders_data, 'cursor': cursor})
 
 @app.route('/api/submit-rating', methods=['POST'])
 @login_required
@@ -1444,7 +3062,6 @@ def profile():
     if not user:
         flash('Please log in to view your profile.', 'warning')
         return redirect(url_for('login'))
-    orders = Order.query.filter_by(customer_phone=user.phone).order_by(Order.created_at.desc()).all()
 
     # Determine loyalty tier
     tier_info = {
@@ -1464,7 +3081,8 @@ def profile():
     if next_tier:
         progress = min(100, (user.loyalty_points - current_tier['min']) / (next_tier['min'] - current_tier['min']) * 100)
 
-    content = f"""
+    def sections():
+        yield f"""
 <div class="container py-5">
     <div class="row">
         <div class="col-lg-4">
@@ -1499,8 +3117,8 @@ def profile():
                         </div>
     """
     
-    if next_tier:
-        content += f"""
+        if next_tier:
+            yield f"""
                         <p class="mb-2">Progress to {next_tier['name']} Tier</p>
                         <div class="progress mb-3" style="height: 20px; border-radius: 10px;">
                             <div class="progress-bar progress-bar-striped progress-bar-animated" 
@@ -1512,12 +3130,12 @@ def profile():
                         </div>
                         <p class="mb-0">Earn {next_tier['min'] - user.loyalty_points} more points to reach {next_tier['name']} tier</p>
         """
-    else:
-        content += """
+        else:
+            yield """
                         <p class="mb-0">You've reached the highest loyalty tier!</p>
         """
     
-    content += """
+        yield """
                     </div>
                 </div>
             </div>
@@ -1528,32 +3146,21 @@ def profile():
                 <div class="card-header" style="background: var(--gradient-1); color: white;">
                     <h5 class="mb-0"><i class="fas fa-history me-2"></i>Order History</h5>
                 </div>
-                <div class="card-body">
+                <div class="card-body" id="profile-orders-list">
     """
 
-    if orders:
-        for order in orders:
-            status_class = f"status-{order.status}"
-            content += f"""
-                    <div class="d-flex justify-content-between align-items-center p-3 mb-3 rounded glass-effect">
-                        <div>
-                            <h6 class="mb-1">Order #{order.order_id}</h6>
-                            <p class="mb-0 text-muted">{order.created_at.strftime('%B %d, %Y at %I:%M %p')}</p>
-                        </div>
-                        <div class="text-end">
-                            <div class="mb-1">
-                                <span class="status-badge {status_class}">{order.status}</span>
-                            </div>
-                            <strong>₹{order.total}</strong>
-                        </div>
-                    </div>
-            """
-    else:
-        content += """
+        # Queried after the profile card has gone out
+        orders, next_cursor = order_history_page(Order.query.filter_by(customer_phone=user.phone))
+        if orders:
+            for order in orders:
+                yield profile_order_row_html(order)
+            yield load_more_html('profile-orders-list', '/api/profile-orders', next_cursor)
+        else:
+            yield """
                     <p class="text-muted text-center">No orders yet. <a href="/menu">Start ordering!</a></p>
         """
 
-    content += """
+        yield """
                 </div>
             </div>
         </div>
@@ -1561,11 +3168,19 @@ def profile():
 </div>
 """
 
-    return render_template_string(BASE_TEMPLATE, 
-                                title="Profile - Biryani Club", 
-                                content=content, 
-                                current_user=user,
-                                extra_scripts="")
+    return render_page("Profile - Biryani Club", sections(), user)
+
+@app.route('/api/profile-orders')
+@login_required
+def api_profile_orders_page():
+    user = User.query.get(session['user_id'])
+    if not user:
+        return jsonify({'success': False, 'error': 'User not found'})
+    orders, next_cursor = order_history_page(Order.query.filter_by(customer_phone=user.phone),
+                                             request.args.get('before'),
+                                             request.args.get('limit', type=int))
+    return jsonify({'success': True, 'html': ''.join(profile_order_row_html(order) for order in orders),
+                    'next': next_cursor})
 
 @app.route('/rewards')
 @login_required
@@ -1672,14 +3287,13 @@ def redeem_reward():
             return jsonify({'success': False, 'error': 'Not enough points'})
             
         user.loyalty_points -= data['points']
+
+        # Priority Delivery is spent automatically on the customer's next order
+        if data.get('reward_name') == 'Priority Delivery':
+            user.priority_credits += 1
         
         # Update loyalty tier
-        if user.loyalty_points < 100:
-            user.loyalty_tier = 'bronze'
-        elif user.loyalty_points < 500:
-            user.loyalty_tier = 'silver'
-        else:
-            user.loyalty_tier = 'gold'
+        user.loyalty_tier = loyalty_tier(user.loyalty_points)
         
         db.session.commit()
         
@@ -1694,18 +3308,23 @@ def redeem_reward():
 @app.route('/admin')
 @admin_required
 def admin():
-    total_orders = Order.query.count()
-    total_users = User.query.count()
-    pending_orders = Order.query.filter_by(status='pending').count()
-    total_revenue = db.session.query(db.func.sum(Order.total)).scalar() or 0
-    active_promotions = Promotion.query.filter_by(active=True).count()
-
-    recent_orders = Order.query.order_by(Order.created_at.desc()).limit(10).all()
-
-    # Popular items
-    popular_items = MenuItem.query.order_by(MenuItem.popularity.desc()).limit(5).all()
+    def load_stats():
+        # The feed cursor is read first so the live feed replays everything
+        # committed after these counts were taken
+        return {
+            'feed_cursor': db.session.query(db.func.max(OrderEvent.id)).scalar() or 0,
+            'total_orders': Order.query.count(),
+            'total_users': User.query.count(),
+            'pending_orders': Order.query.filter_by(status='pending').count(),
+            'total_revenue': db.session.query(db.func.sum(Order.total)).scalar() or 0,
+            'active_promotions': Promotion.query.filter_by(active=True).count(),
+            'popular_items': [{'emoji': item.emoji, 'name': item.name, 'category': item.category,
+                               'popularity': item.popularity}
+                              for item in MenuItem.query.order_by(MenuItem.popularity.desc()).limit(5).all()],
+        }
 
-    content = f"""
+    def sections():
+        yield f"""
 <div class="container py-5">
     <div class="text-center mb-5">
         <h2 class="display-4 fw-bold text-gradient">Admin Dashboard</h2>
@@ -1743,7 +3362,23 @@ def admin():
             </button>
         </div>
     </div>
+"""
+
+        # The controls above go out before any query runs
+        stats = page_cache.get('admin', 'stats', load_stats)
+        feed_cursor = stats['feed_cursor']
+        total_orders = stats['total_orders']
+        total_users = stats['total_users']
+        pending_orders = stats['pending_orders']
+        total_revenue = stats['total_revenue']
+        active_promotions = stats['active_promotions']
 
+        recent_orders = Order.query.order_by(Order.created_at.desc()).limit(10).all()
+
+        # Popular items
+        popular_items = stats['popular_items']
+
+        yield f"""
     <!-- Stats Cards -->
     <div class="row g-4 mb-5">
         <div class="col-lg-3 col-md-6">
@@ -1751,7 +3386,7 @@ def admin():
                 <div class="dashboard-icon mx-auto" style="background: var(--gradient-1);">
                     <i class="fas fa-shopping-cart"></i>
                 </div>
-                <h3 class="fw-bold">{total_orders}</h3>
+                <h3 class="fw-bold" id="total-orders-count">{total_orders}</h3>
                 <p class="text-muted">Total Orders</p>
             </div>
         </div>
@@ -1769,7 +3404,7 @@ def admin():
                 <div class="dashboard-icon mx-auto" style="background: var(--gradient-4);">
                     <i class="fas fa-clock"></i>
                 </div>
-                <h3 class="fw-bold">{pending_orders}</h3>
+                <h3 class="fw-bold" id="pending-orders-count">{pending_orders}</h3>
                 <p class="text-muted">Pending Orders</p>
             </div>
         </div>
@@ -1796,7 +3431,7 @@ def admin():
                 </div>
                 <div class="card-body">
                     <div class="table-responsive">
-                        <table class="table table-hover">
+                        <table class="table table-hover" id="recent-orders" data-feed-cursor="{feed_cursor}">
                             <thead>
                                 <tr>
                                     <th>Order ID</th>
@@ -1810,11 +3445,11 @@ def admin():
                             <tbody>
     """
 
-    for order in recent_orders:
-        status_class = f"status-{order.status}"
+        for order in recent_orders:
+            status_class = f"status-{order.status}"
 
-        content += f"""
-                                <tr>
+            yield f"""
+                                <tr id="admin-order-{order.order_id}" data-version="{order.version}">
                                     <td><strong>#{order.order_id}</strong></td>
                                     <td>{order.customer_name}</td>
                                     <td><strong>₹{order.total}</strong></td>
@@ -1836,7 +3471,7 @@ def admin():
                                 </tr>
         """
 
-    content += """
+        yield """
                             </tbody>
                         </table>
                     </div>
@@ -1863,25 +3498,25 @@ def admin():
                             <tbody>
     """
 
-    for item in popular_items:
-        content += f"""
+        for item in popular_items:
+            yield f"""
                                 <tr>
-                                    <td>{item.emoji} {item.name}</td>
-                                    <td>{item.category}</td>
+                                    <td>{item['emoji']} {item['name']}</td>
+                                    <td>{item['category']}</td>
                                     <td>
                                         <div class="progress" style="height: 20px;">
                                             <div class="progress-bar bg-success" role="progressbar" 
-                                                style="width: {min(100, item.popularity)}%;" 
-                                                aria-valuenow="{item.popularity}" 
+                                                style="width: {min(100, item['popularity'])}%;" 
+                                                aria-valuenow="{item['popularity']}" 
                                                 aria-valuemin="0" 
-                                                aria-valuemax="100">{item.popularity}
+                                                aria-valuemax="100">{item['popularity']}
                                             </div>
                                         </div>
                                     </td>
                                 </tr>
         """
 
-    content += """
+        yield """
                             </tbody>
                         </table>
                     </div>
@@ -1955,6 +3590,10 @@ def admin():
 
 <script>
 function updateOrderStatus(orderId, status) {
+    // Rows changed by the live feed drop their version and let the server
+    // use the current one
+    const row = document.getElementById('admin-order-' + orderId);
+    const version = row && row.dataset.version !== '' ? parseInt(row.dataset.version) : undefined;
     fetch('/admin/update_order', {
         method: 'POST',
         headers: {
@@ -1962,7 +3601,8 @@ function updateOrderStatus(orderId, status) {
         },
         body: JSON.stringify({
             order_id: orderId,
-            status: status
+            status: status,
+            version: version
         })
     })
     .then(response => response.json())
@@ -1971,7 +3611,8 @@ function updateOrderStatus(orderId, status) {
             showNotification('Order status updated!', 'success');
             setTimeout(() => location.reload(), 1000);
         } else {
-            showNotification('Error updating status', 'danger');
+            showNotification(data.error || 'Error updating status', 'danger');
+            setTimeout(() => location.reload(), 1500);
         }
     });
 }
@@ -1980,6 +3621,81 @@ function refreshOrders() {
     location.reload();
 }
 
+// Live order feed: new orders and status changes arrive as server-sent deltas
+function adjustCount(id, delta) {
+    const el = document.getElementById(id);
+    if (el) el.textContent = parseInt(el.textContent) + delta;
+}
+
+function orderActionButtons(orderId) {
+    return `
+        <div class="btn-group" role="group">
+            <button class="btn btn-info btn-sm" onclick="updateOrderStatus('${orderId}', 'preparing')"><i class="fas fa-fire"></i></button>
+            <button class="btn btn-success btn-sm" onclick="updateOrderStatus('${orderId}', 'ready')"><i class="fas fa-check"></i></button>
+            <button class="btn btn-primary btn-sm" onclick="updateOrderStatus('${orderId}', 'delivered')"><i class="fas fa-truck"></i></button>
+        </div>`;
+}
+
+function applyOrderDelta(delta) {
+    const tbody = document.querySelector('#recent-orders tbody');
+    let row = document.getElementById('admin-order-' + delta.order_id);
+    if (delta.from === null) {
+        adjustCount('total-orders-count', 1);
+        if (row || !delta.order) return;
+        row = document.createElement('tr');
+        row.id = 'admin-order-' + delta.order_id;
+        row.dataset.version = '';
+        row.innerHTML = `
+            <td><strong>#${delta.order_id}</strong></td>
+            <td></td>
+            <td><strong>₹${delta.order.total}</strong></td>
+            <td><span class="status-badge"></span></td>
+            <td>${delta.order.date}</td>
+            <td>${orderActionButtons(delta.order_id)}</td>`;
+        row.children[1].textContent = delta.order.customer;
+        tbody.insertBefore(row, tbody.firstChild);
+        while (tbody.children.length > 10) tbody.removeChild(tbody.lastChild);
+    }
+    if (delta.from === 'pending' && delta.to !== 'pending') adjustCount('pending-orders-count', -1);
+    if (delta.to === 'pending' && delta.from !== 'pending') adjustCount('pending-orders-count', 1);
+    if (row) {
+        const badge = row.querySelector('.status-badge');
+        badge.className = 'status-badge status-' + delta.to;
+        badge.textContent = delta.to;
+        if (delta.from !== null) row.dataset.version = '';
+    }
+}
+
+// Without a live feed (no EventSource, or the server is at its cap) poll the
+// event log instead and reload when an order changed
+let adminFeedCursor = null;
+
+function pollOrderEvents() {
+    fetch('/admin/order_events?limit=1&since=' + adminFeedCursor)
+    .then(response => response.json())
+    .then(data => {
+        if (data.success && data.events.length) location.reload();
+    })
+    .catch(error => console.log('Order poll failed:', error));
+}
+
+document.addEventListener('DOMContentLoaded', function() {
+    adminFeedCursor = document.getElementById('recent-orders').dataset.feedCursor;
+    if (!window.EventSource) {
+        setInterval(pollOrderEvents, 30000);
+        return;
+    }
+    const feed = new EventSource('/admin/feed?since=' + adminFeedCursor);
+    feed.addEventListener('order', function(e) {
+        const delta = JSON.parse(e.data);
+        adminFeedCursor = delta.seq;
+        applyOrderDelta(delta);
+    });
+    feed.addEventListener('error', function() {
+        if (feed.readyState === EventSource.CLOSED) setInterval(pollOrderEvents, 30000);
+    });
+});
+
 function toggleStore() {
     fetch('/admin/toggle_store', {
         method: 'POST',
@@ -2062,14 +3778,17 @@ function showAssignDelivery() {
                 html += `
                     <div class="card mb-3">
                         <div class="card-body">
-                            <h6>Order #${order.order_id}</h6>
+                            <h6>Order #${order.order_id} ${order.priority ? '<span class="badge bg-warning">Priority</span>' : ''}</h6>
                             <p class="mb-2">${order.customer_name} - ₹${order.total}</p>
-                            <select class="form-select mb-2" id="delivery-${order.order_id}">
+                            <select class="form-select mb-2" id="delivery-${order.order_id}" data-version="${order.version}">
                                 <option value="">Select Delivery Person</option>
                 `;
                 
+                const distances = {};
+                order.nearest_riders.forEach(rider => { distances[rider.id] = rider.distance_km; });
                 data.delivery_persons.forEach(person => {
-                    html += `<option value="${person.id}">${person.full_name}</option>`;
+                    const distance = person.id in distances ? ` - ${distances[person.id]} km away` : '';
+                    html += `<option value="${person.id}">${person.full_name} (${person.active_deliveries} active)${distance}</option>`;
                 });
                 
                 html += `
@@ -2109,17 +3828,18 @@ function assignDelivery(orderId) {
         },
         body: JSON.stringify({
             order_id: orderId,
-            delivery_person_id: deliveryPersonId
+            delivery_person_id: deliveryPersonId,
+            version: parseInt(selectElement.dataset.version)
         })
     })
     .then(response => response.json())
     .then(data => {
         if (data.success) {
             showNotification('Delivery person assigned!', 'success');
-            showAssignDelivery(); // Refresh the modal
         } else {
-            showNotification('Error assigning delivery person', 'danger');
+            showNotification(data.error || 'Error assigning delivery person', 'danger');
         }
+        showAssignDelivery(); // Refresh the modal
     });
 }
 
@@ -2329,11 +4049,494 @@ function showAnalytics() {
 """
 
     user = User.query.get(session['user_id'])
-    return render_template_string(BASE_TEMPLATE, 
-                                title="Admin Panel - Biryani Club", 
-                                content=content, 
-                                current_user=user,
-                                extra_scripts="")
+    return render_page("Admin Panel - Biryani Club", sections(), user)
+
+# Rider locations: a uniform lat/lng grid answers "k nearest free riders"
+# by scanning rings of cells outward from the order
+RIDER_LOCATION_TTL = 5 * 60  # seconds before a ping is considered stale
+GRID_CELL_DEGREES = 0.01  # ~1.1 km
+GRID_MAX_RING = 50
+
+def distance_km(lat1, lng1, lat2, lng2):
+    # Haversine distance
+    lat1, lng1, lat2, lng2 = map(math.radians, (lat1, lng1, lat2, lng2))
+    a = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lng2 - lng1) / 2) ** 2
+    return 12742 * math.asin(math.sqrt(a))
+
+class RiderLocationIndex:
+    def __init__(self, cell_degrees=GRID_CELL_DEGREES, ttl=RIDER_LOCATION_TTL):
+        self.cell_degrees = cell_degrees
+        self.ttl = ttl
+        self._cells = {}  # (row, col) -> set of rider ids
+        self._riders = {}  # rider_id -> (lat, lng, cell, seen_at)
+        self._lock = threading.Lock()
+
+    def _cell(self, lat, lng):
+        return int(math.floor(lat / self.cell_degrees)), int(math.floor(lng / self.cell_degrees))
+
+    def update(self, rider_id, lat, lng, seen_at=None):
+        cell = self._cell(lat, lng)
+        with self._lock:
+            previous = self._riders.get(rider_id)
+            if previous and previous[2] != cell:
+                self._discard(rider_id, previous[2])
+            self._cells.setdefault(cell, set()).add(rider_id)
+            self._riders[rider_id] = (lat, lng, cell, seen_at if seen_at is not None else time.time())
+
+    def remove(self, rider_id):
+        with self._lock:
+            previous = self._riders.pop(rider_id, None)
+            if previous:
+                self._discard(rider_id, previous[2])
+
+    def last_seen(self, rider_id):
+        entry = self._riders.get(rider_id)
+        return entry[3] if entry else None
+
+    def location_of(self, rider_id):
+        entry = self._riders.get(rider_id)
+        if entry and time.time() - entry[3] <= self.ttl:
+            return entry[0], entry[1]
+        return None
+
+    def __len__(self):
+        return len(self._riders)
+
+    def nearest(self, lat, lng, k=5, accept=None):
+        # [(rider_id, km)] for the k closest riders with a fresh ping that
+        # pass accept(rider_id), closest first
+        row, col = self._cell(lat, lng)
+        # Shortest ground distance covered by one cell, for the stopping bound
+        cell_km = self.cell_degrees * 111.0 * max(0.01, math.cos(math.radians(min(89.0, abs(lat) + self.cell_degrees))))
+        stale_before = time.time() - self.ttl
+        found = []
+        with self._lock:
+            seen = 0
+            for ring in range(GRID_MAX_RING + 1):
+                for cell in self._ring_cells(row, col, ring):
+                    for rider_id in self._cells.get(cell, ()):
+                        seen += 1
+                        r_lat, r_lng, _, seen_at = self._riders[rider_id]
+                        if seen_at < stale_before or (accept and not accept(rider_id)):
+                            continue
+                        found.append((distance_km(lat, lng, r_lat, r_lng), rider_id))
+                # Anything outside this ring is at least ring * cell_km away
+                if len(found) >= k:
+                    found.sort()
+                    if found[k - 1][0] <= ring * cell_km:
+                        break
+                if seen == len(self._riders):
+                    break
+        found.sort()
+        return [(rider_id, km) for km, rider_id in found[:k]]
+
+    @staticmethod
+    def _ring_cells(row, col, ring):
+        if ring == 0:
+            yield row, col
+            return
+        for c in range(col - ring, col + ring + 1):
+            yield row - ring, c
+            yield row + ring, c
+        for r in range(row - ring + 1, row + ring):
+            yield r, col - ring
+            yield r, col + ring
+
+    def _discard(self, rider_id, cell):
+        riders = self._cells.get(cell)
+        if riders is not None:
+            riders.discard(rider_id)
+            if not riders:
+                del self._cells[cell]
+
+rider_locations = RiderLocationIndex()
+
+# Multi-drop routes: nearest neighbour tour from the store, tidied with 2-opt
+STORE_LOCATION = parse_coordinates(os.environ.get('STORE_LAT', '17.385'), os.environ.get('STORE_LNG', '78.4867'))
+RIDER_SPEED_KMH = 20
+MINUTES_PER_DROP = 3
+
+def plan_route(start, stops):
+    # Visiting order (indexes into stops) for an open path starting at start
+    n = len(stops)
+    if n < 2:
+        return list(range(n))
+    points = [start] + list(stops)
+    dist = [[distance_km(a[0], a[1], b[0], b[1]) for b in points] for a in points]
+
+    path = [0]
+    remaining = set(range(1, n + 1))
+    while remaining:
+        current = path[-1]
+        nearest = min(remaining, key=lambda j: dist[current][j])
+        path.append(nearest)
+        remaining.remove(nearest)
+
+    # Reverse path[i..j] whenever that shortens the route; the path is open,
+    # so the last segment has no outgoing edge to pay for
+    improved = True
+    while improved:
+        improved = False
+        for i in range(1, n):
+            for j in range(i + 1, n + 1):
+                a, b, c = path[i - 1], path[i], path[j]
+                delta = dist[a][c] - dist[a][b]
+                if j < n:
+                    d = path[j + 1]
+                    delta += dist[b][d] - dist[c][d]
+                if delta < -1e-9:
+                    path[i:j + 1] = path[i:j + 1][::-1]
+                    improved = True
+    return [point - 1 for point in path[1:]]
+
+def route_with_etas(start, stops):
+    # [(stop_index, leg_km, cumulative_minutes)] in visiting order
+    legs = []
+    position, minutes = start, 0.0
+    for index in plan_route(start, stops):
+        km = distance_km(position[0], position[1], stops[index][0], stops[index][1])
+        minutes += km / RIDER_SPEED_KMH * 60 + MINUTES_PER_DROP
+        legs.append((index, km, minutes))
+        position = stops[index]
+    return legs
+
+# Delivery time estimates: per hour-of-day rolling averages of prep time
+# (placed -> ready) and delivery time (ready -> delivered) plus the current
+# kitchen queue, each updated in O(1) per status change. All times are naive
+# UTC, as the columns are stored. The averages are warmed from history at
+# startup, so no request waits on it
+DEFAULT_PREP_MINUTES = 15
+DEFAULT_DELIVERY_MINUTES = 20
+ETA_MIN_SAMPLES = 5  # per hour bucket before it is trusted over the overall average
+ETA_WARMUP_ORDERS = 5000
+ETA_RESYNC_SECONDS = 60
+KITCHEN_SLOTS = 4  # orders the kitchen cooks at once
+KITCHEN_STATUSES = ('pending', 'preparing')
+
+class RollingStat:
+    # Exponentially weighted mean and variance
+    __slots__ = ('alpha', 'count', 'mean', 'var')
+
+    def __init__(self, alpha=0.1):
+        self.alpha = alpha
+        self.count = 0
+        self.mean = 0.0
+        self.var = 0.0
+
+    def add(self, value):
+        self.count += 1
+        if self.count == 1:
+            self.mean = value
+            return
+        diff = value - self.mean
+        increment = self.alpha * diff
+        self.mean += increment
+        self.var = (1 - self.alpha) * (self.var + diff * increment)
+
+class EtaPredictor:
+    def __init__(self):
+        self.prep = [RollingStat() for _ in range(24)]
+        self.delivery = [RollingStat() for _ in range(24)]
+        self.prep_overall = RollingStat()
+        self.delivery_overall = RollingStat()
+        self.queue = [RollingStat() for _ in range(24)]  # kitchen queue seen by new orders
+        self.kitchen_queue = 0
+        self.synced_at = None
+        self._lock = threading.Lock()
+
+    def observe_prep(self, placed_at, ready_at):
+        self._observe(self.prep, self.prep_overall, placed_at, ready_at)
+
+    def observe_delivery(self, ready_at, delivered_at):
+        self._observe(self.delivery, self.delivery_overall, ready_at, delivered_at)
+
+    def entered_kitchen(self, placed_at=None):
+        with self._lock:
+            if placed_at is not None:
+                self.queue[placed_at.hour].add(self.kitchen_queue)
+            self.kitchen_queue += 1
+
+    def left_kitchen(self):
+        with self._lock:
+            self.kitchen_queue = max(0, self.kitchen_queue - 1)
+
+    def prep_minutes(self, at):
+        base = self._mean(self.prep, self.prep_overall, at.hour, DEFAULT_PREP_MINUTES)
+        # Historical prep times already include the usual queue for this hour;
+        # only orders beyond it add time, spread over the kitchen's slots
+        usual = self.queue[at.hour]
+        backlog = self.kitchen_queue - (usual.mean if usual.count >= ETA_MIN_SAMPLES else KITCHEN_SLOTS)
+        return base + max(0.0, backlog) * base / KITCHEN_SLOTS
+
+    def delivery_minutes(self, at):
+        return self._mean(self.delivery, self.delivery_overall, at.hour, DEFAULT_DELIVERY_MINUTES)
+
+    def estimate(self, placed_at):
+        # Minutes from placement to the door
+        prep = self.prep_minutes(placed_at)
+        return prep + self.delivery_minutes(placed_at + timedelta(minutes=prep))
+
+    def _observe(self, buckets, overall, start, end):
+        if not start or not end:
+            return
+        minutes = (end - start).total_seconds() / 60
+        if not 0 < minutes < 24 * 60:
+            return
+        with self._lock:
+            buckets[start.hour].add(minutes)
+            overall.add(minutes)
+
+    @staticmethod
+    def _mean(buckets, overall, hour, default):
+        if buckets[hour].count >= ETA_MIN_SAMPLES:
+            return buckets[hour].mean
+        if overall.count:
+            return overall.mean
+        return default
+
+eta_predictor = EtaPredictor()
+
+def warm_eta_predictor():
+    history = (db.session.query(Order.created_at, Order.ready_at, Order.delivered_at)
+               .filter(Order.ready_at.isnot(None))
+               .order_by(Order.id.desc()).limit(ETA_WARMUP_ORDERS).all())
+    for placed_at, ready_at, delivered_at in reversed(history):
+        eta_predictor.observe_prep(placed_at, ready_at)
+        eta_predictor.observe_delivery(ready_at, delivered_at)
+
+def sync_eta_predictor(force=False):
+    # Periodically recount the kitchen queue so orders handled by other
+    # workers are included
+    synced_at = eta_predictor.synced_at
+    if not force and synced_at is not None and time.monotonic() - synced_at < ETA_RESYNC_SECONDS:
+        return
+    eta_predictor.kitchen_queue = Order.query.filter(Order.status.in_(KITCHEN_STATUSES)).count()
+    eta_predictor.synced_at = time.monotonic()
+
+def record_status_change(created_at, ready_at, previous_status, status, now):
+    # Feed a committed status change into the ETA model
+    was_cooking, cooking = previous_status in KITCHEN_STATUSES, status in KITCHEN_STATUSES
+    if was_cooking and not cooking:
+        eta_predictor.left_kitchen()
+    elif cooking and not was_cooking:
+        eta_predictor.entered_kitchen()
+    if status == 'ready' and was_cooking:
+        eta_predictor.observe_prep(created_at, now)
+    if status == 'delivered' and previous_status == 'ready':
+        eta_predictor.observe_delivery(ready_at, now)
+
+def eta_label(order, now=None):
+    # Short customer-facing ETA for an undelivered order
+    if order.status == 'delivered' or not order.estimated_delivery:
+        return ''
+    minutes = int(round((order.estimated_delivery - (now or datetime.utcnow())).total_seconds() / 60))
+    return f'~{minutes} min' if minutes > 0 else 'Any minute now'
+
+# Delivery dispatch: ready orders wait in a priority queue (priority rewards
+# first, then oldest) and go to the nearest free rider when both sides have a
+# location, otherwise to the least loaded rider from a min-heap. Only riders
+# who are on shift count, meaning their delivery panel sent a location ping
+# within RIDER_LOCATION_TTL; with nobody on shift orders stay queued until a
+# rider pings or accepts one. Loads are kept for every rider
+MAX_ACTIVE_DELIVERIES = 4  # per rider
+DISPATCH_RESYNC_SECONDS = 60
+app.config.setdefault('AUTO_ASSIGN_DELIVERY', True)
+
+class DeliveryDispatcher:
+    def __init__(self, max_load=MAX_ACTIVE_DELIVERIES, rider_index=None):
+        self.max_load = max_load
+        self.rider_index = rider_index
+        self.synced_at = None
+        self._orders = []  # heap of (rank, created_ts, seq, order_id)
+        self._queued = {}  # order_id -> its live heap entry
+        self._order_locations = {}  # order_id -> (lat, lng)
+        self._riders = []  # heap of (load, seq, rider_id) for on-shift riders; stale entries skipped lazily
+        self._loads = {}  # rider_id -> current load
+        self._on_shift = set()
+        self._seq = 0
+        self._lock = threading.Lock()
+
+    def reset(self, riders, ready_orders, on_shift=None):
+        # riders: {rider_id: load}
+        # ready_orders: [(order_id, created_at, priority, lat, lng)]
+        # on_shift: rider ids that can be given orders; None means all of them
+        with self._lock:
+            self._orders, self._queued, self._order_locations = [], {}, {}
+            self._riders, self._loads = [], {}
+            self._on_shift = set(riders if on_shift is None else on_shift) & set(riders)
+            for rider_id, load in riders.items():
+                self._set_load(rider_id, load)
+            for order_id, created_at, priority, lat, lng in ready_orders:
+                self._enqueue(order_id, created_at, priority, parse_coordinates(lat, lng))
+            self.synced_at = time.monotonic()
+
+    def enqueue(self, order_id, created_at, priority=False, location=None):
+        with self._lock:
+            self._enqueue(order_id, created_at, priority, location)
+
+    def discard(self, order_id):
+        with self._lock:
+            self._queued.pop(order_id, None)
+            self._order_locations.pop(order_id, None)
+
+    def add_rider(self, rider_id):
+        with self._lock:
+            if rider_id not in self._loads:
+                self._set_load(rider_id, 0)
+
+    def remove_rider(self, rider_id):
+        with self._lock:
+            self._loads.pop(rider_id, None)
+            self._on_shift.discard(rider_id)
+
+    def start_shift(self, rider_id):
+        # True if the rider was not a candidate before
+        with self._lock:
+            if rider_id in self._on_shift:
+                return False
+            self._on_shift.add(rider_id)
+            self._set_load(rider_id, self._loads.get(rider_id, 0))
+            return True
+
+    def assigned(self, rider_id):
+        with self._lock:
+            if rider_id in self._loads:
+                self._set_load(rider_id, self._loads[rider_id] + 1)
+
+    def released(self, rider_id):
+        with self._lock:
+            if rider_id in self._loads:
+                self._set_load(rider_id, max(0, self._loads[rider_id] - 1))
+
+    def pop_assignment(self):
+        # Next (order_id, rider_id) pair, already counted against the rider's load
+        with self._lock:
+            rider_id = self._least_loaded_rider()
+            if rider_id is None:
+                return None
+            order_id = self._pop_order()
+            if order_id is None:
+                return None
+            location = self._order_locations.pop(order_id, None)
+            if location and self.rider_index is not None:
+                nearest = self.rider_index.nearest(location[0], location[1], k=1, accept=self.has_capacity)
+                if nearest:
+                    rider_id = nearest[0][0]
+            self._set_load(rider_id, self._loads[rider_id] + 1)
+            return order_id, rider_id
+
+    def has_capacity(self, rider_id):
+        load = self._loads.get(rider_id)
+        return load is not None and load < self.max_load and rider_id in self._on_shift
+
+    def load_of(self, rider_id):
+        return self._loads.get(rider_id, 0)
+
+    def queue_length(self):
+        return len(self._queued)
+
+    def _enqueue(self, order_id, created_at, priority, location):
+        self._seq += 1
+        entry = (0 if priority else 1, created_at.timestamp(), self._seq, order_id)
+        self._queued[order_id] = entry
+        if location:
+            self._order_locations[order_id] = location
+        heapq.heappush(self._orders, entry)
+
+    def _pop_order(self):
+        while self._orders:
+            entry = heapq.heappop(self._orders)
+            if self._queued.get(entry[3]) is entry:
+                del self._queued[entry[3]]
+                return entry[3]
+        return None
+
+    def _set_load(self, rider_id, load):
+        self._loads[rider_id] = load
+        if rider_id not in self._on_shift:
+            return
+        self._seq += 1
+        heapq.heappush(self._riders, (load, self._seq, rider_id))
+        # Rebuild once stale entries dominate, keeping the heap O(riders)
+        if len(self._riders) > 4 * len(self._on_shift) + 64:
+            self._riders = [(load, seq, rid) for load, seq, rid in self._riders
+                            if self._loads.get(rid) == load and rid in self._on_shift]
+            heapq.heapify(self._riders)
+
+    def _least_loaded_rider(self):
+        while self._riders:
+            load, _, rider_id = self._riders[0]
+            if self._loads.get(rider_id) != load or rider_id not in self._on_shift:
+                heapq.heappop(self._riders)
+                continue
+            if self.rider_index is not None and self.rider_index.location_of(rider_id) is None:
+                # No ping since the last sync: off shift until the next one
+                heapq.heappop(self._riders)
+                self._on_shift.discard(rider_id)
+                continue
+            return rider_id if load < self.max_load else None
+        return None
+
+delivery_dispatcher = DeliveryDispatcher(rider_index=rider_locations)
+
+def sync_dispatcher(force=False):
+    # Rebuild from the database at startup and periodically, so assignments
+    # made by other workers are picked up
+    synced_at = delivery_dispatcher.synced_at
+    if not force and synced_at is not None and time.monotonic() - synced_at < DISPATCH_RESYNC_SECONDS:
+        return
+    # Every rider's ping, latest location and load; those who pinged within
+    # RIDER_LOCATION_TTL (on any worker) are the ones on shift
+    fresh_since = datetime.utcnow() - timedelta(seconds=RIDER_LOCATION_TTL)
+    riders = {}
+    on_shift = []
+    for rider_id, lat, lng, seen_at in (db.session.query(User.id, User.last_lat, User.last_lng, User.last_location_at)
+                                        .filter(User.is_delivery == True)):
+        riders[rider_id] = 0
+        if seen_at is not None and seen_at >= fresh_since:
+            on_shift.append(rider_id)
+            seen_ts = time.time() - (datetime.utcnow() - seen_at).total_seconds()
+            if (rider_locations.last_seen(rider_id) or 0) < seen_ts:
+                rider_locations.update(rider_id, lat, lng, seen_at=seen_ts)
+    active = (db.session.query(Order.delivery_person_id, db.func.count(Order.id))
+              .filter(Order.status == 'ready', Order.delivery_person_id.isnot(None))
+              .group_by(Order.delivery_person_id))
+    for rider_id, load in active:
+        if rider_id in riders:
+            riders[rider_id] = load
+    ready_orders = (db.session.query(Order.order_id, Order.created_at, Order.priority,
+                                     Order.delivery_lat, Order.delivery_lng)
+                    .filter(Order.status == 'ready', Order.delivery_person_id.is_(None))
+                    .all())
+    delivery_dispatcher.reset(riders, ready_orders, on_shift)
+
+def auto_assign_deliveries():
+    if not app.config['AUTO_ASSIGN_DELIVERY']:
+        return []
+    sync_dispatcher()
+    assignments = []
+    while True:
+        pair = delivery_dispatcher.pop_assignment()
+        if pair is None:
+            break
+        order_id, rider_id = pair
+        # Same conditional claim riders use, so a rider tapping "Accept" first still wins
+        result = db.session.execute(
+            db.update(Order)
+            .where(Order.order_id == order_id,
+                   Order.delivery_person_id.is_(None),
+                   Order.status == 'ready')
+            .values(delivery_person_id=rider_id, version=Order.version + 1)
+            .execution_options(synchronize_session=False)
+        )
+        if result.rowcount == 1:
+            log_order_event(order_id, 'ready', 'ready', delivery_person_id=rider_id)
+        db.session.commit()
+        if result.rowcount == 1:
+            assignments.append(pair)
+        else:
+            delivery_dispatcher.released(rider_id)
+    return assignments
 
 # Admin API Endpoints
 @app.route('/admin/update_order', methods=['POST'])
@@ -2345,14 +4548,50 @@ def update_order_status():
         status = data.get('status')
 
         order = Order.query.filter_by(order_id=order_id).first()
-        if order:
-            order.status = status
-            if status == 'ready':
-                order.estimated_delivery = datetime.now() + timedelta(minutes=30)
-            db.session.commit()
-            return jsonify({'success': True})
-        else:
+        if not order:
             return jsonify({'success': False, 'error': 'Order not found'})
+
+        # Optimistic update: only applies if nobody changed the order since the
+        # admin's page (or our read) saw it at this version. Leaving version
+        # out is allowed and means the order as read just above: the admin
+        # page does that for rows the live feed changed, as feed events carry
+        # no version, so the check then only covers a change racing this request
+        expected_version = data.get('version', order.version)
+        previous_status, rider_id = order.status, order.delivery_person_id
+        created_at, ready_at = order.created_at, order.ready_at
+        now = datetime.utcnow()
+        values = {'status': status, 'version': Order.version + 1}
+        if status == 'ready' and previous_status != 'ready':
+            sync_eta_predictor()
+            values['ready_at'] = now
+            values['estimated_delivery'] = now + timedelta(minutes=eta_predictor.delivery_minutes(now))
+        elif status == 'delivered' and previous_status != 'delivered':
+            values['delivered_at'] = now
+        result = db.session.execute(
+            db.update(Order)
+            .where(Order.id == order.id, Order.version == expected_version)
+            .values(**values)
+            .execution_options(synchronize_session=False)
+        )
+        if result.rowcount == 1:
+            log_order_event(order.order_id, previous_status, status, actor_id=session['user_id'],
+                            delivery_person_id=rider_id, at=now)
+        db.session.commit()
+        if result.rowcount != 1:
+            return jsonify({'success': False, 'error': 'Order was updated by someone else, please refresh'})
+        record_status_change(created_at, ready_at, previous_status, status, now)
+
+        if status == 'ready' and previous_status != 'ready' and rider_id is None:
+            sync_dispatcher()
+            delivery_dispatcher.enqueue(order.order_id, order.created_at, order.priority,
+                                        parse_coordinates(order.delivery_lat, order.delivery_lng))
+            auto_assign_deliveries()
+        elif status != 'ready' and previous_status == 'ready':
+            delivery_dispatcher.discard(order.order_id)
+            if rider_id is not None:
+                delivery_dispatcher.released(rider_id)
+                auto_assign_deliveries()
+        return jsonify({'success': True})
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)})
 
@@ -2368,9 +4607,9 @@ def toggle_store_status():
 def get_stock_items():
     try:
         # Get items from database, or create them if they don't exist
-        db_items = MenuItem.query.all()
+        items_data = stock_items_rows()
         
-        if not db_items:
+        if not items_data:
             # Initialize database with menu items
             for category, items in MENU.items():
                 for item in items:
@@ -2384,18 +4623,8 @@ def get_stock_items():
                     )
                     db.session.add(menu_item)
             db.session.commit()
-            db_items = MenuItem.query.all()
-        
-        items_data = []
-        for item in db_items:
-            items_data.append({
-                'name': item.name,
-                'category': item.category,
-                'price': item.price,
-                'description': item.description,
-                'emoji': item.emoji,
-                'in_stock': item.in_stock
-            })
+            page_cache.invalidate('menu', 'home')
+            items_data = stock_items_rows()
         
         return jsonify({'success': True, 'items': items_data})
     except Exception as e:
@@ -2413,6 +4642,7 @@ def toggle_stock():
         if item:
             item.in_stock = in_stock
             db.session.commit()
+            page_cache.invalidate('menu')
             return jsonify({'success': True})
         else:
             return jsonify({'success': False, 'error': 'Item not found'})
@@ -2423,23 +4653,35 @@ def toggle_stock():
 @admin_required
 def get_delivery_assignments():
     try:
-        ready_orders = Order.query.filter_by(status='ready', delivery_person_id=None).all()
-        delivery_persons = User.query.filter_by(is_delivery=True).all()
+        ready_orders = unassigned_ready_rows()
+        delivery_persons = delivery_person_rows()
+        sync_dispatcher()
         
         orders_data = []
-        for order in ready_orders:
+        for order_id, customer_name, total, priority, lat, lng, version in ready_orders:
+            location = parse_coordinates(lat, lng)
+            nearest = []
+            if location:
+                nearest = [{'id': rider_id, 'distance_km': round(km, 2)}
+                           for rider_id, km in rider_locations.nearest(location[0], location[1], k=3,
+                                                                       accept=delivery_dispatcher.has_capacity)]
             orders_data.append({
-                'order_id': order.order_id,
-                'customer_name': order.customer_name,
-                'total': order.total
+                'order_id': order_id,
+                'customer_name': customer_name,
+                'total': total,
+                'priority': priority,
+                'version': version,
+                'nearest_riders': nearest
             })
         
         persons_data = []
-        for person in delivery_persons:
+        for person_id, full_name in delivery_persons:
             persons_data.append({
-                'id': person.id,
-                'full_name': person.full_name
+                'id': person_id,
+                'full_name': full_name,
+                'active_deliveries': delivery_dispatcher.load_of(person_id)
             })
+        persons_data.sort(key=lambda person: person['active_deliveries'])
         
         return jsonify({
             'success': True,
@@ -2458,12 +4700,34 @@ def assign_delivery_person():
         delivery_person_id = data.get('delivery_person_id')
         
         order = Order.query.filter_by(order_id=order_id).first()
-        if order:
-            order.delivery_person_id = delivery_person_id
-            db.session.commit()
-            return jsonify({'success': True})
-        else:
+        if not order:
             return jsonify({'success': False, 'error': 'Order not found'})
+
+        # Manual assignment overrides the dispatcher, which only needs its
+        # load counts corrected. Like a status update it only applies at the
+        # version the admin's modal saw, so a rider who claimed the order in
+        # the meantime (which bumps the version) keeps it
+        expected_version = data.get('version', order.version)
+        previous_rider_id, status = order.delivery_person_id, order.status
+        rider_id = int(delivery_person_id)
+        result = db.session.execute(
+            db.update(Order)
+            .where(Order.id == order.id, Order.version == expected_version)
+            .values(delivery_person_id=rider_id, version=Order.version + 1)
+            .execution_options(synchronize_session=False)
+        )
+        if result.rowcount == 1:
+            log_order_event(order_id, status, status, actor_id=session['user_id'], delivery_person_id=rider_id)
+        db.session.commit()
+        if result.rowcount != 1:
+            return jsonify({'success': False, 'error': 'Order was updated by someone else, please refresh'}), 409
+        if status == 'ready':
+            sync_dispatcher()
+            delivery_dispatcher.discard(order_id)
+            if previous_rider_id is not None:
+                delivery_dispatcher.released(previous_rider_id)
+            delivery_dispatcher.assigned(rider_id)
+        return jsonify({'success': True})
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)})
 
@@ -2471,23 +4735,7 @@ def assign_delivery_person():
 @admin_required
 def get_promotions():
     try:
-        promotions = Promotion.query.all()
-        promotions_data = []
-        for promo in promotions:
-            promotions_data.append({
-                'id': promo.id,
-                'code': promo.code,
-                'description': promo.description,
-                'discount_type': promo.discount_type,
-                'discount_value': promo.discount_value,
-                'min_order': promo.min_order,
-                'valid_from': promo.valid_from.strftime('%Y-%m-%d') if promo.valid_from else None,
-                'valid_to': promo.valid_to.strftime('%Y-%m-%d') if promo.valid_to else None,
-                'max_usage': promo.max_usage,
-                'usage_count': promo.usage_count,
-                'active': promo.active
-            })
-        return jsonify({'success': True, 'promotions': promotions_data})
+        return jsonify({'success': True, 'promotions': promotion_rows()})
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)})
 
@@ -2513,6 +4761,115 @@ def add_promotion():
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)})
 
+@app.route('/admin/cache_stats')
+@admin_required
+def cache_stats():
+    return jsonify({'success': True, **shared_cache.stats()})
+
+@app.route('/admin/slow_queries')
+@admin_required
+def slow_queries():
+    # This worker's ring, newest first; ?format=jsonl downloads it oldest first
+    entries = slow_query_log.entries()
+    if request.args.get('format') == 'jsonl':
+        body = ''.join(json.dumps(entry, separators=(',', ':')) + '\n' for entry in entries)
+        response = Response(body, mimetype='application/x-ndjson')
+        response.headers['Content-Disposition'] = 'attachment; filename=slow-queries.jsonl'
+        return response
+    return jsonify({'success': True, 'threshold_seconds': app.config['SLOW_QUERY_SECONDS'],
+                    'recorded': slow_query_log.recorded, 'queries': entries[::-1]})
+
+@app.route('/admin/profiles')
+@admin_required
+def list_profiles():
+    profiles = []
+    for name in request_profiler.profile_files():
+        document = request_profiler.load(name[:-len('.speedscope.json')])
+        if document:
+            profiles.append(document['meta'])
+    return jsonify({'success': True, 'armed': request_profiler.armed(), 'profiles': profiles})
+
+@app.route('/admin/profiles/arm', methods=['POST'])
+@admin_required
+def arm_profiler():
+    try:
+        data = request.json
+        endpoint = data['endpoint']
+        if endpoint not in app.view_functions:
+            return jsonify({'success': False, 'error': 'Unknown endpoint'})
+        requests_left = max(0, min(int(data.get('requests', 1)), PROFILE_MAX_ARMED))
+        return jsonify({'success': True, 'armed': request_profiler.arm(endpoint, requests_left)})
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)})
+
+@app.route('/admin/profiles/<profile_id>')
+@admin_required
+def download_profile(profile_id):
+    document = request_profiler.load(profile_id)
+    if document is None:
+        return jsonify({'success': False, 'error': 'Profile not found'}), 404
+    if request.args.get('format') == 'collapsed':
+        response = Response(collapsed_stacks(document), mimetype='text/plain')
+        filename = f'{profile_id}.folded'
+    else:
+        response = Response(json.dumps(document, separators=(',', ':')), mimetype='application/json')
+        filename = f'{profile_id}.speedscope.json'
+    response.headers['Content-Disposition'] = f'attachment; filename={filename}'
+    return response
+
+@app.route('/admin/memory')
+@admin_required
+def memory_report():
+    # This worker only; ?objects=1 also walks the heap for ORM objects
+    traced, peak = tracemalloc.get_traced_memory()
+    report = {'success': True, 'pid': os.getpid(), 'rss_bytes': current_rss_bytes(),
+              'recycle_rss_mb': app.config['MEMORY_RECYCLE_RSS_MB'],
+              'tracing': tracemalloc.is_tracing(), 'traced_bytes': traced, 'traced_peak_bytes': peak,
+              'snapshots': [{'name': name, 'taken_at': taken_at.isoformat(timespec='seconds') + 'Z'}
+                            for name, (taken_at, _) in memory_diagnostics.snapshots.items()],
+              'routes': memory_diagnostics.route_report()}
+    if request.args.get('objects'):
+        report['objects'] = memory_diagnostics.object_counts()
+    return jsonify(report)
+
+@app.route('/admin/memory/tracing', methods=['POST'])
+@admin_required
+def memory_tracing():
+    try:
+        data = request.json
+        if data.get('enabled'):
+            memory_diagnostics.start_tracing(max(1, min(int(data.get('frames', 1)), 25)))
+        else:
+            memory_diagnostics.stop_tracing()
+        return jsonify({'success': True, 'tracing': tracemalloc.is_tracing()})
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)})
+
+@app.route('/admin/memory/snapshot', methods=['POST'])
+@admin_required
+def memory_snapshot():
+    try:
+        if not tracemalloc.is_tracing():
+            return jsonify({'success': False, 'error': 'Tracing is off'})
+        name = (request.json or {}).get('name') or datetime.utcnow().strftime('%H:%M:%S')
+        memory_diagnostics.take_snapshot(name)
+        return jsonify({'success': True, 'name': name})
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)})
+
+@app.route('/admin/memory/diff')
+@admin_required
+def memory_diff():
+    key_type = request.args.get('group', 'lineno')
+    if key_type not in ('lineno', 'filename', 'traceback'):
+        return jsonify({'success': False, 'error': 'group must be lineno, filename or traceback'})
+    try:
+        stats = memory_diagnostics.diff(request.args['from'], request.args['to'], key_type,
+                                        max(1, min(request.args.get('limit', MEMORY_TOP_LINES, type=int), 200)))
+    except KeyError:
+        return jsonify({'success': False, 'error': 'Unknown snapshot'}), 404
+    return jsonify({'success': True, 'stats': stats})
+
 @app.route('/admin/sales_data')
 @admin_required
 def sales_data():
@@ -2525,14 +4882,204 @@ def sales_data():
         'revenue': revenue
     })
 
+# Live order feed: one pump thread per worker tails OrderEvent and keeps the
+# most recent deltas in a shared ring buffer. Each connected client only
+# holds a cursor, so memory per client is constant; a client that falls
+# behind the ring is served the gap from the database at its own pace.
+# A connected client does hold a worker thread for as long as it stays, so
+# serve with threaded workers (gunicorn --threads, or gevent) and keep
+# FEED_MAX_SUBSCRIBERS well below the thread count. Past the cap a client
+# gets 503 and its page falls back to polling every 30 seconds
+FEED_POLL_SECONDS = 1.0
+FEED_RING_SIZE = 1024
+FEED_BATCH = 200
+FEED_KEEPALIVE_SECONDS = 15
+app.config.setdefault('FEED_MAX_SUBSCRIBERS', int(os.environ.get('FEED_MAX_SUBSCRIBERS', 4)))  # per worker
+
+def feed_deltas(events):
+    # Compact JSON-ready deltas. New orders carry the fields an admin list row
+    # needs; orders at 'ready' also carry what a rider's card needs, which
+    # the rider feed only passes on to riders who may see it (rider_feed_view)
+    detail_ids = {e.order_id for e in events if e.from_status is None or e.to_status == 'ready'}
+    details = {}
+    if detail_ids:
+        rows = (db.session.query(Order.order_id, Order.customer_name, Order.customer_phone,
+                                 Order.customer_address, Order.total, Order.created_at)
+                .filter(Order.order_id.in_(detail_ids)))
+        for order_id, customer_name, phone, address, total, created_at in rows:
+            details[order_id] = (customer_name, phone, address, total, created_at.strftime('%m/%d/%Y'))
+    deltas = []
+    for e in events:
+        delta = {'seq': e.id, 'order_id': e.order_id, 'from': e.from_status, 'to': e.to_status}
+        if e.delivery_person_id is not None:
+            delta['rider'] = e.delivery_person_id
+        if e.order_id in details:
+            customer_name, phone, address, total, date = details[e.order_id]
+            if e.from_status is None:
+                delta['order'] = {'customer': customer_name, 'total': total, 'date': date}
+            elif e.to_status == 'ready':
+                delta['order'] = {'customer': customer_name, 'phone': phone, 'address': address, 'total': total}
+        deltas.append(delta)
+    return deltas
+
+class OrderEventHub:
+    def __init__(self, ring_size=FEED_RING_SIZE, poll_seconds=FEED_POLL_SECONDS):
+        self.poll_seconds = poll_seconds
+        self.latest = None  # highest sequence seen by the pump
+        self._ring = deque(maxlen=ring_size)
+        self._subscribers = 0
+        self._cond = threading.Condition()
+        self._wake = threading.Event()
+        self._pump_thread = None
+
+    def subscribe(self):
+        with self._cond:
+            if self._subscribers >= app.config['FEED_MAX_SUBSCRIBERS']:
+                return False
+            self._subscribers += 1
+            if self._pump_thread is None:
+                if self.latest is None:
+                    self.latest = db.session.query(db.func.max(OrderEvent.id)).scalar() or 0
+                self._pump_thread = threading.Thread(target=self._pump, name='order-event-pump', daemon=True)
+                self._pump_thread.start()
+            return True
+
+    def unsubscribe(self):
+        with self._cond:
+            self._subscribers -= 1
+
+    def wake(self):
+        self._wake.set()
+
+    def wait_for(self, cursor, timeout):
+        # Deltas after cursor, or [] on timeout. Returns None when the client
+        # is behind the ring and must catch up from the database
+        with self._cond:
+            if self.latest is not None and self.latest <= cursor:
+                self._cond.wait(timeout)
+            if self.latest is None or self.latest <= cursor:
+                return []
+            if not self._ring or self._ring[0]['seq'] > cursor + 1:
+                return None
+            return [delta for delta in self._ring if delta['seq'] > cursor][:FEED_BATCH]
+
+    def _pump(self):
+        with app.app_context():
+            while True:
+                with self._cond:
+                    if self._subscribers <= 0:
+                        self._pump_thread = None
+                        return
+                self._wake.wait(self.poll_seconds)
+                self._wake.clear()
+                try:
+                    deltas = feed_deltas(order_events_since(self.latest, FEED_BATCH))
+                except Exception:
+                    deltas = []
+                finally:
+                    # Never hold a read transaction open between polls
+                    db.session.remove()
+                if deltas:
+                    with self._cond:
+                        self._ring.extend(deltas)
+                        self.latest = deltas[-1]['seq']
+                        self._cond.notify_all()
+                    if len(deltas) == FEED_BATCH:
+                        self._wake.set()
+
+order_event_hub = OrderEventHub()
+
+def sse_message(delta):
+    return f"id: {delta['seq']}\nevent: order\ndata: {json.dumps(delta, separators=(',', ':'))}\n\n"
+
+def order_feed_response(view=None):
+    # Server-sent events of order deltas. view(delta), when given, returns
+    # what this subscriber is sent (a copy if it differs), or None to skip
+    # the delta; ring entries are shared, so it must not change them.
+    # EventSource resends Last-Event-ID on reconnect, which resumes the stream
+    cursor = request.headers.get('Last-Event-ID', type=int)
+    if cursor is None:
+        cursor = request.args.get('since', type=int)
+    if cursor is None:
+        cursor = db.session.query(db.func.max(OrderEvent.id)).scalar() or 0
+    if not order_event_hub.subscribe():
+        db.session.remove()
+        return jsonify({'success': False, 'error': 'Too many live feed connections'}), 503
+    db.session.remove()
+
+    def stream(cursor):
+        try:
+            yield 'retry: 3000\n\n'
+            while True:
+                deltas = order_event_hub.wait_for(cursor, FEED_KEEPALIVE_SECONDS)
+                if deltas is None:
+                    # Behind the ring buffer: replay from the log, one batch per turn
+                    try:
+                        deltas = feed_deltas(order_events_since(cursor, FEED_BATCH))
+                    finally:
+                        db.session.remove()
+                if not deltas:
+                    yield ': keepalive\n\n'
+                    continue
+                cursor = deltas[-1]['seq']
+                if view is not None:
+                    deltas = [sent for sent in map(view, deltas) if sent is not None]
+                messages = [sse_message(delta) for delta in deltas]
+                if messages:
+                    yield ''.join(messages)
+        finally:
+            order_event_hub.unsubscribe()
+
+    response = Response(stream_with_context(stream(cursor)), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+@app.route('/admin/feed')
+@admin_required
+def admin_order_feed():
+    return order_feed_response()
+
+@app.route('/admin/order_events')
+@admin_required
+def get_order_events():
+    try:
+        since = request.args.get('since', 0, type=int)
+        limit = max(1, min(request.args.get('limit', 200, type=int), 1000))
+        newest = db.session.execute(LATEST_EVENT_STMT).scalar() or 0
+        events = order_events_since(since, limit)
+        return jsonify({
+            'success': True,
+            'events': [event.to_dict() for event in events],
+            'cursor': next_event_cursor(len(events), limit, events[-1].id if events else since, newest)
+        })
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)})
+
 # Delivery Panel
 @app.route('/delivery')
 @delivery_required
 def delivery_panel():
+    # Read the feed cursor first so nothing committed during rendering is missed
+    feed_cursor = db.session.query(db.func.max(OrderEvent.id)).scalar() or 0
     delivery_person = User.query.get(session['user_id'])
-    assigned_orders = Order.query.filter_by(delivery_person_id=delivery_person.id, status='ready').all()
+    assigned_orders = (Order.query.filter_by(delivery_person_id=delivery_person.id, status='ready')
+                       .order_by(Order.created_at).all())
     available_orders = Order.query.filter_by(status='ready', delivery_person_id=None).all()
 
+    # Suggested drop sequence from the store with cumulative ETAs; orders
+    # without coordinates follow in the order they were placed
+    located = []
+    if STORE_LOCATION:
+        located = [order for order in assigned_orders if parse_coordinates(order.delivery_lat, order.delivery_lng)]
+    route_stops = []
+    if located:
+        stops = [(order.delivery_lat, order.delivery_lng) for order in located]
+        for position, (index, km, minutes) in enumerate(route_with_etas(STORE_LOCATION, stops), 1):
+            label = f'<span class="badge bg-primary me-2">Stop {position} &middot; ~{int(round(minutes))} min &middot; {km:.1f} km</span>'
+            route_stops.append((located[index], label))
+    route_stops += [(order, '') for order in assigned_orders if order not in located]
+
     content = f"""
 <div class="container py-5">
     <div class="text-center mb-5">
@@ -2547,7 +5094,7 @@ def delivery_panel():
                 <div class="dashboard-icon mx-auto" style="background: var(--gradient-1);">
                     <i class="fas fa-truck"></i>
                 </div>
-                <h3 class="fw-bold">{len(assigned_orders)}</h3>
+                <h3 class="fw-bold" id="my-deliveries-count">{len(assigned_orders)}</h3>
                 <p class="text-muted">My Deliveries</p>
             </div>
         </div>
@@ -2556,7 +5103,7 @@ def delivery_panel():
                 <div class="dashboard-icon mx-auto" style="background: var(--gradient-2);">
                     <i class="fas fa-clock"></i>
                 </div>
-                <h3 class="fw-bold">{len(available_orders)}</h3>
+                <h3 class="fw-bold" id="available-orders-count">{len(available_orders)}</h3>
                 <p class="text-muted">Available Orders</p>
             </div>
         </div>
@@ -2567,15 +5114,15 @@ def delivery_panel():
         <div class="card-header" style="background: var(--gradient-1); color: white;">
             <h5 class="mb-0"><i class="fas fa-truck me-2"></i>My Deliveries</h5>
         </div>
-        <div class="card-body">
+        <div class="card-body" id="my-deliveries" data-rider-id="{delivery_person.id}" data-feed-cursor="{feed_cursor}">
     """
 
     if assigned_orders:
-        for order in assigned_orders:
+        for order, stop in route_stops:
             content += f"""
-            <div class="d-flex justify-content-between align-items-center p-3 mb-3 rounded glass-effect">
+            <div class="d-flex justify-content-between align-items-center p-3 mb-3 rounded glass-effect" id="delivery-order-{order.order_id}">
                 <div>
-                    <h6 class="mb-1">Order #{order.order_id}</h6>
+                    <h6 class="mb-1">{stop}Order #{order.order_id}</h6>
                     <p class="mb-1"><i class="fas fa-user me-1"></i>{order.customer_name} - {order.customer_phone}</p>
                     <p class="mb-0"><i class="fas fa-map-marker-alt me-1"></i>{order.customer_address}</p>
                 </div>
@@ -2589,12 +5136,8 @@ def delivery_panel():
                 </div>
             </div>
             """
-    else:
-        content += """
-            <p class="text-muted text-center">No current deliveries assigned.</p>
-        """
-
-    content += """
+    content += f"""
+            <p class="text-muted text-center empty-note" {'style="display: none;"' if assigned_orders else ''}>No current deliveries assigned.</p>
         </div>
     </div>
 
@@ -2603,13 +5146,13 @@ def delivery_panel():
         <div class="card-header" style="background: var(--gradient-2); color: white;">
             <h5 class="mb-0"><i class="fas fa-list me-2"></i>Available Orders</h5>
         </div>
-        <div class="card-body">
+        <div class="card-body" id="available-orders">
     """
 
     if available_orders:
         for order in available_orders:
             content += f"""
-            <div class="d-flex justify-content-between align-items-center p-3 mb-3 rounded glass-effect">
+            <div class="d-flex justify-content-between align-items-center p-3 mb-3 rounded glass-effect" id="available-order-{order.order_id}">
                 <div>
                     <h6 class="mb-1">Order #{order.order_id}</h6>
                     <p class="mb-1"><i class="fas fa-user me-1"></i>{order.customer_name} - {order.customer_phone}</p>
@@ -2625,17 +5168,132 @@ def delivery_panel():
                 </div>
             </div>
             """
-    else:
-        content += """
-            <p class="text-muted text-center">No orders available for delivery.</p>
-        """
-
-    content += """
+    content += f"""
+            <p class="text-muted text-center empty-note" {'style="display: none;"' if available_orders else ''}>No orders available for delivery.</p>
         </div>
     </div>
 </div>
+"""
+
+    content += """
 
 <script>
+// Share the rider's position so dispatch can pick the nearest free rider
+if (navigator.geolocation) {
+    let lastPing = 0;
+    navigator.geolocation.watchPosition(function(position) {
+        const now = Date.now();
+        if (now - lastPing < 30000) return;
+        lastPing = now;
+        fetch('/delivery/location', {
+            method: 'POST',
+            headers: {
+                'Content-Type': 'application/json'
+            },
+            body: JSON.stringify({
+                lat: position.coords.latitude,
+                lng: position.coords.longitude
+            })
+        });
+    }, function() {}, {enableHighAccuracy: true, maximumAge: 30000});
+}
+
+// Live updates: orders becoming ready, claimed by a rider, or delivered
+let deliveryFeed = null;
+
+function deliveryCard(prefix, orderId, order, button) {
+    const card = document.createElement('div');
+    card.className = 'd-flex justify-content-between align-items-center p-3 mb-3 rounded glass-effect';
+    card.id = prefix + orderId;
+    card.innerHTML = `
+        <div>
+            <h6 class="mb-1">Order #${orderId}</h6>
+            <p class="mb-1"><i class="fas fa-user me-1"></i><span></span></p>
+            <p class="mb-0"><i class="fas fa-map-marker-alt me-1"></i><span></span></p>
+        </div>
+        <div class="text-end">
+            <div class="mb-2">
+                <strong>₹${order.total}</strong>
+            </div>
+            ${button}
+        </div>`;
+    const fields = card.querySelectorAll('p span');
+    fields[0].textContent = order.customer + ' - ' + order.phone;
+    fields[1].textContent = order.address;
+    return card;
+}
+
+function placeCard(listId, card) {
+    const list = document.getElementById(listId);
+    list.insertBefore(card, list.querySelector('.empty-note'));
+}
+
+function removeCard(id) {
+    const card = document.getElementById(id);
+    if (card) card.remove();
+}
+
+function refreshDeliveryCounts() {
+    [['my-deliveries', 'my-deliveries-count'], ['available-orders', 'available-orders-count']].forEach(([listId, countId]) => {
+        const list = document.getElementById(listId);
+        const count = list.querySelectorAll('.glass-effect').length;
+        document.getElementById(countId).textContent = count;
+        list.querySelector('.empty-note').style.display = count ? 'none' : '';
+    });
+}
+
+function applyDeliveryDelta(delta) {
+    const me = parseInt(document.getElementById('my-deliveries').dataset.riderId);
+    const availableId = 'available-order-' + delta.order_id;
+    const mineId = 'delivery-order-' + delta.order_id;
+    if (delta.to === 'ready' && !delta.rider) {
+        if (!document.getElementById(availableId) && delta.order) {
+            placeCard('available-orders', deliveryCard('available-order-', delta.order_id, delta.order, `
+                <button class="btn btn-primary btn-sm" onclick="acceptDelivery('${delta.order_id}')">
+                    <i class="fas fa-truck me-1"></i>Accept
+                </button>`));
+            showNotification('New order ready for pickup: #' + delta.order_id, 'info');
+        }
+    } else if (delta.to === 'ready') {
+        removeCard(availableId);
+        if (delta.rider !== me) {
+            removeCard(mineId);
+        } else if (!document.getElementById(mineId) && delta.order) {
+            placeCard('my-deliveries', deliveryCard('delivery-order-', delta.order_id, delta.order, `
+                <button class="btn btn-success btn-sm" onclick="completeDelivery('${delta.order_id}')">
+                    <i class="fas fa-check me-1"></i>Delivered
+                </button>`));
+        }
+    } else {
+        removeCard(availableId);
+        removeCard(mineId);
+    }
+    refreshDeliveryCounts();
+}
+
+// Without a live feed (no EventSource, or the server is at its cap) the
+// panel reloads itself instead
+document.addEventListener('DOMContentLoaded', function() {
+    if (!window.EventSource) {
+        setTimeout(() => location.reload(), 30000);
+        return;
+    }
+    const cursor = document.getElementById('my-deliveries').dataset.feedCursor;
+    deliveryFeed = new EventSource('/delivery/feed?since=' + cursor);
+    deliveryFeed.addEventListener('order', function(e) {
+        applyDeliveryDelta(JSON.parse(e.data));
+    });
+    deliveryFeed.addEventListener('error', function() {
+        if (deliveryFeed.readyState === EventSource.CLOSED) setTimeout(() => location.reload(), 30000);
+    });
+});
+
+function reloadUnlessLive(delay) {
+    if (!deliveryFeed || deliveryFeed.readyState === EventSource.CLOSED) {
+        setTimeout(() => location.reload(), delay);
+    }
+}
+
 function acceptDelivery(orderId) {
     fetch('/delivery/accept', {
         method: 'POST',
@@ -2650,9 +5308,10 @@ function acceptDelivery(orderId) {
     .then(data => {
         if (data.success) {
             showNotification('Delivery accepted!', 'success');
-            setTimeout(() => location.reload(), 1000);
+            reloadUnlessLive(1000);
         } else {
-            showNotification('Error accepting delivery', 'danger');
+            showNotification(data.error || 'Error accepting delivery', 'danger');
+            reloadUnlessLive(1500);
         }
     });
 }
@@ -2671,9 +5330,9 @@ function completeDelivery(orderId) {
     .then(data => {
         if (data.success) {
             showNotification('Delivery completed!', 'success');
-            setTimeout(() => location.reload(), 1000);
+            reloadUnlessLive(1000);
         } else {
-            showNotification('Error completing delivery', 'danger');
+            showNotification(data.error || 'Error completing delivery', 'danger');
         }
     });
 }
@@ -2694,13 +5353,27 @@ def accept_delivery():
         data = request.json
         order_id = data.get('order_id')
 
-        order = Order.query.filter_by(order_id=order_id).first()
-        if order:
-            order.delivery_person_id = session['user_id']
-            db.session.commit()
+        # Claim with a single conditional UPDATE; the row count decides which
+        # rider wins when several tap "Accept" on the same order
+        result = db.session.execute(
+            db.update(Order)
+            .where(Order.order_id == order_id,
+                   Order.delivery_person_id.is_(None),
+                   Order.status == 'ready')
+            .values(delivery_person_id=session['user_id'], version=Order.version + 1)
+            .execution_options(synchronize_session=False)
+        )
+        if result.rowcount == 1:
+            log_order_event(order_id, 'ready', 'ready', actor_id=session['user_id'],
+                            delivery_person_id=session['user_id'])
+        db.session.commit()
+        if result.rowcount == 1:
+            delivery_dispatcher.discard(order_id)
+            delivery_dispatcher.assigned(session['user_id'])
             return jsonify({'success': True})
-        else:
-            return jsonify({'success': False, 'error': 'Order not found'})
+        if Order.query.filter_by(order_id=order_id).first():
+            return jsonify({'success': False, 'error': 'Order already claimed by another rider'})
+        return jsonify({'success': False, 'error': 'Order not found'})
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)})
 
@@ -2711,16 +5384,338 @@ def complete_delivery():
         data = request.json
         order_id = data.get('order_id')
 
-        order = Order.query.filter_by(order_id=order_id).first()
-        if order:
-            order.status = 'delivered'
-            db.session.commit()
+        # Only the rider holding the order can complete it, and only once
+        now = datetime.utcnow()
+        result = db.session.execute(
+            db.update(Order)
+            .where(Order.order_id == order_id,
+                   Order.delivery_person_id == session['user_id'],
+                   Order.status == 'ready')
+            .values(status='delivered', delivered_at=now, version=Order.version + 1)
+            .execution_options(synchronize_session=False)
+        )
+        if result.rowcount == 1:
+            log_order_event(order_id, 'ready', 'delivered', actor_id=session['user_id'],
+                            delivery_person_id=session['user_id'], at=now)
+        db.session.commit()
+        if result.rowcount == 1:
+            created_at, ready_at = (db.session.query(Order.created_at, Order.ready_at)
+                                    .filter_by(order_id=order_id).one())
+            record_status_change(created_at, ready_at, 'ready', 'delivered', now)
+            # The rider has capacity again; hand them the next waiting order
+            delivery_dispatcher.released(session['user_id'])
+            auto_assign_deliveries()
             return jsonify({'success': True})
-        else:
-            return jsonify({'success': False, 'error': 'Order not found'})
+        if Order.query.filter_by(order_id=order_id).first():
+            return jsonify({'success': False, 'error': 'Order is not an active delivery of yours'})
+        return jsonify({'success': False, 'error': 'Order not found'})
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)})
+
+@app.route('/delivery/location', methods=['POST'])
+@delivery_required
+def update_rider_location():
+    try:
+        data = request.json
+        location = parse_coordinates(data.get('lat'), data.get('lng'))
+        if not location:
+            return jsonify({'success': False, 'error': 'Invalid coordinates'})
+
+        rider_locations.update(session['user_id'], location[0], location[1])
+        db.session.execute(
+            db.update(User)
+            .where(User.id == session['user_id'])
+            .values(last_lat=location[0], last_lng=location[1], last_location_at=datetime.utcnow())
+            .execution_options(synchronize_session=False)
+        )
+        db.session.commit()
+        # A rider coming on shift can take the orders that queued without one
+        sync_dispatcher()
+        if delivery_dispatcher.start_shift(session['user_id']):
+            auto_assign_deliveries()
+        return jsonify({'success': True})
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)})
 
+@app.route('/delivery/feed')
+@delivery_required
+def delivery_order_feed():
+    return order_feed_response(view=rider_feed_view(session['user_id']))
+
+def rider_feed_view(rider_id):
+    # Riders only care about orders entering, claimed at, or leaving 'ready'.
+    # The customer's phone and address go to every rider while an order is
+    # unclaimed, and once it is claimed only to the rider who claimed it
+    def view(delta):
+        if delta['to'] != 'ready' and delta['from'] != 'ready':
+            return None
+        if 'order' in delta and delta.get('rider') not in (None, rider_id):
+            return {key: value for key, value in delta.items() if key != 'order'}
+        return delta
+    return view
+
+# Shared cache: a bounded in-process LRU (L1) in front of a SQLite file (L2)
+# that every worker on the host reads and writes. Keys carry their
+# namespace's version, so invalidating a namespace is a single counter bump
+# in L2; entries under older versions are never read again and age out by
+# TTL. Values must be JSON-serializable plain data, never ORM instances.
+# Statistics are kept by each worker for its own lookups and writes.
+CACHE_TTLS = {'menu': 60, 'home': 60, 'admin': 10}  # seconds, per namespace
+DEFAULT_CACHE_TTL = 60
+CACHE_L1_MAX_ENTRIES = 512
+CACHE_VERSION_CHECK_SECONDS = 1.0  # how long a worker trusts its copy of a namespace version
+CACHE_PURGE_EVERY = 200  # L2 writes between sweeps of expired rows
+L2_CACHE_ERRORS = (sqlite3.Error, OSError, TypeError, ValueError)  # L2 trouble degrades to L1 only
+app.config.setdefault('CACHE_DB_PATH', os.environ.get('CACHE_DB_PATH', os.path.join(app.instance_path, 'cache.db')))
+
+class LRUCache:
+    def __init__(self, max_entries=CACHE_L1_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self.evictions = 0
+        self.expirations = 0
+        self._entries = OrderedDict()  # key -> (expires_at, value), least recently used first
+        self._mutex = threading.Lock()
+
+    def get(self, key, now):
+        with self._mutex:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[0] <= now:
+                del self._entries[key]
+                self.expirations += 1
+                return None
+            self._entries.move_to_end(key)
+            return entry
+
+    def set(self, key, value, expires_at):
+        with self._mutex:
+            self._entries[key] = (expires_at, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def __len__(self):
+        return len(self._entries)
+
+class SQLiteCache:
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()  # sqlite3 connections stay on their thread
+        self._writes = 0
+        self.purged = 0  # expired rows deleted by this worker's sweeps
+
+    def _conn(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=1, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('CREATE TABLE IF NOT EXISTS cache_entry '
+                         '(key TEXT PRIMARY KEY, expires_at REAL NOT NULL, value TEXT NOT NULL)')
+            conn.execute('CREATE TABLE IF NOT EXISTS cache_version '
+                         '(namespace TEXT PRIMARY KEY, version INTEGER NOT NULL)')
+            self._local.conn = conn
+        return conn
+
+    def get(self, key, now):
+        row = self._conn().execute('SELECT expires_at, value FROM cache_entry WHERE key = ? AND expires_at > ?',
+                                   (key, now)).fetchone()
+        return (row[0], json.loads(row[1])) if row else None
+
+    def set(self, key, value, expires_at):
+        conn = self._conn()
+        conn.execute('INSERT OR REPLACE INTO cache_entry (key, expires_at, value) VALUES (?, ?, ?)',
+                     (key, expires_at, json.dumps(value, separators=(',', ':'))))
+        self._writes += 1
+        if self._writes % CACHE_PURGE_EVERY == 0:
+            self.purged += conn.execute('DELETE FROM cache_entry WHERE expires_at <= ?', (time.time(),)).rowcount
+
+    def version(self, namespace):
+        row = self._conn().execute('SELECT version FROM cache_version WHERE namespace = ?', (namespace,)).fetchone()
+        return row[0] if row else 0
+
+    def bump(self, namespace):
+        conn = self._conn()
+        conn.execute('INSERT INTO cache_version (namespace, version) VALUES (?, 1) '
+                     'ON CONFLICT(namespace) DO UPDATE SET version = version + 1', (namespace,))
+        return self.version(namespace)
+
+class TwoLevelCache:
+    def __init__(self, l2=None, max_entries=CACHE_L1_MAX_ENTRIES, ttls=CACHE_TTLS):
+        self.l1 = LRUCache(max_entries)
+        self.l2 = l2
+        self.ttls = ttls
+        self.l2_errors = 0
+        self._versions = {}  # namespace -> (checked_at, version)
+        self._stats = {}  # namespace -> counters
+        self._mutex = threading.Lock()
+
+    def ttl(self, namespace):
+        return self.ttls.get(namespace, DEFAULT_CACHE_TTL)
+
+    def count(self, namespace, counter):
+        with self._mutex:
+            stats = self._stats.setdefault(namespace, {'l1_hits': 0, 'l2_hits': 0, 'misses': 0,
+                                                       'sets': 0, 'invalidations': 0, 'stale_served': 0})
+            stats[counter] += 1
+
+    def version(self, namespace):
+        now = time.monotonic()
+        with self._mutex:
+            checked = self._versions.get(namespace)
+        if checked and (self.l2 is None or now - checked[0] < CACHE_VERSION_CHECK_SECONDS):
+            return checked[1]
+        version = checked[1] if checked else 0
+        if self.l2 is not None:
+            try:
+                version = self.l2.version(namespace)
+            except L2_CACHE_ERRORS:
+                self.l2_errors += 1
+        with self._mutex:
+            self._versions[namespace] = (now, version)
+        return version
+
+    def get(self, namespace, key, version, record=True):
+        # Returns (expires_at, value) or None
+        full_key = f"{namespace}:{version}:{key}"
+        now = time.time()
+        entry = self.l1.get(full_key, now)
+        if entry is not None:
+            if record:
+                self.count(namespace, 'l1_hits')
+            return entry
+        if self.l2 is not None:
+            try:
+                entry = self.l2.get(full_key, now)
+            except L2_CACHE_ERRORS:
+                self.l2_errors += 1
+            if entry is not None:
+                self.l1.set(full_key, entry[1], entry[0])
+                if record:
+                    self.count(namespace, 'l2_hits')
+                return entry
+        if record:
+            self.count(namespace, 'misses')
+        return None
+
+    def set(self, namespace, key, version, value, ttl=None):
+        full_key = f"{namespace}:{version}:{key}"
+        expires_at = time.time() + (self.ttl(namespace) if ttl is None else ttl)
+        self.l1.set(full_key, value, expires_at)
+        if self.l2 is not None:
+            try:
+                self.l2.set(full_key, value, expires_at)
+            except L2_CACHE_ERRORS:
+                self.l2_errors += 1
+        self.count(namespace, 'sets')
+
+    def invalidate(self, namespace):
+        with self._mutex:
+            checked = self._versions.get(namespace)
+        version = (checked[1] if checked else 0) + 1
+        if self.l2 is not None:
+            try:
+                version = self.l2.bump(namespace)
+            except L2_CACHE_ERRORS:
+                self.l2_errors += 1
+        with self._mutex:
+            self._versions[namespace] = (time.monotonic(), version)
+        self.count(namespace, 'invalidations')
+
+    def stats(self):
+        with self._mutex:
+            namespaces = {namespace: dict(counters) for namespace, counters in self._stats.items()}
+        for counters in namespaces.values():
+            lookups = counters['l1_hits'] + counters['l2_hits'] + counters['misses']
+            counters['hit_rate'] = round((counters['l1_hits'] + counters['l2_hits']) / lookups, 3) if lookups else None
+        return {'scope': 'worker', 'pid': os.getpid(), 'namespaces': namespaces,
+                'l1_entries': len(self.l1), 'l1_evictions': self.l1.evictions, 'l1_expirations': self.l1.expirations,
+                'l2': self.l2.path if self.l2 is not None else None, 'l2_errors': self.l2_errors,
+                'l2_purged': self.l2.purged if self.l2 is not None else 0}
+
+shared_cache = TwoLevelCache(SQLiteCache(app.config['CACHE_DB_PATH']) if app.config['CACHE_DB_PATH'] else None)
+
+# Page data on top of the shared cache. Concurrent misses for a key share one
+# computation (single-flight), and an expired value keeps being served for a
+# grace period while a single request refreshes it (stale-while-revalidate).
+STALE_GRACE_SECONDS = 300
+
+class SingleFlight:
+    def __init__(self):
+        self._calls = {}  # key -> [done event, result, error]
+        self._mutex = threading.Lock()
+
+    def do(self, key, compute, busy=None):
+        # Runs compute() once for every concurrent caller of key. Callers that
+        # find it already running wait for its result, or get busy() if given
+        with self._mutex:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = [threading.Event(), None, None]
+        if not leader:
+            if busy is not None:
+                return busy()
+            call[0].wait()
+            if call[2] is not None:
+                raise call[2]
+            return call[1]
+        try:
+            call[1] = compute()
+        except Exception as e:
+            call[2] = e
+            raise
+        finally:
+            with self._mutex:
+                del self._calls[key]
+            call[0].set()
+        return call[1]
+
+class PageCache:
+    def __init__(self, cache, grace=STALE_GRACE_SECONDS):
+        self.cache = cache
+        self.grace = grace
+        self._flight = SingleFlight()
+
+    def get(self, namespace, key, compute):
+        version = self.cache.version(namespace)
+        entry = self.cache.get(namespace, key, version)
+        if entry and time.time() < entry[1][0]:
+            return entry[1][1]
+
+        def refresh():
+            # Another request or worker may have refreshed it meanwhile
+            current = self.cache.get(namespace, key, version, record=False)
+            if current and time.time() < current[1][0]:
+                return current[1][1]
+            value = compute()
+            ttl = self.cache.ttl(namespace)
+            # Kept for ttl + grace; only the first ttl seconds count as fresh.
+            # An invalidate() during compute() moves readers to a new version,
+            # so this write can never shadow newer data
+            self.cache.set(namespace, key, version, [time.time() + ttl, value], ttl + self.grace)
+            return value
+
+        flight_key = (namespace, key, version)
+        if entry:
+            def stale():
+                self.cache.count(namespace, 'stale_served')
+                return entry[1][1]
+            try:
+                return self._flight.do(flight_key, refresh, busy=stale)
+            except Exception:
+                return stale()
+        return self._flight.do(flight_key, refresh)
+
+    def invalidate(self, *namespaces):
+        # No stale grace after an explicit change: the next read recomputes
+        for namespace in namespaces:
+            self.cache.invalidate(namespace)
+
+page_cache = PageCache(shared_cache)
+
 # Main Routes
 @app.route('/')
 def home():
@@ -2745,11 +5740,11 @@ def home():
         """
 
     # Get popular items
-    popular_items = MenuItem.query.order_by(MenuItem.popularity.desc()).limit(3).all()
-
-    popular_section = ""
-    if popular_items:
-        popular_section = """
+    def popular_section_html():
+        popular_items = MenuItem.query.order_by(MenuItem.popularity.desc()).limit(3).all()
+        if not popular_items:
+            return ""
+        return """
         <section class="py-5">
             <div class="container">
                 <div class="text-center mb-5">
@@ -2781,6 +5776,8 @@ def home():
         </section>
         """
 
+    popular_section = page_cache.get('home', 'popular', popular_section_html)
+
     content = f"""
 <!-- Store Status Banner -->
 {store_status_banner}
@@ -2889,27 +5886,12 @@ def home():
                                 current_user=user,
                                 extra_scripts="")
 
-@app.route('/menu')
-def menu():
-    user = User.query.get(session.get('user_id')) if 'user_id' in session else None
-
-    if not store_status['open']:
-        return render_template_string(BASE_TEMPLATE,
-                                    title="Store Closed",
-                                    content="""
-                                    <div class="container text-center py-5">
-                                        <h1 class="display-1 text-danger"><i class="fas fa-times-circle"></i></h1>
-                                        <h2 class="fw-bold text-gradient mb-3">Store is Closed</h2>
-                                        <p class="lead text-muted">We are sorry, but the store is currently closed. Please check back later or contact us for updates.</p>
-                                        <a href="/" class="btn btn-primary mt-4"><i class="fas fa-home me-2"></i>Go to Home</a>
-                                    </div>
-                                    """,
-                                    current_user=user)
-
-    # Get menu items from database, fallback to static menu
+# Menu page body, cached by /menu: database items, falling back to the
+# static menu
+def menu_content_html():
     db_items = MenuItem.query.all()
     menu_dict = {}
-    
+
     if db_items:
         for item in db_items:
             if item.category not in menu_dict:
@@ -2991,16 +5973,35 @@ def menu():
     content += """
 </div>
 """
+    return content
 
-    return render_template_string(BASE_TEMPLATE, 
-                                title="Menu - Biryani Club", 
-                                content=content, 
-                                current_user=user,
-                                extra_scripts="")
+@app.route('/menu')
+def menu():
+    user = User.query.get(session.get('user_id')) if 'user_id' in session else None
+
+    if not store_status['open']:
+        return render_template_string(BASE_TEMPLATE,
+                                    title="Store Closed",
+                                    content="""
+                                    <div class="container text-center py-5">
+                                        <h1 class="display-1 text-danger"><i class="fas fa-times-circle"></i></h1>
+                                        <h2 class="fw-bold text-gradient mb-3">Store is Closed</h2>
+                                        <p class="lead text-muted">We are sorry, but the store is currently closed. Please check back later or contact us for updates.</p>
+                                        <a href="/" class="btn btn-primary mt-4"><i class="fas fa-home me-2"></i>Go to Home</a>
+                                    </div>
+                                    """,
+                                    current_user=user)
+
+    def sections():
+        # The layout goes out before a cold menu is rebuilt
+        yield page_cache.get('menu', 'html', menu_content_html)
+
+    return render_page("Menu - Biryani Club", sections(), user)
 
 @app.route('/checkout')
 def checkout():
     user = User.query.get(session.get('user_id')) if 'user_id' in session else None
+    idempotency_scope()  # a guest's first /place_order already carries their id
 
     if not store_status['open']:
         return render_template_string(BASE_TEMPLATE,
@@ -3015,9 +6016,6 @@ def checkout():
                                     """,
                                     current_user=user)
 
-    # Get active promotions
-    promotions = Promotion.query.filter_by(active=True).all()
-
     content = """
 <div class="container py-5">
     <div class="row justify-content-center">
@@ -3045,6 +6043,10 @@ def checkout():
                             <div class="col-12 mb-3">
                                 <label for="customer_address" class="form-label">Delivery Address *</label>
                                 <textarea class="form-control form-control-lg" id="customer_address" rows="3" required style="background: rgba(255,255,255,0.9); color: var(--dark);"></textarea>
+                                <button type="button" class="btn btn-outline-light btn-sm mt-2" onclick="shareLocation()">
+                                    <i class="fas fa-location-arrow me-1"></i>Share my location for faster delivery
+                                </button>
+                                <small id="location-status" class="ms-2 text-light"></small>
                             </div>
                         </div>
                     </div>
@@ -3162,6 +6164,11 @@ def checkout():
 
     scripts = """
 <script>
+// One key per checkout page, so retries and double taps can't place a second order
+const checkoutIdempotencyKey = (window.crypto && crypto.randomUUID)
+    ? crypto.randomUUID()
+    : Date.now().toString(36) + '-' + Math.random().toString(36).slice(2);
+
 document.addEventListener('DOMContentLoaded', function() {
     updateOrderSummary();
 
@@ -3298,6 +6305,23 @@ function useMaxPoints() {
     }
 }
 
+// Optional drop coordinates, used to dispatch the nearest rider
+let deliveryLocation = null;
+
+function shareLocation() {
+    const status = document.getElementById('location-status');
+    if (!navigator.geolocation) {
+        status.textContent = 'Location is not available on this device';
+        return;
+    }
+    navigator.geolocation.getCurrentPosition(function(position) {
+        deliveryLocation = {lat: position.coords.latitude, lng: position.coords.longitude};
+        status.textContent = 'Location added';
+    }, function() {
+        status.textContent = 'Could not get your location';
+    });
+}
+
 function placeOrder() {
     const cart = JSON.parse(localStorage.getItem('cart') || '[]');
 
@@ -3317,13 +6341,16 @@ function placeOrder() {
         payment_method: document.querySelector('input[name="payment_method"]:checked').value,
         items: cart,
         loyalty_points_used: loyaltyPointsUsed,
-        promo_code: promoCode
+        promo_code: promoCode,
+        delivery_lat: deliveryLocation ? deliveryLocation.lat : null,
+        delivery_lng: deliveryLocation ? deliveryLocation.lng : null
     };
 
     fetch('/place_order', {
         method: 'POST',
         headers: {
-            'Content-Type': 'application/json'
+            'Content-Type': 'application/json',
+            'Idempotency-Key': checkoutIdempotencyKey
         },
         body: JSON.stringify(formData)
     })
@@ -3377,8 +6404,200 @@ def apply_promo():
     except:
         return jsonify({'success': False, 'error': 'Error applying promo'})
 
+# Idempotency keys for order placement: a retried or double-tapped checkout
+# replays the first successful response instead of creating a second order.
+# A retry can reach any worker, so keys live in a table of the shared cache
+# database (CACHE_DB_PATH), with a per-worker copy of the results in front.
+# The first request for a key inserts a claim row. A duplicate that arrives
+# while the claim is held gets 409 at once rather than tying up a worker
+# waiting; the claim is dropped when the attempt fails and expires when its
+# worker died mid-request. Without CACHE_DB_PATH, or if the database fails,
+# keys only hold within one worker.
+IDEMPOTENCY_TTL = 24 * 60 * 60  # seconds
+IDEMPOTENCY_MAX_KEYS = 10000  # results kept per worker
+IDEMPOTENCY_CLAIM_SECONDS = 30  # a claim left by a worker that died mid-request lapses after this
+
+class IdempotencyStore:
+    def __init__(self, path=None, max_keys=IDEMPOTENCY_MAX_KEYS, ttl=IDEMPOTENCY_TTL):
+        self.path = path
+        self.max_keys = max_keys
+        self.ttl = ttl
+        self.shared_errors = 0
+        self._results = OrderedDict()  # key -> (expires_at, payload), oldest first
+        self._running = set()  # keys claimed by requests in this worker
+        self._mutex = threading.Lock()
+        self._local = threading.local()  # sqlite3 connections stay on their thread
+        self._writes = 0
+
+    def _conn(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=1, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            # payload is NULL while the claiming request is still running
+            conn.execute('CREATE TABLE IF NOT EXISTS idempotency_key '
+                         '(key TEXT PRIMARY KEY, expires_at REAL NOT NULL, payload TEXT)')
+            self._local.conn = conn
+        return conn
+
+    def get(self, key):
+        with self._mutex:
+            entry = self._results.get(key)
+            if entry is not None and entry[0] < time.monotonic():
+                del self._results[key]
+                entry = None
+        if entry is not None:
+            return entry[1]
+        if not self.path:
+            return None
+        try:
+            row = self._conn().execute('SELECT payload FROM idempotency_key WHERE key = ? AND expires_at > ? '
+                                       'AND payload IS NOT NULL', (key, time.time())).fetchone()
+        except L2_CACHE_ERRORS:
+            self.shared_errors += 1
+            return None
+        if row is None:
+            return None
+        payload = json.loads(row[0])
+        self._remember(key, payload)
+        return payload
+
+    def set(self, key, payload):
+        self._remember(key, payload)
+        if not self.path:
+            return
+        try:
+            conn = self._conn()
+            conn.execute('INSERT OR REPLACE INTO idempotency_key (key, expires_at, payload) VALUES (?, ?, ?)',
+                         (key, time.time() + self.ttl, json.dumps(payload, separators=(',', ':'))))
+            self._writes += 1
+            if self._writes % CACHE_PURGE_EVERY == 0:
+                conn.execute('DELETE FROM idempotency_key WHERE expires_at <= ?', (time.time(),))
+        except L2_CACHE_ERRORS:
+            self.shared_errors += 1
+
+    def _remember(self, key, payload):
+        with self._mutex:
+            self._results[key] = (time.monotonic() + self.ttl, payload)
+            self._results.move_to_end(key)
+            self._evict()
+
+    def _evict(self):
+        # Every entry shares one TTL, so insertion order is expiry order
+        now = time.monotonic()
+        while self._results:
+            expires_at = next(iter(self._results.values()))[0]
+            if expires_at >= now and len(self._results) <= self.max_keys:
+                break
+            self._results.popitem(last=False)
+
+    def _claim(self, key):
+        # True if this request now owns the key; False if a request in another
+        # worker holds it or has already stored its result
+        now = time.time()
+        conn = self._conn()
+        conn.execute('DELETE FROM idempotency_key WHERE key = ? AND expires_at <= ?', (key, now))
+        return bool(conn.execute('INSERT OR IGNORE INTO idempotency_key (key, expires_at, payload) '
+                                 'VALUES (?, ?, NULL)', (key, now + IDEMPOTENCY_CLAIM_SECONDS)).rowcount)
+
+    @contextmanager
+    def claim(self, key):
+        # Yields True when this request owns the key and should do the work,
+        # False when another request, in this worker or another, is running it
+        # or already finished it. Never waits. The claim is dropped on exit
+        # unless set() stored a result, so a failed attempt can be retried
+        with self._mutex:
+            local = key not in self._running
+            self._running.add(key)
+        owner = local
+        shared = False
+        try:
+            if local and self.path:
+                try:
+                    shared = owner = self._claim(key)
+                except L2_CACHE_ERRORS:
+                    self.shared_errors += 1
+            yield owner
+        finally:
+            if shared:
+                try:
+                    self._conn().execute('DELETE FROM idempotency_key WHERE key = ? AND payload IS NULL', (key,))
+                except L2_CACHE_ERRORS:
+                    self.shared_errors += 1
+            if local:
+                with self._mutex:
+                    self._running.discard(key)
+
+idempotency_store = IdempotencyStore(app.config['CACHE_DB_PATH'])
+
+# Order pricing, shared by /place_order and bench/microbench.py
+def order_totals(cart, promo, loyalty_points_used, loyalty_balance):
+    # (subtotal, promo discount, loyalty discount, total); loyalty_balance is
+    # the customer's points, or None for guests
+    subtotal = sum(item['price'] * item['quantity'] for item in cart)
+
+    # Apply promo discount
+    promo_discount = 0
+    if promo:
+        if promo.discount_type == 'percent':
+            promo_discount = subtotal * (promo.discount_value / 100)
+        else:
+            promo_discount = promo.discount_value
+        promo_discount = min(promo_discount, subtotal)
+
+    loyalty_discount = 0
+    if loyalty_points_used > 0 and loyalty_balance is not None and loyalty_balance >= loyalty_points_used:
+        loyalty_discount = loyalty_points_used // 2  # 2 points = ₹1
+        # Ensure discount doesn't exceed order value
+        loyalty_discount = min(loyalty_discount, subtotal - promo_discount)
+
+    return subtotal, promo_discount, loyalty_discount, subtotal - promo_discount - loyalty_discount
+
+def loyalty_tier(points):
+    if points < 100:
+        return 'bronze'
+    if points < 500:
+        return 'silver'
+    return 'gold'
+
 @app.route('/place_order', methods=['POST'])
 def place_order():
+    idempotency_key = request.headers.get('Idempotency-Key', '').strip()[:128]
+    if not idempotency_key:
+        return jsonify(_place_order())
+
+    # Scope keys per customer or guest so nobody's key can replay another's
+    # order, and remember which body a key was used with
+    key = f'{idempotency_scope()}:{idempotency_key}'
+    fingerprint = hashlib.sha256(json.dumps(request.get_json(silent=True), sort_keys=True).encode()).hexdigest()
+    stored = idempotency_store.get(key)
+    if stored is None:
+        with idempotency_store.claim(key) as owner:
+            if owner:
+                result = _place_order()
+                # Only successes are kept, so a failed attempt can be retried
+                if result['success']:
+                    idempotency_store.set(key, {'fingerprint': fingerprint, 'response': result})
+                return jsonify(result)
+        # Another request holds the key; it may have just finished
+        stored = idempotency_store.get(key)
+        if stored is None:
+            return jsonify({'success': False, 'error': 'This order is already being placed'}), 409
+    if stored['fingerprint'] != fingerprint:
+        return jsonify({'success': False, 'error': 'Idempotency-Key was already used for a different order'}), 422
+    return jsonify(stored['response'])
+
+def idempotency_scope():
+    # Customers by user id; guests by a random id kept in their session,
+    # which checkout() hands out before the first order is placed
+    if 'user_id' in session:
+        return f"user:{session['user_id']}"
+    if 'guest_id' not in session:
+        session['guest_id'] = uuid.uuid4().hex
+    return f"guest:{session['guest_id']}"
+
+def _place_order():
     try:
         data = request.json
 
@@ -3387,35 +6606,27 @@ def place_order():
 
         # Calculate totals
         cart = data['items']
-        subtotal = sum(item['price'] * item['quantity'] for item in cart)
-        
-        # Apply promo discount
-        promo_discount = 0
         promo = Promotion.query.filter_by(code=data.get('promo_code', '')).first()
         if promo:
-            if promo.discount_type == 'percent':
-                promo_discount = subtotal * (promo.discount_value / 100)
-            else:
-                promo_discount = promo.discount_value
-            promo_discount = min(promo_discount, subtotal)
-            
             # Update promo usage
             promo.usage_count += 1
             if promo.max_usage and promo.usage_count >= promo.max_usage:
                 promo.active = False
-        
+
         # Handle loyalty points redemption
         loyalty_points_used = data.get('loyalty_points_used', 0)
-        loyalty_discount = 0
-        
+        loyalty_balance = None
         if loyalty_points_used > 0 and 'user_id' in session:
             user = User.query.get(session['user_id'])
-            if user and user.loyalty_points >= loyalty_points_used:
-                loyalty_discount = loyalty_points_used // 2  # 2 points = ₹1
-                # Ensure discount doesn't exceed order value
-                loyalty_discount = min(loyalty_discount, subtotal - promo_discount)
-        
-        total = subtotal - promo_discount - loyalty_discount
+            loyalty_balance = user.loyalty_points if user else None
+
+        subtotal, promo_discount, loyalty_discount, total = order_totals(cart, promo, loyalty_points_used,
+                                                                         loyalty_balance)
+
+        location = parse_coordinates(data.get('delivery_lat'), data.get('delivery_lng'))
+
+        now = datetime.utcnow()
+        sync_eta_predictor()
 
         # Create order
         order = Order(
@@ -3423,40 +6634,47 @@ def place_order():
             customer_name=data['customer_name'],
             customer_phone=data['customer_phone'],
             customer_address=data['customer_address'],
-            items_json=json.dumps(cart),
+            items_json=encode_order_items(cart),
             subtotal=subtotal,
             discount=promo_discount + loyalty_discount,
             total=total,
             payment_method=data['payment_method'],
             coupon_code=data.get('promo_code', ''),
-            user_id=session.get('user_id')  # Associate order with logged-in user
+            user_id=session.get('user_id'),  # Associate order with logged-in user
+            delivery_lat=location[0] if location else None,
+            delivery_lng=location[1] if location else None,
+            created_at=now,
+            estimated_delivery=now + timedelta(minutes=eta_predictor.estimate(now))
         )
 
         db.session.add(order)
+        log_order_event(order_id, None, 'pending', at=now)
 
         # Update user's loyalty points
         if 'user_id' in session:
             user = User.query.get(session['user_id'])
             if user:
+                # Spend a redeemed "Priority Delivery" reward on this order
+                if user.priority_credits:
+                    user.priority_credits -= 1
+                    order.priority = True
+
                 # Deduct used points
                 user.loyalty_points -= loyalty_points_used
                 # Add new points based on final amount (1 point per ₹10)
                 user.loyalty_points += int(total / 10)
-                
-                # Update loyalty tier
-                if user.loyalty_points < 100:
-                    user.loyalty_tier = 'bronze'
-                elif user.loyalty_points < 500:
-                    user.loyalty_tier = 'silver'
-                else:
-                    user.loyalty_tier = 'gold'
+                user.loyalty_tier = loyalty_tier(user.loyalty_points)
 
         db.session.commit()
+        payment_label = order.payment_method if order.payment_method in PAYMENT_METHODS else 'other'
+        shared_counters.add_many(((('orders_placed', payment_label), 1), (('order_revenue', payment_label), total)))
+        eta_predictor.entered_kitchen(now)
 
-        return jsonify({'success': True, 'order_id': order_id})
+        return {'success': True, 'order_id': order_id}
 
     except Exception as e:
-        return jsonify({'success': False, 'error': str(e)})
+        db.session.rollback()
+        return {'success': False, 'error': str(e)}
 
 @app.route('/order_confirmation/<order_id>')
 def order_confirmation(order_id):
@@ -3466,6 +6684,11 @@ def order_confirmation(order_id):
     if not order:
         return "Order not found", 404
 
+    if order.status == 'delivered':
+        eta_text = 'Delivered'
+    else:
+        eta_text = eta_label(order) or '30-45 Minutes'
+
     content = f"""
 <div class="container py-5">
     <div class="row justify-content-center">
@@ -3532,7 +6755,7 @@ def order_confirmation(order_id):
             <div class="card mb-4">
                 <div class="card-body text-center py-4">
                     <h5 class="fw-bold text-primary mb-3"><i class="fas fa-clock me-2"></i>Estimated Delivery Time</h5>
-                    <div style="font-size: 2rem; font-weight: bold; background: var(--gradient-1); -webkit-background-clip: text; -webkit-text-fill-color: transparent; margin-bottom: 10px;">30-45 Minutes</div>
+                    <div style="font-size: 2rem; font-weight: bold; background: var(--gradient-1); -webkit-background-clip: text; -webkit-text-fill-color: transparent; margin-bottom: 10px;">{eta_text}</div>
                     <p class="text-muted mb-0">Our chef is already working on your order!</p>
                 </div>
             </div>
@@ -3621,7 +6844,9 @@ def create_admin_user():
 # Initialize database and create tables
 with app.app_context():
     db.create_all()
+    upgrade_schema()
     create_admin_user()
+    warm_eta_predictor()
 
 if __name__ == '__main__':
     print("🍛 Biryani Club Professional App is starting...")
@@ -0,0 +1,57 @@
+# Shared fixtures. main.py opens its database, shared cache, metrics file and
+# profile directory at import, so all are pointed at a scratch directory first.
+import os
+import sys
+import tempfile
+import uuid
+
+import pytest
+
+SCRATCH = tempfile.mkdtemp(prefix='biryani-club-tests-')
+os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(SCRATCH, 'test.db')
+os.environ['CACHE_DB_PATH'] = os.path.join(SCRATCH, 'cache.db')
+os.environ['METRICS_SHM_PATH'] = os.path.join(SCRATCH, 'metrics.shm')
+os.environ['PROFILE_DIR'] = os.path.join(SCRATCH, 'profiles')
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from main import app as flask_app, db, User, Order, log_order_event  # noqa: E402
+
+@pytest.fixture
+def app():
+    # No app context is held here: each test client request pushes its own,
+    # as it would in production
+    flask_app.config['TESTING'] = True
+    yield flask_app
+
+def sign_in(client, user_id):
+    with client.session_transaction() as sess:
+        sess['user_id'] = user_id
+
+@pytest.fixture
+def make_user(app):
+    def make(**fields):
+        tag = uuid.uuid4().hex[:10]
+        with app.app_context():
+            values = {'username': f'test-{tag}', 'email': f'test-{tag}@example.invalid', 'password_hash': '!',
+                      'full_name': 'Test User', 'phone': '9000000000'}
+            values.update(fields)
+            user = User(**values)
+            db.session.add(user)
+            db.session.commit()
+            return user.id
+    return make
+
+@pytest.fixture
+def make_order(app, make_user):
+    def make(status='pending', user_id=None, **fields):
+        order_id = f'T{uuid.uuid4().hex[:12].upper()}'
+        with app.app_context():
+            values = {'customer_name': 'Test User', 'customer_phone': '9000000000',
+                      'customer_address': '1 Test Street, Hyderabad', 'items_json': '[]', 'subtotal': 250,
+                      'total': 250, 'payment_method': 'cash'}
+            values.update(fields)
+            db.session.add(Order(order_id=order_id, status=status, user_id=user_id or make_user(), **values))
+            log_order_event(order_id, None, status)
+            db.session.commit()
+        return order_id
+    return make
@@ -0,0 +1,85 @@
+# TwoLevelCache: invalidating a namespace bumps its version for every worker
+# sharing the L2 file, and the per-worker stats count what L1 and L2 drop.
+# PageCache: concurrent misses share one load, and an expired value is
+# served while a single request refreshes it.
+import threading
+import time
+
+from main import TwoLevelCache, SQLiteCache, PageCache, CACHE_PURGE_EVERY
+
+def test_invalidation_moves_every_worker_to_a_new_version(tmp_path):
+    path = str(tmp_path / 'cache.db')
+    first, second = TwoLevelCache(SQLiteCache(path)), TwoLevelCache(SQLiteCache(path))
+    version = first.version('menu')
+    first.set('menu', 'items', version, ['biryani'])
+    assert second.get('menu', 'items', second.version('menu'))[1] == ['biryani']
+
+    first.invalidate('menu')
+    assert first.version('menu') == version + 1
+    assert first.get('menu', 'items', first.version('menu')) is None
+    # A worker that never read the namespace goes to L2 for its version
+    third = TwoLevelCache(SQLiteCache(path))
+    assert third.version('menu') == version + 1
+    assert third.get('menu', 'items', version + 1) is None
+    # Other namespaces keep theirs
+    assert first.version('home') == 0
+    assert first.stats()['namespaces']['menu']['invalidations'] == 1
+
+def test_stats_count_expired_entries_per_worker(tmp_path):
+    cache = TwoLevelCache(SQLiteCache(str(tmp_path / 'cache.db')))
+    for index in range(CACHE_PURGE_EVERY):
+        cache.set('home', str(index), 0, index, ttl=-1)
+    assert cache.get('home', '0', 0) is None
+
+    stats = cache.stats()
+    assert stats['scope'] == 'worker' and stats['pid']
+    assert stats['l1_expirations'] == 1
+    assert stats['l2_purged'] == CACHE_PURGE_EVERY
+    assert stats['namespaces']['home']['misses'] == 1
+
+def test_concurrent_misses_run_the_loader_once():
+    pages = PageCache(TwoLevelCache())
+    calls = []
+    barrier = threading.Barrier(8)
+
+    def load():
+        calls.append(1)
+        time.sleep(0.2)
+        return {'items': ['biryani']}
+
+    def read(index):
+        barrier.wait()
+        results[index] = pages.get('menu', 'items', load)
+
+    results = [None] * 8
+    threads = [threading.Thread(target=read, args=(index,)) for index in range(len(results))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(calls) == 1
+    assert results == [{'items': ['biryani']}] * len(results)
+
+def test_a_stale_value_is_served_while_one_request_refreshes_it():
+    cache = TwoLevelCache(ttls={'menu': 0.05})
+    pages = PageCache(cache)
+    assert pages.get('menu', 'items', lambda: 'old') == 'old'
+    time.sleep(0.1)
+
+    refreshing, release = threading.Event(), threading.Event()
+
+    def slow_load():
+        refreshing.set()
+        release.wait(5)
+        return 'new'
+
+    refresher = threading.Thread(target=lambda: results.append(pages.get('menu', 'items', slow_load)))
+    results = []
+    refresher.start()
+    assert refreshing.wait(5)
+    assert pages.get('menu', 'items', lambda: 'unexpected') == 'old'
+    release.set()
+    refresher.join()
+    assert results == ['new']
+    assert pages.get('menu', 'items', lambda: 'unexpected') == 'new'
+    assert cache.stats()['namespaces']['menu']['stale_served'] == 1
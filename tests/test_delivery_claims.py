@@ -0,0 +1,92 @@
+# Riders racing for the same order: the conditional UPDATEs in
+# /delivery/accept and /delivery/complete, and the versioned one in
+# /admin/assign_delivery, must let exactly one request win.
+import threading
+
+from conftest import sign_in
+from main import Order, OrderEvent
+
+RIDERS = 12
+
+def race(app, requests):
+    # requests: (user_id, path, body); all are sent at once, one thread each
+    barrier = threading.Barrier(len(requests))
+    replies = [None] * len(requests)
+
+    def send(index, user_id, path, body):
+        client = app.test_client()
+        sign_in(client, user_id)
+        barrier.wait()
+        replies[index] = client.post(path, json=body).get_json()
+
+    threads = [threading.Thread(target=send, args=(index, *request)) for index, request in enumerate(requests)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return replies
+
+def test_riders_racing_to_accept_one_order_assign_it_once(app, make_user, make_order):
+    riders = [make_user(is_delivery=True) for _ in range(RIDERS)]
+    order_id = make_order(status='ready')
+
+    replies = race(app, [(rider, '/delivery/accept', {'order_id': order_id}) for rider in riders])
+
+    winners = [rider for rider, reply in zip(riders, replies) if reply['success']]
+    assert len(winners) == 1
+    assert {reply['error'] for reply in replies if not reply['success']} == {'Order already claimed by another rider'}
+    with app.app_context():
+        order = Order.query.filter_by(order_id=order_id).one()
+        assert order.delivery_person_id == winners[0]
+        assert order.version == 1
+        claims = OrderEvent.query.filter_by(order_id=order_id, from_status='ready', to_status='ready').all()
+        assert [event.delivery_person_id for event in claims] == winners
+
+def test_only_the_assigned_rider_completes_an_order_and_only_once(app, make_user, make_order):
+    holder = make_user(is_delivery=True)
+    others = [make_user(is_delivery=True) for _ in range(RIDERS // 2)]
+    order_id = make_order(status='ready', delivery_person_id=holder)
+
+    requests = [(holder, '/delivery/complete', {'order_id': order_id})] * (RIDERS // 2)
+    requests += [(rider, '/delivery/complete', {'order_id': order_id}) for rider in others]
+    replies = race(app, requests)
+
+    assert [reply['success'] for reply in replies].count(True) == 1
+    assert replies.index(next(reply for reply in replies if reply['success'])) < RIDERS // 2
+    with app.app_context():
+        order = Order.query.filter_by(order_id=order_id).one()
+        assert (order.status, order.delivery_person_id) == ('delivered', holder)
+        assert OrderEvent.query.filter_by(order_id=order_id, to_status='delivered').count() == 1
+
+def test_admin_assignment_racing_a_rider_claim_never_overwrites_it(app, make_user, make_order):
+    admin = make_user(is_admin=True)
+    riders = [make_user(is_delivery=True) for _ in range(RIDERS // 2)]
+    picked = make_user(is_delivery=True)
+    order_id = make_order(status='ready')
+
+    # The admin's modal saw the order at version 0
+    requests = [(admin, '/admin/assign_delivery', {'order_id': order_id, 'delivery_person_id': picked, 'version': 0})]
+    requests += [(rider, '/delivery/accept', {'order_id': order_id}) for rider in riders]
+    replies = race(app, requests)
+
+    assert [reply['success'] for reply in replies].count(True) == 1
+    winner = (picked, *riders)[[reply['success'] for reply in replies].index(True)]
+    with app.app_context():
+        order = Order.query.filter_by(order_id=order_id).one()
+        assert (order.delivery_person_id, order.version) == (winner, 1)
+        claims = OrderEvent.query.filter_by(order_id=order_id, from_status='ready', to_status='ready').all()
+        assert [event.delivery_person_id for event in claims] == [winner]
+
+def test_admin_assignment_from_a_stale_modal_is_a_conflict(app, make_user, make_order):
+    admin, rider, picked = make_user(is_admin=True), make_user(is_delivery=True), make_user(is_delivery=True)
+    order_id = make_order(status='ready')
+    assert race(app, [(rider, '/delivery/accept', {'order_id': order_id})])[0]['success']
+
+    client = app.test_client()
+    sign_in(client, admin)
+    response = client.post('/admin/assign_delivery', json={'order_id': order_id, 'delivery_person_id': picked,
+                                                           'version': 0})
+    assert response.status_code == 409
+    assert response.get_json()['success'] is False
+    with app.app_context():
+        assert Order.query.filter_by(order_id=order_id).one().delivery_person_id == rider
@@ -0,0 +1,91 @@
+# Admin diagnostics: the slow query log keeps what a slow statement was and
+# where it ran, without its parameter values; the profiler samples exactly
+# the requests it was armed for; and a worker over its memory limit only
+# recycles itself under a prefork master that will replace it.
+import os
+import signal
+import time
+
+from conftest import sign_in
+from main import slow_query_log, request_profiler, MemoryDiagnostics
+
+def test_slow_statements_are_recorded_with_route_shape_and_plan(app, make_user, make_order):
+    customer = make_user()
+    make_order(user_id=customer)
+    client = app.test_client()
+    sign_in(client, customer)
+    threshold = app.config['SLOW_QUERY_SECONDS']
+    app.config['SLOW_QUERY_SECONDS'] = 0
+    try:
+        recorded = slow_query_log.recorded
+        assert client.get('/api/my-orders?limit=5').get_json()['success']
+    finally:
+        app.config['SLOW_QUERY_SECONDS'] = threshold
+    assert slow_query_log.recorded > recorded
+
+    [entry] = [entry for entry in slow_query_log.entries()[-(slow_query_log.recorded - recorded):]
+               if 'FROM "order"' in entry['statement']]
+    assert entry['route'] == 'GET /api/my-orders'
+    assert set(entry['parameters']) == {'int'}  # the user id and paging, as types only
+    assert entry['seconds'] >= 0 and entry['executemany'] is None
+    assert entry['plan'] and any('order' in line for line in entry['plan'])
+
+def profile_id_of(client, **headers):
+    response = client.get('/manifest.json', headers=headers)
+    return response.headers.get('X-Profile-Id')
+
+def test_arming_profiles_the_next_requests_only(app, make_user):
+    admin = make_user(is_admin=True)
+    admin_client, visitor = app.test_client(), app.test_client()
+    sign_in(admin_client, admin)
+
+    reply = admin_client.post('/admin/profiles/arm', json={'endpoint': 'manifest', 'requests': 2}).get_json()
+    assert reply['armed']['manifest'] == 2
+    profiled = [profile_id_of(visitor) for _ in range(3)]
+    assert all(profiled[:2]) and profiled[2] is None
+
+    deadline = time.monotonic() + 5
+    while request_profiler.load(profiled[1]) is None and time.monotonic() < deadline:
+        time.sleep(0.02)
+    document = request_profiler.load(profiled[1])
+    assert document['meta']['endpoint'] == 'manifest'
+    assert document['profiles'][0]['type'] == 'sampled'
+
+def test_disarming_and_the_header(app, make_user):
+    admin = make_user(is_admin=True)
+    admin_client, visitor = app.test_client(), app.test_client()
+    sign_in(admin_client, admin)
+
+    admin_client.post('/admin/profiles/arm', json={'endpoint': 'manifest', 'requests': 5})
+    reply = admin_client.post('/admin/profiles/arm', json={'endpoint': 'manifest', 'requests': 0}).get_json()
+    assert 'manifest' not in reply['armed']
+    assert profile_id_of(visitor) is None
+    # The header only works for admins
+    assert profile_id_of(visitor, **{'X-Profile-Request': '1'}) is None
+    sign_in(visitor, make_user())
+    assert profile_id_of(visitor, **{'X-Profile-Request': '1'}) is None
+    assert profile_id_of(admin_client, **{'X-Profile-Request': '1'})
+
+def over_the_limit(app, monkeypatch, server=None, prefork=False):
+    signals = []
+    real_kill = os.kill
+    monkeypatch.setattr(os, 'kill', lambda pid, sig: signals.append(sig) if sig == signal.SIGTERM else real_kill(pid, sig))
+    if server is None:
+        monkeypatch.delenv('SERVER_SOFTWARE', raising=False)
+    else:
+        monkeypatch.setenv('SERVER_SOFTWARE', server)
+    monkeypatch.setitem(app.config, 'MEMORY_RECYCLE_RSS_MB', 1)
+    monkeypatch.setitem(app.config, 'MEMORY_RECYCLE_PREFORK', prefork)
+    diagnostics = MemoryDiagnostics()
+    for _ in range(2):
+        diagnostics._checked_at = None
+        diagnostics.check_high_water()
+    return signals
+
+def test_recycling_needs_a_prefork_master(app, monkeypatch):
+    assert over_the_limit(app, monkeypatch) == []
+    assert over_the_limit(app, monkeypatch, server='Werkzeug/3.0') == []
+
+def test_recycling_under_gunicorn_signals_once(app, monkeypatch):
+    assert over_the_limit(app, monkeypatch, server='gunicorn/21.2.0') == [signal.SIGTERM]
+    assert over_the_limit(app, monkeypatch, prefork=True) == [signal.SIGTERM]
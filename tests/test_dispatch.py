@@ -0,0 +1,62 @@
+# DeliveryDispatcher ordering: priority orders go first and the rest in the
+# order they became ready, riders are filled least loaded first, and only
+# riders who are on shift (a fresh location ping) are given orders.
+import time
+from datetime import datetime, timedelta
+
+from main import DeliveryDispatcher, RiderLocationIndex
+
+START = datetime(2024, 1, 1, 12, 0)
+
+def drain(dispatcher):
+    pairs = []
+    while True:
+        pair = dispatcher.pop_assignment()
+        if pair is None:
+            return pairs
+        pairs.append(pair)
+
+def test_priority_orders_go_first_then_oldest_first():
+    dispatcher = DeliveryDispatcher(max_load=10)
+    dispatcher.reset({1: 0}, [('late', START + timedelta(minutes=5), False, None, None),
+                              ('early', START, False, None, None),
+                              ('vip', START + timedelta(minutes=9), True, None, None)])
+    dispatcher.enqueue('latest', START + timedelta(minutes=7), False)
+    assert [order_id for order_id, _ in drain(dispatcher)] == ['vip', 'early', 'late', 'latest']
+
+def test_riders_are_filled_least_loaded_first():
+    dispatcher = DeliveryDispatcher(max_load=3)
+    dispatcher.reset({1: 2, 2: 0, 3: 1}, [(f'O{n}', START + timedelta(minutes=n), False, None, None)
+                                          for n in range(8)])
+    pairs = drain(dispatcher)
+    assert [rider_id for _, rider_id in pairs[:3]] == [2, 3, 2]
+    assert len(pairs) == 6  # every rider is full, two orders stay queued
+    assert {rider_id: dispatcher.load_of(rider_id) for rider_id in (1, 2, 3)} == {1: 3, 2: 3, 3: 3}
+    assert dispatcher.queue_length() == 2
+
+    dispatcher.released(2)
+    assert dispatcher.pop_assignment() == ('O6', 2)
+
+def test_orders_wait_for_a_rider_on_shift():
+    riders = RiderLocationIndex()
+    dispatcher = DeliveryDispatcher(max_load=4, rider_index=riders)
+    riders.update(2, 17.40, 78.45, seen_at=time.time() - riders.ttl - 60)
+    dispatcher.reset({1: 0, 2: 0}, [('O1', START, False, 17.39, 78.44)], on_shift=[])
+    assert dispatcher.pop_assignment() is None
+    assert dispatcher.queue_length() == 1
+    assert dispatcher.load_of(1) == 0
+
+    riders.update(1, 17.38, 78.43)
+    assert dispatcher.start_shift(1)
+    assert not dispatcher.start_shift(1)
+    assert dispatcher.pop_assignment() == ('O1', 1)
+
+def test_a_rider_whose_ping_goes_stale_stops_getting_orders():
+    riders = RiderLocationIndex()
+    dispatcher = DeliveryDispatcher(max_load=4, rider_index=riders)
+    riders.update(1, 17.38, 78.43)
+    dispatcher.reset({1: 0}, [], on_shift=[1])
+    riders.update(1, 17.38, 78.43, seen_at=time.time() - riders.ttl - 1)
+    dispatcher.enqueue('O1', START, False)
+    assert dispatcher.pop_assignment() is None
+    assert dispatcher.queue_length() == 1
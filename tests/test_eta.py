@@ -0,0 +1,46 @@
+# EtaPredictor: defaults until there is history, per-hour averages once an
+# hour has enough samples, extra time for a longer than usual kitchen queue,
+# and the customer-facing label.
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+from main import (EtaPredictor, DEFAULT_PREP_MINUTES, DEFAULT_DELIVERY_MINUTES, ETA_MIN_SAMPLES, KITCHEN_SLOTS,
+                  eta_label)
+
+NOON = datetime(2024, 1, 1, 12, 0)
+
+def test_defaults_without_history():
+    predictor = EtaPredictor()
+    assert predictor.estimate(NOON) == DEFAULT_PREP_MINUTES + DEFAULT_DELIVERY_MINUTES
+
+def test_hours_use_their_own_average_once_trusted():
+    predictor = EtaPredictor()
+    for _ in range(ETA_MIN_SAMPLES):
+        predictor.observe_prep(NOON, NOON + timedelta(minutes=10))
+    predictor.observe_prep(NOON.replace(hour=20), NOON.replace(hour=20, minute=40))
+    assert predictor.prep_minutes(NOON) == 10
+    # Too few samples at 20:00, so the overall average stands in
+    assert 10 < predictor.prep_minutes(NOON.replace(hour=20)) < 40
+    assert predictor.prep_minutes(NOON.replace(hour=3)) == predictor.prep_overall.mean
+
+def test_out_of_range_durations_are_ignored():
+    predictor = EtaPredictor()
+    predictor.observe_delivery(NOON, NOON - timedelta(minutes=5))
+    predictor.observe_delivery(NOON, NOON + timedelta(days=2))
+    predictor.observe_delivery(NOON, None)
+    assert predictor.delivery_overall.count == 0
+
+def test_a_long_kitchen_queue_adds_prep_time():
+    predictor = EtaPredictor()
+    for _ in range(2 * KITCHEN_SLOTS):
+        predictor.entered_kitchen()
+    assert predictor.prep_minutes(NOON) == 2 * DEFAULT_PREP_MINUTES
+    for _ in range(KITCHEN_SLOTS):
+        predictor.left_kitchen()
+    assert predictor.prep_minutes(NOON) == DEFAULT_PREP_MINUTES
+
+def test_eta_label():
+    now = datetime.utcnow()
+    assert eta_label(SimpleNamespace(status='ready', estimated_delivery=now + timedelta(minutes=12)), now) == '~12 min'
+    assert eta_label(SimpleNamespace(status='ready', estimated_delivery=now - timedelta(minutes=2)), now) == 'Any minute now'
+    assert eta_label(SimpleNamespace(status='delivered', estimated_delivery=now), now) == ''
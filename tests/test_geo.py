@@ -0,0 +1,62 @@
+# Rider lookups on the location grid agree with checking every rider, and
+# planned multi-drop routes are never longer than the greedy tour.
+import random
+import time
+
+from main import RiderLocationIndex, distance_km, plan_route
+
+def brute_force_nearest(riders, lat, lng, k, accept, stale_before):
+    found = sorted((distance_km(lat, lng, r_lat, r_lng), rider_id)
+                   for rider_id, (r_lat, r_lng, seen_at) in riders.items()
+                   if seen_at >= stale_before and accept(rider_id))
+    return [(rider_id, km) for km, rider_id in found[:k]]
+
+def test_nearest_matches_brute_force():
+    rng = random.Random(29)
+    index = RiderLocationIndex()
+    now = time.time()
+    riders = {}
+    for rider_id in range(1, 401):
+        # Mostly around the city, a few far out, some with stale pings
+        spread = 0.15 if rider_id % 20 else 0.6
+        lat, lng = 17.385 + rng.uniform(-spread, spread), 78.4867 + rng.uniform(-spread, spread)
+        seen_at = now - (index.ttl + 60 if rider_id % 7 == 0 else rng.uniform(0, 60))
+        index.update(rider_id, lat, lng, seen_at=seen_at)
+        riders[rider_id] = (lat, lng, seen_at)
+    # Moving a rider leaves no trace in its old cell
+    index.update(1, 17.2, 78.3)
+    riders[1] = (17.2, 78.3, time.time())
+
+    def accept(rider_id):
+        return rider_id % 3 != 0
+
+    stale_before = time.time() - index.ttl
+    for _ in range(50):
+        lat, lng = 17.385 + rng.uniform(-0.3, 0.3), 78.4867 + rng.uniform(-0.3, 0.3)
+        for k in (1, 5):
+            assert index.nearest(lat, lng, k=k, accept=accept) == brute_force_nearest(
+                riders, lat, lng, k, accept, stale_before)
+    assert index.nearest(17.385, 78.4867, k=3, accept=lambda rider_id: False) == []
+
+def path_km(start, stops, order):
+    points = [start] + [stops[index] for index in order]
+    return sum(distance_km(a[0], a[1], b[0], b[1]) for a, b in zip(points, points[1:]))
+
+def nearest_neighbour_order(start, stops):
+    order, position, remaining = [], start, set(range(len(stops)))
+    while remaining:
+        nearest = min(remaining, key=lambda index: distance_km(position[0], position[1], *stops[index]))
+        order.append(nearest)
+        remaining.remove(nearest)
+        position = stops[nearest]
+    return order
+
+def test_planned_routes_are_no_longer_than_nearest_neighbour():
+    rng = random.Random(30)
+    start = (17.385, 78.4867)
+    for size in (0, 1, 2, 3, 5, 8, 12):
+        for _ in range(20):
+            stops = [(17.385 + rng.uniform(-0.1, 0.1), 78.4867 + rng.uniform(-0.1, 0.1)) for _ in range(size)]
+            order = plan_route(start, stops)
+            assert sorted(order) == list(range(size))
+            assert path_km(start, stops, order) <= path_km(start, stops, nearest_neighbour_order(start, stops)) + 1e-9
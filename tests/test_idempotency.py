@@ -0,0 +1,98 @@
+# /place_order with an Idempotency-Key: retries and double taps replay the
+# first order instead of placing another, a key reused with a different cart
+# is refused, and keys are scoped per customer or guest.
+import threading
+import time
+
+import pytest
+
+from conftest import sign_in
+from main import Order, MenuItem, store_status
+
+@pytest.fixture
+def body(app):
+    with app.app_context():
+        item = MenuItem.query.order_by(MenuItem.id).first()
+        items = [{'name': item.name, 'price': item.price, 'quantity': 1, 'emoji': item.emoji or ''}]
+    store_status['open'] = True
+    # Order ids are made from the current second, so give each test its own
+    second = int(time.time())
+    while int(time.time()) == second:
+        time.sleep(0.01)
+    return {'items': items, 'customer_name': 'Key Test', 'customer_phone': '9000000000',
+            'customer_address': '1 Test Street, Hyderabad', 'payment_method': 'cash'}
+
+def place(client, key, body):
+    response = client.post('/place_order', json=body, headers={'Idempotency-Key': key})
+    return response.status_code, response.get_json()
+
+def orders_of(app, user_id):
+    with app.app_context():
+        return Order.query.filter_by(user_id=user_id).count()
+
+def test_a_retried_key_replays_the_first_order(app, make_user, body):
+    customer = make_user()
+    client = app.test_client()
+    sign_in(client, customer)
+
+    first = place(client, 'retry-1', body)
+    assert first[0] == 200 and first[1]['success']
+    assert place(client, 'retry-1', body) == first
+    assert orders_of(app, customer) == 1
+
+def test_concurrent_duplicates_place_one_order(app, make_user, body):
+    customer = make_user()
+    replies = [None] * 8
+    barrier = threading.Barrier(len(replies))
+
+    def send(index):
+        client = app.test_client()
+        sign_in(client, customer)
+        barrier.wait()
+        replies[index] = place(client, 'tap-1', body)
+
+    threads = [threading.Thread(target=send, args=(index,)) for index in range(len(replies))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    placed = [reply for status, reply in replies if status == 200]
+    assert placed and all(reply == placed[0] for reply in placed)
+    assert {reply['error'] for status, reply in replies if status != 200} <= {'This order is already being placed'}
+    assert all(status in (200, 409) for status, _ in replies)
+    assert orders_of(app, customer) == 1
+    client = app.test_client()
+    sign_in(client, customer)
+    assert place(client, 'tap-1', body) == (200, placed[0])
+
+def test_a_key_reused_for_a_different_cart_is_refused(app, make_user, body):
+    customer = make_user()
+    client = app.test_client()
+    sign_in(client, customer)
+    assert place(client, 'reuse-1', body)[1]['success']
+
+    status, reply = place(client, 'reuse-1', dict(body, customer_address='2 Other Street, Hyderabad'))
+    assert (status, reply['success']) == (422, False)
+    assert orders_of(app, customer) == 1
+
+def test_guests_do_not_share_keys(app, body):
+    first_guest, second_guest = app.test_client(), app.test_client()
+    first_guest.get('/checkout')
+    second_guest.get('/checkout')
+
+    status, first = place(first_guest, 'guest-1', body)
+    assert status == 200 and first['success']
+    assert place(first_guest, 'guest-1', body) == (200, first)
+    assert place(second_guest, 'guest-1', body)[1].get('order_id') != first['order_id']
+
+def test_a_failed_attempt_can_be_retried(app, make_user, body):
+    customer = make_user()
+    client = app.test_client()
+    sign_in(client, customer)
+    broken = {key: value for key, value in body.items() if key != 'customer_name'}
+
+    assert place(client, 'fail-1', broken) == (200, {'success': False, 'error': "'customer_name'"})
+    assert orders_of(app, customer) == 0
+    assert place(client, 'fail-1', body)[1]['success']
+    assert orders_of(app, customer) == 1
@@ -0,0 +1,32 @@
+# Request metrics stay bounded whatever clients send, and a statement that
+# fails does not throw off the timing of the ones after it.
+import pytest
+from sqlalchemy.exc import OperationalError
+
+from main import db, request_metrics
+
+def http_series():
+    series, _, _, _ = request_metrics.snapshot()
+    return set(series)
+
+def test_unknown_methods_and_paths_share_series(app):
+    client = app.test_client()
+    # Error pages are streamed and recorded once the response is closed
+    for path in ('/no-such-page-1', '/no-such-page-2', '/menu'):
+        client.open(path, method='BREW').close()
+    client.get('/no-such-page-1').close()
+    request_metrics.started('/menu')
+    request_metrics.finished('/menu', 'BREW', 200, 0.01, 0, 0.0)
+
+    series = http_series()
+    assert not {key for key in series if 'BREW' in key}
+    assert {key for key in series if key[0] == 'unmatched'} == {('unmatched', 'ANY', '404'), ('unmatched', 'ANY', '405')}
+    assert ('/menu', 'OTHER', '200') in series
+
+def test_a_failed_statement_drops_its_start_time(app):
+    with app.app_context():
+        connection = db.session.connection()
+        with pytest.raises(OperationalError):
+            connection.exec_driver_sql('SELECT * FROM no_such_table')
+        assert connection.info.get('query_started') == []
+        db.session.rollback()
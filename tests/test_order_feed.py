@@ -0,0 +1,58 @@
+# What /delivery/feed passes on to each rider: a customer's phone and
+# address reach every rider while the order is unclaimed, and only the
+# claiming rider afterwards. Also the cursor a customer's status poll
+# resumes from, and the per-worker cap on connected feeds.
+from conftest import sign_in
+from main import db, OrderEvent, LATEST_EVENT_STMT, feed_deltas, log_order_event, rider_feed_view
+
+def test_claimed_orders_only_show_contact_details_to_their_rider(app, make_user, make_order):
+    holder, other = make_user(is_delivery=True), make_user(is_delivery=True)
+    order_id = make_order(status='preparing', customer_phone='9111111111', customer_address='7 Private Lane')
+    with app.app_context():
+        log_order_event(order_id, 'preparing', 'ready')
+        log_order_event(order_id, 'ready', 'ready', actor_id=holder, delivery_person_id=holder)
+        db.session.commit()
+        events = OrderEvent.query.filter_by(order_id=order_id).order_by(OrderEvent.id).all()
+        _, unclaimed, claimed = feed_deltas(events)
+
+    for rider in (holder, other):
+        assert rider_feed_view(rider)(unclaimed)['order']['address'] == '7 Private Lane'
+    assert rider_feed_view(holder)(claimed)['order']['phone'] == '9111111111'
+    assert 'order' not in rider_feed_view(other)(claimed)
+    assert rider_feed_view(other)(claimed)['rider'] == holder
+    assert claimed['order']['phone'] == '9111111111'  # the shared delta is left alone
+
+def test_riders_are_not_sent_orders_away_from_ready(app, make_order):
+    order_id = make_order(status='pending')
+    with app.app_context():
+        [delta] = feed_deltas(OrderEvent.query.filter_by(order_id=order_id).all())
+    assert rider_feed_view(1)(delta) is None
+
+def test_status_poll_cursor_skips_other_customers_events(app, make_user, make_order):
+    customer = make_user()
+    client = app.test_client()
+    sign_in(client, customer)
+    cursor = client.get('/api/my-orders-status').get_json()['cursor']
+    others = [make_order() for _ in range(3)]
+    with app.app_context():
+        newest = db.session.execute(LATEST_EVENT_STMT).scalar()
+
+    reply = client.get(f'/api/my-orders-status?since={cursor}').get_json()
+    assert (reply['orders'], reply['cursor']) == ([], newest)
+    mine = make_order(user_id=customer)
+    reply = client.get(f"/api/my-orders-status?since={reply['cursor']}").get_json()
+    assert reply['orders'] == [{'order_id': mine, 'status': 'pending'}]
+    assert others and reply['cursor'] > newest
+
+def test_feeds_past_the_subscriber_cap_are_turned_away(app, make_user):
+    rider = make_user(is_delivery=True)
+    client = app.test_client()
+    sign_in(client, rider)
+    cap = app.config['FEED_MAX_SUBSCRIBERS']
+    app.config['FEED_MAX_SUBSCRIBERS'] = 0
+    try:
+        response = client.get('/delivery/feed')
+    finally:
+        app.config['FEED_MAX_SUBSCRIBERS'] = cap
+    assert response.status_code == 503
+    assert response.get_json()['success'] is False
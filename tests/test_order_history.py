@@ -0,0 +1,40 @@
+# Order history pages: walking the cursor visits every order exactly once,
+# newest first, even when many orders share a created_at.
+from datetime import datetime, timedelta
+
+from conftest import sign_in
+from main import db, Order, order_history_page
+
+def test_pages_split_orders_with_equal_timestamps(app, make_user, make_order):
+    customer = make_user()
+    rush = datetime(2024, 1, 1, 19, 30)
+    for created_at in [rush] * 7 + [rush + timedelta(minutes=1), rush - timedelta(minutes=1)]:
+        make_order(user_id=customer, created_at=created_at)
+    with app.app_context():
+        expected = [order.id for order in Order.query.filter_by(user_id=customer)
+                    .order_by(Order.created_at.desc(), Order.id.desc())]
+
+        seen, cursor = [], None
+        while True:
+            orders, cursor = order_history_page(Order.query.filter_by(user_id=customer), cursor, 3)
+            assert len(orders) == 3
+            seen += [order.id for order in orders]
+            if cursor is None:
+                break
+        db.session.remove()
+    assert seen == expected
+
+def test_the_api_pages_through_the_same_orders(app, make_user, make_order):
+    customer = make_user()
+    rush = datetime(2024, 1, 1, 19, 30)
+    order_ids = [make_order(user_id=customer, created_at=rush) for _ in range(5)]
+    client = app.test_client()
+    sign_in(client, customer)
+
+    shown, cursor = '', None
+    for _ in range(3):
+        reply = client.get('/api/my-orders?limit=2' + (f'&before={cursor}' if cursor else '')).get_json()
+        shown += reply['html']
+        cursor = reply['next']
+    assert cursor is None
+    assert all(shown.count(f'id="order-{order_id}"') == 1 for order_id in order_ids)
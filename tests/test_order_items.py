@@ -0,0 +1,37 @@
+# Compact items_json rows keep what was ordered, whatever happens to the menu
+# afterwards, and get_items() hands out copies of its memo.
+import json
+import uuid
+
+from main import db, MenuItem, Order, menu_codebook, encode_order_items, decode_order_items
+
+def make_menu_item(app):
+    with app.app_context():
+        item = MenuItem(name=f'Test Biryani {uuid.uuid4().hex[:8]}', category='Test', price=250, emoji='🍚')
+        db.session.add(item)
+        db.session.commit()
+        menu_codebook.refresh(force=True)
+        return item.id, item.name
+
+def test_renaming_a_menu_item_leaves_past_orders_alone(app):
+    item_id, name = make_menu_item(app)
+    cart = [{'name': name, 'price': 250, 'quantity': 2, 'emoji': '🍚'}]
+    with app.app_context():
+        raw = encode_order_items(cart)
+        assert json.loads(raw) == [[item_id, 2, 250, name, '🍚']]
+        db.session.get(MenuItem, item_id).name = name + ' (new recipe)'
+        db.session.get(MenuItem, item_id).emoji = '🥘'
+        db.session.commit()
+        menu_codebook.refresh(force=True)
+        assert decode_order_items(raw) == cart
+        # Rows written before names were kept still follow the menu
+        assert decode_order_items(json.dumps([[item_id, 2, 250]]))[0]['name'] == name + ' (new recipe)'
+
+def test_get_items_returns_copies(app):
+    _, name = make_menu_item(app)
+    with app.app_context():
+        order = Order(items_json=encode_order_items([{'name': name, 'price': 250, 'quantity': 1, 'emoji': '🍚'}]))
+    items = order.get_items()
+    items[0]['quantity'] = 99
+    items.append({'name': 'Extra'})
+    assert order.get_items() == [{'name': name, 'price': 250, 'quantity': 1, 'emoji': '🍚'}]
@@ -0,0 +1,52 @@
+# Buffered popularity clicks reach MenuItem.popularity: a worker's own
+# clicks on each flush, and clicks a previous run left in the metrics file
+# before that file is reset.
+import os
+import subprocess
+import sys
+
+from main import db, MenuItem, SharedCounters, flush_popularity, keep_leftover_popularity, popularity_flush, shared_counters
+
+def popularity_of(app, item_id):
+    with app.app_context():
+        return db.session.get(MenuItem, item_id).popularity or 0
+
+def first_item(app):
+    with app.app_context():
+        return MenuItem.query.order_by(MenuItem.id).first().id
+
+def test_clicks_are_written_once(app):
+    item_id = first_item(app)
+    before = popularity_of(app, item_id)
+    shared_counters.add_many(((('popularity', str(item_id)), 1),) * 3)
+    with app.app_context():
+        flush_popularity()
+        flush_popularity()
+    assert popularity_of(app, item_id) == before + 3
+
+def test_a_previous_runs_unflushed_clicks_are_handed_over(tmp_path):
+    path = str(tmp_path / 'metrics.shm')
+    previous = SharedCounters(path)
+    previous.add_many(((('popularity', '7'), 5), (('popularity_flushed', '7'), 2), (('popularity', '9'), 1),
+                       (('in_flight', '/menu'), 1)))
+    # Hand the slot to a process that has since exited
+    dead = subprocess.Popen([sys.executable, '-c', 'pass'])
+    dead.wait()
+    previous.SLOT_HEADER.pack_into(previous._mm, previous._slot_base(previous._slot), dead.pid, 4)
+
+    handed = []
+    current = SharedCounters(path)
+    current.on_reset = handed.append
+    current.add(('popularity', '7'))
+    assert handed == [{('popularity', '7'): 5.0, ('popularity_flushed', '7'): 2.0, ('popularity', '9'): 1.0}]
+    assert current.own('popularity') == {('7',): 1.0}
+    assert os.path.getsize(path) == current.size
+
+def test_leftover_clicks_are_flushed(app):
+    item_id = first_item(app)
+    before = popularity_of(app, item_id)
+    keep_leftover_popularity({('popularity', str(item_id)): 5.0, ('popularity_flushed', str(item_id)): 2.0})
+    with app.app_context():
+        flush_popularity()
+    assert popularity_of(app, item_id) == before + 3
+    assert not popularity_flush['leftover']
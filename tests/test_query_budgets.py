@@ -0,0 +1,138 @@
+# Every endpoint stays within its QUERY_BUDGETS entry. Requests run with
+# app.testing set, so going over raises QueryBudgetExceeded out of the test
+# client. The customer has several orders of each status, so a loop that
+# queries per order or per item goes over.
+import json
+import types
+import uuid
+from datetime import datetime, timedelta
+
+import pytest
+from werkzeug.security import generate_password_hash
+
+from conftest import sign_in
+from main import app as flask_app, db, MenuItem, User, Order, Promotion, QUERY_BUDGETS, store_status
+
+ORDERS_PER_STATUS = 3
+PASSWORD = 'budget-pass'
+
+# endpoint -> (role, method, path, body); paths and bodies are formatted with the shop fixture
+REQUESTS = {
+    'static': ('guest', 'GET', '/static/missing.css', None),
+    'manifest': ('guest', 'GET', '/manifest.json', None),
+    'service_worker': ('guest', 'GET', '/service-worker.js', None),
+    'metrics': ('admin', 'GET', '/metrics', None),
+    'track_popularity': ('customer', 'POST', '/api/track_popularity', {'item_name': '{item}'}),
+    'signup': ('guest', 'POST', '/signup', {'username': '{new_username}', 'email': '{new_username}@example.invalid',
+                                            'password': PASSWORD, 'full_name': 'Budget Test', 'phone': '9000000000'}),
+    'login': ('guest', 'POST', '/login', {'username': '{username}', 'password': PASSWORD}),
+    'logout': ('customer', 'GET', '/logout', None),
+    'forgot_password': ('guest', 'GET', '/forgot-password', None),
+    'my_orders': ('customer', 'GET', '/my-orders', None),
+    'api_my_orders_page': ('customer', 'GET', '/api/my-orders?limit=5', None),
+    'api_my_orders_status': ('customer', 'GET', '/api/my-orders-status?since=0', None),
+    'submit_rating': ('customer', 'POST', '/api/submit-rating', {'order_id': '{delivered_pk}', 'rating': 5}),
+    'profile': ('customer', 'GET', '/profile', None),
+    'api_profile_orders_page': ('customer', 'GET', '/api/profile-orders?limit=5', None),
+    'rewards': ('customer', 'GET', '/rewards', None),
+    'redeem_reward': ('customer', 'POST', '/api/redeem-reward', {'reward_name': 'Priority Delivery', 'points': 50}),
+    'admin': ('admin', 'GET', '/admin', None),
+    'update_order_status': ('admin', 'POST', '/admin/update_order', {'order_id': '{pending}', 'status': 'preparing'}),
+    'toggle_store_status': ('admin', 'POST', '/admin/toggle_store', None),
+    'get_stock_items': ('admin', 'GET', '/admin/stock_items', None),
+    'toggle_stock': ('admin', 'POST', '/admin/toggle_stock', {'item_name': '{item}', 'in_stock': True}),
+    'get_delivery_assignments': ('admin', 'GET', '/admin/delivery_assignments', None),
+    'assign_delivery_person': ('admin', 'POST', '/admin/assign_delivery',
+                               {'order_id': '{ready}', 'delivery_person_id': '{rider}'}),
+    'get_promotions': ('admin', 'GET', '/admin/promotions', None),
+    'add_promotion': ('admin', 'POST', '/admin/add_promotion',
+                      {'code': '{new_code}', 'description': 'Budget test', 'discount_type': 'percent',
+                       'discount_value': 10, 'max_usage': 10}),
+    'cache_stats': ('admin', 'GET', '/admin/cache_stats', None),
+    'slow_queries': ('admin', 'GET', '/admin/slow_queries', None),
+    'list_profiles': ('admin', 'GET', '/admin/profiles', None),
+    'arm_profiler': ('admin', 'POST', '/admin/profiles/arm', {'endpoint': 'manifest', 'requests': 1}),
+    'download_profile': ('admin', 'GET', '/admin/profiles/20260101000000000000-0badc0de', None),
+    'memory_report': ('admin', 'GET', '/admin/memory', None),
+    'memory_tracing': ('admin', 'POST', '/admin/memory/tracing', {'enabled': False}),
+    'memory_snapshot': ('admin', 'POST', '/admin/memory/snapshot', {}),
+    'memory_diff': ('admin', 'GET', '/admin/memory/diff?from=a&to=b', None),
+    'sales_data': ('admin', 'GET', '/admin/sales_data', None),
+    'get_order_events': ('admin', 'GET', '/admin/order_events?since=0', None),
+    'delivery_panel': ('rider', 'GET', '/delivery', None),
+    'accept_delivery': ('rider', 'POST', '/delivery/accept', {'order_id': '{ready}'}),
+    'complete_delivery': ('rider', 'POST', '/delivery/complete', {'order_id': '{held}'}),
+    'update_rider_location': ('rider', 'POST', '/delivery/location', {'lat': 17.4, 'lng': 78.45}),
+    'home': ('customer', 'GET', '/', None),
+    'menu': ('customer', 'GET', '/menu', None),
+    'checkout': ('customer', 'GET', '/checkout', None),
+    'apply_promo': ('customer', 'POST', '/api/apply-promo', {'promo_code': '{promo}'}),
+    'place_order': ('customer', 'POST', '/place_order',
+                    {'items': [{'name': '{item}', 'price': 250, 'quantity': 2, 'emoji': ''}],
+                     'customer_name': 'Budget Test', 'customer_phone': '9000000000',
+                     'customer_address': '1 Test Street, Hyderabad', 'payment_method': 'cash',
+                     'loyalty_points_used': 20}),
+    'order_confirmation': ('customer', 'GET', '/order_confirmation/{delivered}', None),
+}
+
+@pytest.fixture
+def shop(app, make_user, make_order):
+    with app.app_context():
+        items = [{'name': menu_item.name, 'price': menu_item.price, 'quantity': 1, 'emoji': menu_item.emoji or ''}
+                 for menu_item in MenuItem.query.order_by(MenuItem.id).limit(3)]
+        item = items[0]['name']
+        promo = f'B{uuid.uuid4().hex[:8].upper()}'
+        db.session.add(Promotion(code=promo, description='Budget test', discount_type='percent', discount_value=10,
+                                 valid_to=datetime.utcnow() + timedelta(days=1), max_usage=100))
+        db.session.commit()
+    customer = make_user(password_hash=generate_password_hash(PASSWORD), loyalty_points=200)
+    rider = make_user(is_delivery=True)
+    orders = {status: [make_order(status, customer, items_json=json.dumps(items)) for _ in range(ORDERS_PER_STATUS)]
+              for status in ('pending', 'preparing', 'ready', 'delivered')}
+    held = make_order('ready', customer, delivery_person_id=rider)
+    with app.app_context():
+        delivered_pk = Order.query.filter_by(order_id=orders['delivered'][0]).one().id
+        username = db.session.get(User, customer).username
+    users = {'guest': None, 'customer': customer, 'rider': rider, 'admin': make_user(is_admin=True)}
+    yield types.SimpleNamespace(users=users, values={
+        'item': item, 'promo': promo, 'username': username, 'rider': rider, 'held': held,
+        'pending': orders['pending'][0], 'ready': orders['ready'][0], 'delivered': orders['delivered'][0],
+        'delivered_pk': delivered_pk, 'new_username': f'budget-{uuid.uuid4().hex[:8]}',
+        'new_code': f'N{uuid.uuid4().hex[:8].upper()}',
+    })
+    store_status['open'] = True
+
+def fill(value, values):
+    # '{name}' placeholders become the shop's value, keeping its type
+    if isinstance(value, dict):
+        return {key: fill(item, values) for key, item in value.items()}
+    if isinstance(value, list):
+        return [fill(item, values) for item in value]
+    if isinstance(value, str) and value.startswith('{') and value.endswith('}') and value[1:-1] in values:
+        return values[value[1:-1]]
+    if isinstance(value, str):
+        return value.format(**values)
+    return value
+
+def test_every_endpoint_has_a_budget_and_a_request():
+    endpoints = {rule.endpoint for rule in flask_app.url_map.iter_rules()}
+    assert endpoints == set(QUERY_BUDGETS)
+    streams = {endpoint for endpoint, budget in QUERY_BUDGETS.items() if budget is None}
+    assert streams == {'admin_order_feed', 'delivery_order_feed'}
+    assert set(REQUESTS) == set(QUERY_BUDGETS) - streams
+
+@pytest.mark.parametrize('endpoint', sorted(REQUESTS))
+def test_endpoint_stays_within_its_query_budget(app, shop, endpoint):
+    role, method, path, body = REQUESTS[endpoint]
+    url = path.format(**shop.values)
+    assert flask_app.url_map.bind('localhost').match(url.split('?', 1)[0], method=method)[0] == endpoint
+    client = app.test_client()
+    if shop.users[role] is not None:
+        sign_in(client, shop.users[role])
+    response = client.open(url, method=method, json=fill(body, shop.values) if body is not None else None)
+    try:
+        # A streamed page is counted, and checked, once its body has been sent
+        response.get_data()
+        assert response.status_code < 500
+    finally:
+        response.close()